@@ -1,8 +1,12 @@
 # Este arquivo é dedicado às funções de analise das comunidades já identificadas no main.py
 # O objetivo é gerar um relatório complementar à visualização do grafo modelado
+# O relatório também pode ser gerado depois, a partir do resultado gravado pelo main.py (ver artefato_comunidades.py)
+#
+# uso: python analise_dados.py [--resultado dados/resultado_comunidades]
 
-import pandas as pd
-import ast
+import argparse
+
+import artefato_comunidades
 
 def descrever_comunidades(areas_prioritarias, areas_atencao, pontos_focais):
     
@@ -28,10 +32,10 @@ def imprimir_dataframe(titulo, dataframe):
         print(f"Áreas: {', '.join(map(str, areas_ordenadas))}")
         print(f"Subáreas: {', '.join(map(str, subareas_ordenadas))}")
 
-        # Verificar e ordenar porcentagens
-        porcentagem_crimes = row['Porcentagem Crimes'] if isinstance(row['Porcentagem Crimes'], dict) else ast.literal_eval(row['Porcentagem Crimes'])
-        porcentagem_armas = row['Porcentagem Armas'] if isinstance(row['Porcentagem Armas'], dict) else ast.literal_eval(row['Porcentagem Armas'])
-        porcentagem_horarios = row['Porcentagem Horarios'] if isinstance(row['Porcentagem Horarios'], dict) else ast.literal_eval(row['Porcentagem Horarios'])
+        # Ordenar porcentagens (dicionários {categoria: porcentagem})
+        porcentagem_crimes = row['Porcentagem Crimes']
+        porcentagem_armas = row['Porcentagem Armas']
+        porcentagem_horarios = row['Porcentagem Horarios']
         
         print("\nCrimes:")
         for crime, pct in sorted(porcentagem_crimes.items(), key=lambda x: x[1], reverse=True):
@@ -47,4 +51,12 @@ def imprimir_dataframe(titulo, dataframe):
         for horario, pct in sorted(porcentagem_horarios.items(), key=lambda x: x[1], reverse=True):
             print(f"  {horario}: {pct * 100:.2f}%")
         
-        print("\n" + "-" * 50 + "\n")
\ No newline at end of file
+        print("\n" + "-" * 50 + "\n")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Relatório das comunidades selecionadas a partir do resultado gravado pelo main.py.')
+    parser.add_argument('--resultado', default=artefato_comunidades.PASTA_RESULTADO, help='pasta do resultado das comunidades')
+    args = parser.parse_args()
+
+    _, pontos_focais, areas_prioritarias, areas_atencao = artefato_comunidades.carregar_comunidades(args.resultado)
+    descrever_comunidades(areas_prioritarias, areas_atencao, pontos_focais)
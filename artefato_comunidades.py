@@ -0,0 +1,134 @@
+# Este arquivo grava e lê o resultado das comunidades num formato colunar tipado: uma pasta com um .npy por coluna.
+# As porcentagens de crimes, armas e períodos do dia viram uma coluna numérica por categoria (NaN quando a categoria
+# não aparece na comunidade), as áreas e subáreas viram listas (valores concatenados + offsets de cada comunidade) e
+# os pontos focais, áreas prioritárias e áreas de atenção são gravados como as posições das suas linhas na tabela.
+# Assim os relatórios (analise_dados.py) são gerados a partir do arquivo, sem o grafo e sem interpretar textos do csv
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import estatisticas_comunidades as ec
+import funcoes_auxiliares as fa
+
+VERSAO_FORMATO = 1
+
+PASTA_RESULTADO = 'dados/resultado_comunidades'
+
+# colunas de dicionários {categoria: porcentagem} e as categorias de cada uma (na ordem das colunas gravadas)
+COLUNAS_PORCENTAGENS = {
+    'Porcentagem Crimes': fa.CATEGORIAS_CRIME,
+    'Porcentagem Armas': fa.CATEGORIAS_ARMA,
+    'Porcentagem Horarios': ec.PERIODOS,
+}
+# colunas de conjuntos de valores, gravadas como listas ordenadas
+COLUNAS_LISTAS = ('Areas', 'Subareas')
+
+GRUPOS = ('pontos_focais', 'areas_prioritarias', 'areas_atencao')
+
+# porcentagens (dicionários) como uma matriz comunidades x categorias, com NaN nas categorias ausentes
+def _matriz_porcentagens(dicionarios, categorias):
+    matriz = np.full((len(dicionarios), len(categorias)), np.nan)
+    posicoes = {categoria: k for k, categoria in enumerate(categorias)}
+    for linha, dicionario in enumerate(dicionarios):
+        for categoria, porcentagem in dicionario.items():
+            matriz[linha, posicoes[categoria]] = porcentagem
+    return matriz
+
+# conjuntos (ou listas) como os valores ordenados de todas as comunidades concatenados e o início de cada comunidade
+def _lista_com_offsets(conjuntos):
+    listas = [sorted(conjunto) for conjunto in conjuntos]
+    offsets = np.concatenate(([0], np.cumsum([len(lista) for lista in listas]))).astype(np.int64)
+    valores = [valor for lista in listas for valor in lista]
+    return (np.asarray(valores) if valores else np.zeros(0, dtype=np.int64)), offsets
+
+# listas de cada comunidade a partir dos valores concatenados e dos offsets
+def _listas(valores, offsets):
+    valores = valores.tolist()
+    return [valores[inicio:fim] for inicio, fim in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+# grava a tabela de comunidades e os três grupos selecionados (subconjuntos das linhas de df_comunidades)
+# a gravação é feita numa pasta nova que depois substitui a anterior
+def salvar_comunidades(pasta, df_comunidades, pontos_focais, areas_prioritarias, areas_atencao):
+    pasta_nova = pasta + '.novo'
+    shutil.rmtree(pasta_nova, ignore_errors=True)
+    os.makedirs(pasta_nova)
+
+    def salvar(nome, valores):
+        np.save(os.path.join(pasta_nova, f'{nome}.npy'), valores)
+
+    colunas = {}
+    for k, coluna in enumerate(df_comunidades.columns):
+        valores = df_comunidades[coluna]
+        if coluna in COLUNAS_PORCENTAGENS:
+            salvar(f'coluna_{k}', _matriz_porcentagens(valores, COLUNAS_PORCENTAGENS[coluna]))
+            colunas[coluna] = {'arquivo': f'coluna_{k}', 'tipo': 'porcentagens', 'categorias': list(COLUNAS_PORCENTAGENS[coluna])}
+        elif coluna in COLUNAS_LISTAS:
+            lista, offsets = _lista_com_offsets(valores)
+            salvar(f'coluna_{k}', lista)
+            salvar(f'coluna_{k}_offsets', offsets)
+            colunas[coluna] = {'arquivo': f'coluna_{k}', 'tipo': 'lista'}
+        else:
+            valores = valores.to_numpy()
+            if valores.dtype.kind not in 'biuf':
+                raise ValueError(f'coluna sem tipo numérico: {coluna} ({valores.dtype})')
+            salvar(f'coluna_{k}', valores)
+            colunas[coluna] = {'arquivo': f'coluna_{k}', 'tipo': 'numerico'}
+
+    # posição de cada comunidade dos grupos na tabela (na ordem dos grupos)
+    linhas = pd.Index(df_comunidades['Comunidade'])
+    for nome, grupo in zip(GRUPOS, (pontos_focais, areas_prioritarias, areas_atencao)):
+        salvar(f'grupo_{nome}', linhas.get_indexer(grupo['Comunidade']).astype(np.int64))
+
+    with open(os.path.join(pasta_nova, 'manifesto.json'), 'w') as arquivo:
+        json.dump({'versao': VERSAO_FORMATO, 'comunidades': len(df_comunidades), 'colunas': colunas}, arquivo, indent=2, ensure_ascii=False)
+
+    if os.path.exists(pasta):
+        shutil.rmtree(pasta + '.antigo', ignore_errors=True)
+        os.rename(pasta, pasta + '.antigo')
+    os.rename(pasta_nova, pasta)
+    shutil.rmtree(pasta + '.antigo', ignore_errors=True)
+
+# lê as colunas gravadas como arrays: as porcentagens como (matriz, categorias) e as listas como (valores, offsets)
+# os grupos são as posições das suas linhas na tabela
+def carregar_colunas(pasta):
+    with open(os.path.join(pasta, 'manifesto.json')) as arquivo:
+        manifesto = json.load(arquivo)
+    if manifesto.get('versao') != VERSAO_FORMATO:
+        raise ValueError(f'versão do formato das comunidades não suportada: {manifesto.get("versao")}')
+
+    def carregar(nome):
+        return np.load(os.path.join(pasta, f'{nome}.npy'))
+
+    colunas = {}
+    for coluna, descricao in manifesto['colunas'].items():
+        if descricao['tipo'] == 'porcentagens':
+            colunas[coluna] = (carregar(descricao['arquivo']), descricao['categorias'])
+        elif descricao['tipo'] == 'lista':
+            colunas[coluna] = (carregar(descricao['arquivo']), carregar(descricao['arquivo'] + '_offsets'))
+        else:
+            colunas[coluna] = carregar(descricao['arquivo'])
+
+    return colunas, {nome: carregar(f'grupo_{nome}') for nome in GRUPOS}
+
+# lê o resultado no mesmo formato gerado pelo pipeline: a tabela de comunidades (com as porcentagens como dicionários e as
+# áreas e subáreas como listas ordenadas) e os pontos focais, as áreas prioritárias e as áreas de atenção
+def carregar_comunidades(pasta=PASTA_RESULTADO):
+    colunas, grupos = carregar_colunas(pasta)
+    tabela = {}
+    for coluna, valores in colunas.items():
+        if coluna in COLUNAS_PORCENTAGENS:
+            matriz, categorias = valores
+            presentes = ~np.isnan(matriz)
+            tabela[coluna] = [{categorias[k]: float(matriz[linha, k]) for k in np.flatnonzero(presentes[linha])}
+                              for linha in range(len(matriz))]
+        elif coluna in COLUNAS_LISTAS:
+            tabela[coluna] = _listas(*valores)
+        else:
+            tabela[coluna] = valores
+
+    df_comunidades = pd.DataFrame(tabela)
+    return (df_comunidades,) + tuple(df_comunidades.iloc[grupos[nome]] for nome in GRUPOS)
@@ -0,0 +1,457 @@
+# Este arquivo atualiza um grafo já construído com ocorrências novas, sem reconstruir tudo do zero
+# O estado de uma execução fica gravado numa pasta, dividido em segmentos: o primeiro tem as ocorrências e as arestas
+# do main.py e cada atualização acrescenta um segmento só com as ocorrências novas, as arestas novas, a BallTree das
+# ocorrências novas e as ocorrências antigas que mudaram de comunidade. Os segmentos anteriores não são regravados.
+# Na atualização só são calculadas as arestas que envolvem as ocorrências novas e as comunidades são refinadas pelo
+# Leiden partindo da divisão anterior, só nas comunidades que receberam arestas novas (com a modularidade do grafo
+# inteiro), e as estatísticas só são recalculadas para as comunidades que mudaram.
+# Quando há mais de MAX_SEGMENTOS_INDICE segmentos, todos são juntados num único (compactação)
+#
+# uso: python atualizacao_incremental.py dados/novas-ocorrencias.csv [--estado dados/estado]
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+import artefato_comunidades
+import cache_arestas
+import cache_atributos as ca
+import esparsificacao
+import estatisticas_comunidades as ec
+import funcoes_auxiliares as fa
+import motor_arestas as me
+import pipeline
+
+PASTA_ESTADO = 'dados/estado'
+
+# quantidade máxima de segmentos do estado (cada um com a sua BallTree no índice espacial). Cada atualização acrescenta
+# um segmento só com as ocorrências novas e, quando o limite é ultrapassado, os segmentos são juntados num único
+MAX_SEGMENTOS_INDICE = 8
+
+# ocorrências lidas por bloco na busca das ocorrências de um conjunto de comunidades
+VERTICES_POR_BLOCO = 4000000
+
+def _coordenadas_radianos(colunas, inicio=0, fim=None):
+    return np.radians(np.column_stack((colunas['latitude'][inicio:fim], colunas['longitude'][inicio:fim])))
+
+def _nome_segmento(k):
+    return f'segmento_{k:03d}'
+
+# grava um segmento do estado: as colunas das suas ocorrências, as suas arestas (ordenadas por i e com a ordem por j,
+# para achar as arestas de uma ocorrência sem ler todas), o peso final das arestas, a BallTree das ocorrências,
+# a comunidade de cada ocorrência do segmento, as ocorrências de segmentos anteriores que mudaram de comunidade
+# e a tabela das comunidades
+def _salvar_segmento(pasta, colunas, n_vertices, pares_i, pares_j, componentes, pesos, membership, alteradas, comunidades_alteradas, df_comunidades):
+    ordem = np.lexsort((pares_j, pares_i))
+    pares_i, pares_j = np.asarray(pares_i)[ordem], np.asarray(pares_j)[ordem]
+    pasta_arestas = os.path.join(pasta, 'arestas')
+    cache_arestas.salvar(pasta_arestas, n_vertices, pares_i, pares_j, np.asarray(componentes)[ordem])
+    np.save(os.path.join(pasta_arestas, 'pesos.npy'), np.asarray(pesos, dtype=float)[ordem])
+    ordem_j = np.argsort(pares_j, kind='stable')
+    np.save(os.path.join(pasta_arestas, 'ordem_j.npy'), ordem_j.astype(np.int64))
+    np.save(os.path.join(pasta_arestas, 'pares_j_ordenados.npy'), pares_j[ordem_j].astype(np.int32))
+
+    ca.salvar_colunas(os.path.join(pasta, 'vertices'), colunas)
+    with open(os.path.join(pasta, 'indice_espacial.pkl'), 'wb') as arquivo:
+        pickle.dump(BallTree(_coordenadas_radianos(colunas), metric='haversine'), arquivo)
+    np.save(os.path.join(pasta, 'membership.npy'), np.asarray(membership, dtype=np.int32))
+    np.save(os.path.join(pasta, 'alteradas.npy'), np.asarray(alteradas, dtype=np.int64))
+    np.save(os.path.join(pasta, 'comunidades_alteradas.npy'), np.asarray(comunidades_alteradas, dtype=np.int32))
+    df_comunidades.to_pickle(os.path.join(pasta, 'comunidades.pkl'))
+
+# grava a lista dos segmentos, que é o que torna um segmento novo parte do estado
+# (gravada num arquivo novo que depois substitui o anterior)
+def _salvar_segmentos(pasta, segmentos):
+    caminho = os.path.join(pasta, 'segmentos.json')
+    with open(caminho + '.novo', 'w') as arquivo:
+        json.dump(segmentos, arquivo, indent=2)
+    os.replace(caminho + '.novo', caminho)
+
+# peso final das arestas nas configurações do estado e as arestas que entram no grafo (esparsificação, se usada)
+def _pesos_mantidos(pares_i, pares_j, componentes, parametros):
+    pesos = cache_arestas.reponderar({'nomes': cache_arestas.COMPONENTES, 'componentes': componentes}, parametros['coeficientes'])
+    mantidas = np.zeros(len(pesos), dtype=bool)
+    mantidas[esparsificacao.selecionar_arestas(pares_i, pares_j, pesos, parametros.get('peso_minimo'), parametros.get('top_k'), parametros.get('simetrizacao_top_k', 'uniao'))] = True
+    return pesos, mantidas
+
+# grava o estado de uma execução, com todas as ocorrências e arestas num único segmento
+# a gravação é feita numa pasta nova que depois substitui a anterior, pois os arquivos antigos podem estar abertos com memory-map
+def salvar_estado(pasta, colunas, arestas, membership, df_comunidades, parametros):
+    pesos, mantidas = _pesos_mantidos(arestas['pares_i'], arestas['pares_j'], arestas['componentes'], parametros)
+    membership = np.asarray(membership)
+
+    pasta_nova = pasta + '.novo'
+    shutil.rmtree(pasta_nova, ignore_errors=True)
+    _salvar_segmento(os.path.join(pasta_nova, _nome_segmento(0)), colunas, ca.tamanho(colunas), arestas['pares_i'], arestas['pares_j'],
+                     arestas['componentes'], pesos, membership, [], [], df_comunidades)
+    with open(os.path.join(pasta_nova, 'parametros.json'), 'w') as arquivo:
+        json.dump({**parametros, 'colunas': sorted(colunas)}, arquivo, indent=2)
+    _salvar_segmentos(pasta_nova, {
+        'segmentos': [{'nome': _nome_segmento(0), 'inicio': 0, 'vertices': ca.tamanho(colunas)}],
+        'peso_total': float(pesos[mantidas].sum()),
+        'proxima_comunidade': int(membership.max()) + 1 if len(membership) else 0,
+    })
+
+    if os.path.exists(pasta):
+        shutil.rmtree(pasta + '.antigo', ignore_errors=True)
+        os.rename(pasta, pasta + '.antigo')
+    os.rename(pasta_nova, pasta)
+    shutil.rmtree(pasta + '.antigo', ignore_errors=True)
+
+def _carregar_segmento(pasta, descricao, nomes_colunas):
+    pasta_segmento = os.path.join(pasta, descricao['nome'])
+    pasta_arestas = os.path.join(pasta_segmento, 'arestas')
+    with open(os.path.join(pasta_segmento, 'indice_espacial.pkl'), 'rb') as arquivo:
+        arvore = pickle.load(arquivo)
+    arestas = cache_arestas.carregar(pasta_arestas)
+    arestas['pesos'] = np.load(os.path.join(pasta_arestas, 'pesos.npy'), mmap_mode='r')
+    arestas['ordem_j'] = np.load(os.path.join(pasta_arestas, 'ordem_j.npy'), mmap_mode='r')
+    arestas['pares_j_ordenados'] = np.load(os.path.join(pasta_arestas, 'pares_j_ordenados.npy'), mmap_mode='r')
+
+    return dict(descricao, **{
+        'colunas': ca.abrir_colunas(os.path.join(pasta_segmento, 'vertices'), nomes_colunas),
+        'arestas': arestas,
+        'arvore': arvore,
+        'membership': np.load(os.path.join(pasta_segmento, 'membership.npy'), mmap_mode='r'),
+        'alteradas': np.load(os.path.join(pasta_segmento, 'alteradas.npy')),
+        'comunidades_alteradas': np.load(os.path.join(pasta_segmento, 'comunidades_alteradas.npy')),
+    })
+
+# abre o estado gravado. As colunas, as arestas e o membership dos segmentos ficam em memory-map
+def carregar_estado(pasta):
+    with open(os.path.join(pasta, 'parametros.json')) as arquivo:
+        parametros = json.load(arquivo)
+    with open(os.path.join(pasta, 'segmentos.json')) as arquivo:
+        manifesto = json.load(arquivo)
+
+    segmentos = [_carregar_segmento(pasta, descricao, parametros['colunas']) for descricao in manifesto['segmentos']]
+    ultimo = segmentos[-1]
+    return {
+        'parametros': parametros,
+        'segmentos': segmentos,
+        'vertices': ultimo['inicio'] + ultimo['vertices'],
+        'peso_total': manifesto['peso_total'],
+        'proxima_comunidade': manifesto['proxima_comunidade'],
+        'comunidades': pd.read_pickle(os.path.join(pasta, ultimo['nome'], 'comunidades.pkl')),
+    }
+
+# comunidade atual das ocorrências informadas (índices ordenados): a do segmento da ocorrência, trocada pelas
+# mudanças gravadas nos segmentos seguintes, na ordem em que foram gravadas
+def membership_dos_vertices(estado, vertices):
+    vertices = np.asarray(vertices, dtype=np.int64)
+    membership = np.empty(len(vertices), dtype=np.int64)
+    for segmento in estado['segmentos']:
+        inicio, fim = np.searchsorted(vertices, [segmento['inicio'], segmento['inicio'] + segmento['vertices']])
+        membership[inicio:fim] = segmento['membership'][vertices[inicio:fim] - segmento['inicio']]
+
+    for segmento in estado['segmentos']:
+        alteradas = segmento['alteradas']
+        posicoes = np.minimum(np.searchsorted(vertices, alteradas), max(len(vertices) - 1, 0))
+        presentes = (vertices[posicoes] == alteradas) if len(vertices) else np.zeros(len(alteradas), dtype=bool)
+        membership[posicoes[presentes]] = segmento['comunidades_alteradas'][presentes]
+    return membership
+
+# comunidade atual de todas as ocorrências do estado
+def membership_estado(estado):
+    return membership_dos_vertices(estado, np.arange(estado['vertices']))
+
+# ocorrências (índices ordenados) que estão hoje nas comunidades informadas
+# o membership é lido em blocos, sem ser carregado inteiro na memória
+def _vertices_das_comunidades(estado, comunidades):
+    vertices = []
+    for inicio in range(0, estado['vertices'], VERTICES_POR_BLOCO):
+        bloco = np.arange(inicio, min(inicio + VERTICES_POR_BLOCO, estado['vertices']))
+        vertices.append(bloco[np.isin(membership_dos_vertices(estado, bloco), comunidades)])
+    return np.concatenate(vertices) if vertices else np.empty(0, dtype=np.int64)
+
+# posições [inicios[k], fins[k]) de todos os intervalos, concatenadas
+def _intervalos(inicios, fins):
+    tamanhos = fins - inicios
+    deslocamentos = np.cumsum(tamanhos) - tamanhos
+    return np.repeat(inicios - deslocamentos, tamanhos) + np.arange(tamanhos.sum())
+
+# arestas de todos os segmentos com pelo menos uma ponta nas ocorrências informadas (índices ordenados):
+# pares, componentes e peso final. As arestas de cada segmento são achadas por busca binária nos pares ordenados
+def _arestas_incidentes(segmentos, vertices):
+    partes = []
+    for segmento in segmentos:
+        arestas = segmento['arestas']
+        pela_origem = _intervalos(np.searchsorted(arestas['pares_i'], vertices), np.searchsorted(arestas['pares_i'], vertices, side='right'))
+        pelo_destino = _intervalos(np.searchsorted(arestas['pares_j_ordenados'], vertices), np.searchsorted(arestas['pares_j_ordenados'], vertices, side='right'))
+        posicoes = np.union1d(pela_origem, np.asarray(arestas['ordem_j'][pelo_destino]))
+        partes.append((np.asarray(arestas['pares_i'][posicoes], dtype=np.int64), np.asarray(arestas['pares_j'][posicoes], dtype=np.int64),
+                       np.asarray(arestas['pesos'][posicoes])))
+    if not partes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    return tuple(np.concatenate(lista) for lista in zip(*partes))
+
+# colunas das ocorrências informadas (índices ordenados), copiadas dos segmentos para a memória
+# os códigos de todos os segmentos se referem ao vocabulário do último, que só é estendido a cada segmento
+def _selecionar_vertices(segmentos, vertices):
+    selecao = ca.selecionar(segmentos[-1]['colunas'], [])
+    for segmento in segmentos:
+        inicio, fim = np.searchsorted(vertices, [segmento['inicio'], segmento['inicio'] + segmento['vertices']])
+        if fim > inicio:
+            selecao = ca.concatenar(selecao, ca.selecionar(segmento['colunas'], vertices[inicio:fim] - segmento['inicio']))
+    return selecao
+
+# junta todos os segmentos: colunas, arestas (componentes) e membership de todas as ocorrências, na memória
+def _juntar_segmentos(estado):
+    segmentos = estado['segmentos']
+    colunas = ca.selecionar(segmentos[-1]['colunas'], [])
+    for segmento in segmentos:
+        colunas = ca.concatenar(colunas, segmento['colunas'])
+
+    arestas = {
+        'vertices': estado['vertices'],
+        'nomes': segmentos[0]['arestas']['nomes'],
+        'pares_i': np.concatenate([segmento['arestas']['pares_i'] for segmento in segmentos]),
+        'pares_j': np.concatenate([segmento['arestas']['pares_j'] for segmento in segmentos]),
+        'componentes': np.concatenate([segmento['arestas']['componentes'] for segmento in segmentos]),
+    }
+    return colunas, arestas, membership_estado(estado)
+
+# junta os segmentos do estado gravado num único segmento (e uma única BallTree)
+def compactar(pasta):
+    estado = carregar_estado(pasta)
+    colunas, arestas, membership = _juntar_segmentos(estado)
+    salvar_estado(pasta, colunas, arestas, membership, estado['comunidades'], estado['parametros'])
+
+# pares (i, j), i < j, entre as ocorrências novas (índices a partir de n_antigos) e todas as ocorrências no raio,
+# com a distância em radianos devolvida pela BallTree
+def _pares_novos(arvores, coords_novas, n_antigos, raio_metros):
+    raio_radianos = raio_metros / me.RAIO_TERRA
+    indices_novos = np.arange(n_antigos, n_antigos + len(coords_novas))
+
+    pares_i, pares_j, distancias_pares = [], [], []
+
+    # ocorrências antigas vizinhas das novas, buscadas na BallTree de cada segmento
+    for inicio, arvore in arvores:
+        vizinhos, distancias = arvore.query_radius(coords_novas, r=raio_radianos, return_distance=True)
+        quantidades = [len(v) for v in vizinhos]
+        if sum(quantidades) == 0:
+            continue
+        pares_i.append(np.concatenate(vizinhos).astype(np.int64) + inicio)
+        pares_j.append(np.repeat(indices_novos, quantidades))
+        distancias_pares.append(np.concatenate(distancias))
+
+    # pares entre as próprias ocorrências novas
+    arvore_novas = BallTree(coords_novas, metric='haversine')
+    vizinhos, distancias = arvore_novas.query_radius(coords_novas, r=raio_radianos, return_distance=True)
+    origem = np.repeat(indices_novos, [len(v) for v in vizinhos])
+    destino = np.concatenate(vizinhos).astype(np.int64) + n_antigos
+    distancias = np.concatenate(distancias)
+    selecionados = origem < destino  # evita duplicação de arestas
+    pares_i.append(origem[selecionados])
+    pares_j.append(destino[selecionados])
+    distancias_pares.append(distancias[selecionados])
+
+    pares_i, pares_j, distancias_pares = np.concatenate(pares_i), np.concatenate(pares_j), np.concatenate(distancias_pares)
+    ordem = np.lexsort((pares_j, pares_i))
+    return pares_i[ordem], pares_j[ordem], distancias_pares[ordem]
+
+# calcula os componentes dos pesos dos pares usando apenas as ocorrências envolvidas
+# (selecao tem as colunas das ocorrências envolvidas, na ordem dos índices ordenados 'envolvidos')
+def _componentes_pares(selecao, envolvidos, pares_i, pares_j, distancias_pares, parametros):
+    atributos = me.atributos_das_colunas(selecao)
+    local_i = np.searchsorted(envolvidos, pares_i)
+    local_j = np.searchsorted(envolvidos, pares_j)
+
+    distancias = me.calcular_distancias(local_i, local_j, atributos, parametros['modo_distancia'], distancias_pares)
+    componentes = me.calcular_pesos(local_i, local_j, atributos, parametros['alpha_tempo'], parametros['distancia'], distancias=distancias)
+    return np.column_stack([componentes[nome] for nome in cache_arestas.COMPONENTES]).reshape(-1, len(cache_arestas.COMPONENTES))
+
+# compara a divisão nova com a anterior. Uma comunidade nova não mudou quando tem apenas ocorrências antigas
+# que formavam exatamente uma comunidade anterior. Retorna, para cada comunidade nova, o id da comunidade anterior
+# equivalente ou -1 se ela mudou
+def comunidades_equivalentes(membership_anterior, membership, n_antigos):
+    membership_anterior = np.asarray(membership_anterior, dtype=np.int64)
+    membership = np.asarray(membership, dtype=np.int64)
+    n_comunidades = membership.max() + 1
+
+    tamanho_nova = np.bincount(membership, minlength=n_comunidades)
+    antigas_na_nova = np.bincount(membership[:n_antigos], minlength=n_comunidades)
+    tamanho_anterior = np.bincount(membership_anterior)
+
+    # pares distintos (comunidade nova, comunidade anterior) entre as ocorrências antigas
+    pares = np.unique(np.column_stack((membership[:n_antigos], membership_anterior)), axis=0)
+    origens_por_nova = np.bincount(pares[:, 0], minlength=n_comunidades)
+
+    equivalente = np.full(n_comunidades, -1, dtype=np.int64)
+    candidatas = pares[origens_por_nova[pares[:, 0]] == 1]
+    sem_novas = tamanho_nova[candidatas[:, 0]] == antigas_na_nova[candidatas[:, 0]]
+    iguais = sem_novas & (tamanho_nova[candidatas[:, 0]] == tamanho_anterior[candidatas[:, 1]])
+    equivalente[candidatas[iguais, 0]] = candidatas[iguais, 1]
+    return equivalente
+
+# colunas da tabela das comunidades que continuam valendo depois de uma atualização
+# (a estabilidade entre sementes só vale para a divisão original, e a normalização é refeita na classificação)
+def _colunas_estatisticas(df_comunidades):
+    return [c for c in df_comunidades.columns if not c.endswith('_normalizado') and c not in ('Fator escolha', 'Estabilidade')]
+
+# atualização com todas as arestas na memória e o Leiden no grafo inteiro, usada com o top-k: as arestas mantidas
+# de uma ocorrência antiga dependem das arestas novas, o que muda o grau de ocorrências fora das comunidades refinadas.
+# O estado é regravado num único segmento
+def _atualizar_completo(pasta_estado, estado, novas_colunas, pares_novos_i, pares_novos_j, componentes_novos):
+    parametros = estado['parametros']
+    n_antigos = estado['vertices']
+    colunas, arestas, membership_anterior = _juntar_segmentos(estado)
+    colunas = ca.concatenar(colunas, novas_colunas)
+    n_total = ca.tamanho(colunas)
+    arestas['vertices'] = n_total
+    arestas['pares_i'] = np.concatenate((arestas['pares_i'], pares_novos_i))
+    arestas['pares_j'] = np.concatenate((arestas['pares_j'], pares_novos_j))
+    arestas['componentes'] = np.concatenate((arestas['componentes'], componentes_novos))
+
+    grafo_i, grafo_j = arestas['pares_i'], arestas['pares_j']
+    pesos, mantidas = _pesos_mantidos(grafo_i, grafo_j, arestas['componentes'], parametros)
+    grafo_i, grafo_j, pesos = grafo_i[mantidas], grafo_j[mantidas], pesos[mantidas]
+    g = pipeline.montar_grafo(n_total, grafo_i, grafo_j, pesos)
+
+    # cada ocorrência nova começa numa comunidade própria e o Leiden parte da divisão anterior
+    inicial = np.concatenate((membership_anterior, membership_anterior.max() + 1 + np.arange(n_total - n_antigos)))
+    particao = g.community_leiden(objective_function='modularity', weights='weight', resolution=parametros['resolucao'], initial_membership=inicial.tolist())
+    membership = np.array(particao.membership, dtype=np.int64)
+
+    # as estatísticas das comunidades que não mudaram são reaproveitadas; as ocorrências antigas que ganharam vizinhos
+    # novos podem ter perdido arestas para outras antigas, então as suas comunidades são recalculadas
+    equivalentes = comunidades_equivalentes(membership_anterior, membership, n_antigos)
+    equivalentes[np.unique(membership[pares_novos_i[pares_novos_i < n_antigos]])] = -1
+    alteradas = np.flatnonzero(equivalentes < 0)
+    df_alteradas = ec.calcular_estatisticas(membership, colunas, grafo_i, grafo_j, pesos, comunidades=alteradas)
+
+    reaproveitadas = estado['comunidades'].set_index('Comunidade', drop=False).loc[equivalentes[equivalentes >= 0], _colunas_estatisticas(estado['comunidades'])].copy()
+    reaproveitadas['Comunidade'] = np.flatnonzero(equivalentes >= 0)
+
+    df_comunidades = pd.concat([reaproveitadas, df_alteradas], ignore_index=True)
+    df_comunidades = df_comunidades.sort_values('Comunidade').reset_index(drop=True)
+
+    salvar_estado(pasta_estado, colunas, arestas, membership, df_comunidades, parametros)
+    return len(alteradas)
+
+# insere as ocorrências novas no estado gravado e atualiza as arestas, as comunidades e as estatísticas
+# retorna o estado atualizado (já gravado na pasta) e a quantidade de comunidades recalculadas
+def atualizar(pasta_estado, novas_colunas):
+    estado = carregar_estado(pasta_estado)
+    parametros = estado['parametros']
+    segmentos = estado['segmentos']
+    n_antigos = estado['vertices']
+    n_novas = ca.tamanho(novas_colunas)
+    if n_novas == 0:
+        raise ValueError('nenhuma ocorrência nova para inserir')
+    n_total = n_antigos + n_novas
+
+    # as ocorrências novas passam a usar o vocabulário do estado (estendido com os valores novos)
+    novas_colunas = ca.concatenar(ca.selecionar(segmentos[-1]['colunas'], []), novas_colunas)
+    segmento_novo = {'inicio': n_antigos, 'vertices': n_novas, 'colunas': novas_colunas}
+
+    print(f'Criando arestas das {n_novas} ocorrências novas')
+    arvores = [(segmento['inicio'], segmento['arvore']) for segmento in segmentos]
+    pares_i, pares_j, distancias_pares = _pares_novos(arvores, _coordenadas_radianos(novas_colunas), n_antigos, parametros['distancia'])
+    envolvidos = np.union1d(pares_i, pares_j)
+    componentes = _componentes_pares(_selecionar_vertices(segmentos + [segmento_novo], envolvidos), envolvidos, pares_i, pares_j, distancias_pares, parametros)
+
+    if parametros.get('top_k') is not None:
+        print('Atualizando comunidades (grafo inteiro, top-k)')
+        n_alteradas = _atualizar_completo(pasta_estado, estado, novas_colunas, pares_i, pares_j, componentes)
+        return carregar_estado(pasta_estado), n_alteradas
+
+    print('Atualizando comunidades')
+    # só as arestas novas são ponderadas; as antigas já têm o peso final gravado no seu segmento
+    pesos_novos, mantidas_novas = _pesos_mantidos(pares_i, pares_j, componentes, parametros)
+    peso_total = estado['peso_total'] + float(pesos_novos[mantidas_novas].sum())
+
+    # ocorrências refinadas: as novas e as das comunidades que receberam arestas novas (i é a ponta antiga dos pares)
+    comunidades_tocadas = np.unique(membership_dos_vertices(estado, np.unique(pares_i[pares_i < n_antigos])))
+    antigas = _vertices_das_comunidades(estado, comunidades_tocadas)
+    refinadas = np.concatenate((antigas, np.arange(n_antigos, n_total)))
+    membership_anterior = membership_dos_vertices(estado, antigas)
+
+    # arestas (mantidas) com uma ponta nas ocorrências refinadas: as antigas, buscadas nos segmentos, e as novas
+    antigas_i, antigas_j, antigas_pesos = _arestas_incidentes(segmentos, antigas)
+    if parametros.get('peso_minimo') is not None:
+        acima = antigas_pesos >= parametros['peso_minimo']
+        antigas_i, antigas_j, antigas_pesos = antigas_i[acima], antigas_j[acima], antigas_pesos[acima]
+    grafo_i = np.concatenate((antigas_i, pares_i[mantidas_novas]))
+    grafo_j = np.concatenate((antigas_j, pares_j[mantidas_novas]))
+    pesos = np.concatenate((antigas_pesos, pesos_novos[mantidas_novas]))
+
+    # grau (com pesos) das ocorrências refinadas no grafo inteiro, incluindo as arestas para fora delas
+    local_i = np.searchsorted(refinadas, grafo_i)
+    local_j = np.searchsorted(refinadas, grafo_j)
+    dentro_i = refinadas[np.minimum(local_i, len(refinadas) - 1)] == grafo_i
+    dentro_j = refinadas[np.minimum(local_j, len(refinadas) - 1)] == grafo_j
+    graus = np.bincount(local_i[dentro_i], weights=pesos[dentro_i], minlength=len(refinadas))
+    graus += np.bincount(local_j[dentro_j], weights=pesos[dentro_j], minlength=len(refinadas))
+
+    # o Leiden só move as ocorrências refinadas, entre as suas comunidades, partindo da divisão anterior (cada ocorrência
+    # nova numa comunidade própria). Com o CPM, o grau de cada ocorrência como peso do vértice e resolução / (2 * peso total),
+    # a função otimizada é a modularidade do grafo inteiro, a mesma da detecção completa
+    internas = dentro_i & dentro_j
+    local_i, local_j, pesos_internos = local_i[internas], local_j[internas], pesos[internas]
+    g = pipeline.montar_grafo(len(refinadas), local_i, local_j, pesos_internos)
+    _, inicial = np.unique(membership_anterior, return_inverse=True)
+    inicial = np.concatenate((inicial, inicial.max(initial=-1) + 1 + np.arange(n_novas)))
+    resolucao = parametros['resolucao'] / (2 * peso_total) if peso_total > 0 else 0
+    particao = g.community_leiden(objective_function='CPM', weights='weight', resolution=resolucao, node_weights=graus.tolist(), initial_membership=inicial.tolist())
+    membership_local = np.array(particao.membership, dtype=np.int64)
+
+    # as comunidades que não mudaram mantêm o id e as estatísticas; as outras recebem ids novos
+    equivalentes = comunidades_equivalentes(membership_anterior, membership_local, len(antigas))
+    alteradas = np.flatnonzero(equivalentes < 0)
+    ids = equivalentes.copy()
+    ids[alteradas] = estado['proxima_comunidade'] + np.arange(len(alteradas))
+    membership = ids[membership_local]
+
+    df_alteradas = ec.calcular_estatisticas(membership_local, _selecionar_vertices(segmentos + [segmento_novo], refinadas),
+                                            local_i, local_j, pesos_internos, comunidades=alteradas)
+    df_alteradas['Comunidade'] = ids[alteradas]
+    anteriores = estado['comunidades']
+    removidas = np.setdiff1d(comunidades_tocadas, equivalentes[equivalentes >= 0])
+    df_comunidades = pd.concat([anteriores.loc[~anteriores['Comunidade'].isin(removidas), _colunas_estatisticas(anteriores)], df_alteradas], ignore_index=True)
+    df_comunidades = df_comunidades.sort_values('Comunidade').reset_index(drop=True)
+
+    # o segmento novo só tem as ocorrências novas, as arestas novas e as ocorrências antigas que mudaram de comunidade
+    mudaram = membership[:len(antigas)] != membership_anterior
+    nome = _nome_segmento(int(segmentos[-1]['nome'].rsplit('_', 1)[1]) + 1)
+    pasta_segmento = os.path.join(pasta_estado, nome)
+    shutil.rmtree(pasta_segmento, ignore_errors=True)
+    _salvar_segmento(pasta_segmento, novas_colunas, n_total, pares_i, pares_j, componentes, pesos_novos,
+                     membership[len(antigas):], antigas[mudaram], membership[:len(antigas)][mudaram], df_comunidades)
+    _salvar_segmentos(pasta_estado, {
+        'segmentos': [{chave: segmento[chave] for chave in ('nome', 'inicio', 'vertices')} for segmento in segmentos] +
+                     [{'nome': nome, 'inicio': n_antigos, 'vertices': n_novas}],
+        'peso_total': peso_total,
+        'proxima_comunidade': int(estado['proxima_comunidade'] + len(alteradas)),
+    })
+
+    if len(segmentos) + 1 > MAX_SEGMENTOS_INDICE:
+        print('Compactando os segmentos do estado')
+        compactar(pasta_estado)
+    return carregar_estado(pasta_estado), len(alteradas)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Insere ocorrências novas num grafo já construído e atualiza as comunidades.')
+    parser.add_argument('csv', help='csv com as ocorrências novas (mesmas colunas do dataset filtrado)')
+    parser.add_argument('--estado', default=PASTA_ESTADO, help='pasta com o estado gravado pelo main.py')
+    args = parser.parse_args()
+
+    novas_colunas = ca.calcular_colunas(pd.read_csv(args.csv, usecols=ca.COLUNAS_CSV))
+    estado, n_alteradas = atualizar(args.estado, novas_colunas)
+
+    df_comunidades = estado['comunidades']
+    pontos_focais, areas_prioritarias, areas_atencao = fa.classificar_comunidades(df_comunidades, estado['vertices'])
+    print(f'{n_alteradas} de {len(df_comunidades)} comunidades recalculadas')
+
+    df_comunidades.to_csv('dados/comunidades.csv', index=False)
+    areas_prioritarias.to_csv('dados/prioritarias.csv', index=False)
+    pontos_focais.to_csv('dados/pontos_focais.csv', index=False)
+    areas_atencao.to_csv('dados/areas_atencao.csv', index=False)
+    artefato_comunidades.salvar_comunidades(artefato_comunidades.PASTA_RESULTADO, df_comunidades, pontos_focais, areas_prioritarias, areas_atencao)
+    print("Dados exportados para: 'comunidades.csv'")
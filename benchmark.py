@@ -0,0 +1,208 @@
+# Este arquivo mede o desempenho do pipeline com ocorrências sintéticas (ver gerador_ocorrencias.py), sem o csv da LAPD.
+# Para cada quantidade de ocorrências o pipeline roda num processo separado e cada etapa (leitura, atributos, vizinhos,
+# pesos, louvain, estatísticas e exportação) é cronometrada, junto com o pico de memória e a quantidade de arestas.
+# O resultado é gravado em json, e pode ser comparado com o de outro commit com --comparar
+# Com --vizinhos mede só a busca dos vizinhos, em pares por segundo, com cada método (BallTree e grade)
+#
+# Uso: python benchmark.py --tamanhos 10000 50000 --comparar benchmarks/benchmark_<commit>.json
+#      python benchmark.py --vizinhos --tamanhos 50000 1000000
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import igraph as ig
+import numpy as np
+import pandas as pd
+
+import busca_vizinhos as bv
+import cache_atributos as ca
+import estatisticas_comunidades as ec
+import funcoes_auxiliares as fa
+import gerador_ocorrencias as go
+import instrumentacao
+import motor_arestas as me
+
+TAMANHOS = [10000, 50000, 200000, 1000000]
+ETAPAS = ['leitura', 'atributos', 'vizinhos', 'pesos', 'louvain', 'estatisticas', 'exportacao']
+
+PASTA_RESULTADOS = 'benchmarks'
+
+# razão de tempo (atual / referência) a partir da qual uma etapa é apontada como regressão na comparação
+LIMITE_REGRESSAO = 1.2
+
+# pontos por ladrilho na medição da busca dos vizinhos: os pares são contados ladrilho a ladrilho, sem juntar todos
+# (com 1M de ocorrências os pares não cabem de uma vez na memória)
+PONTOS_POR_LADRILHO = 50000
+
+# roda o pipeline completo para n ocorrências sintéticas (a geração do csv não entra nos tempos)
+def executar_pipeline(n, distancia, alpha_tempo, resolucao, processos, semente, metodo_busca='grade'):
+    relatorio = instrumentacao.Relatorio()
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_csv = os.path.join(pasta, 'dataset-sintetico.csv')
+        go.gerar_ocorrencias(n, semente).to_csv(caminho_csv, index=False)
+
+        with relatorio.etapa('leitura'):
+            df = pd.read_csv(caminho_csv, usecols=ca.COLUNAS_CSV)
+
+        with relatorio.etapa('atributos'):
+            colunas = ca.calcular_colunas(df)
+            del df
+
+        with relatorio.etapa('vizinhos'):
+            pares_i, pares_j, distancias_pares = bv.pares_no_raio(colunas['latitude'], colunas['longitude'], distancia, processos, metodo_busca)
+
+        with relatorio.etapa('pesos'):
+            atributos = me.atributos_das_colunas(colunas)
+            distancias_metros = me.calcular_distancias(pares_i, pares_j, atributos, 'balltree', distancias_pares)
+            pesos = me.calcular_pesos(pares_i, pares_j, atributos, alpha_tempo, distancia, distancias=distancias_metros)['peso_final']
+
+        with relatorio.etapa('louvain'):
+            g = ig.Graph(n=n, edges=np.column_stack((pares_i, pares_j)))
+            g.es['weight'] = pesos.tolist()
+            comunidades = g.community_multilevel(weights='weight', resolution=resolucao)
+
+        with relatorio.etapa('estatisticas'):
+            df_comunidades = ec.calcular_estatisticas(comunidades.membership, colunas, pares_i, pares_j, pesos)
+            classificadas = fa.classificar_comunidades(df_comunidades, n)
+
+        with relatorio.etapa('exportacao'):
+            df_comunidades.to_csv(os.path.join(pasta, 'comunidades.csv'), index=False)
+            for nome, df_classe in zip(('pontos_focais', 'prioritarias', 'areas_atencao'), classificadas):
+                df_classe.to_csv(os.path.join(pasta, f'{nome}.csv'), index=False)
+
+    etapas = relatorio.etapas_por_nome()
+    return {
+        'ocorrencias': n,
+        'arestas': len(pares_i),
+        'comunidades': len(df_comunidades),
+        'segundos_total': sum(etapa['segundos'] for etapa in etapas.values()),
+        'pico_memoria_mb': instrumentacao.pico_memoria_mb(),
+        'etapas': etapas,
+    }
+
+# mede a busca dos vizinhos de n ocorrências sintéticas com cada método, em pares por segundo
+def medir_busca(n, distancia, semente, metodos=bv.METODOS_BUSCA):
+    df = go.gerar_ocorrencias(n, semente)
+    latitudes, longitudes = df['LAT'].to_numpy(dtype=float), df['LON'].to_numpy(dtype=float)
+    del df
+
+    n_ladrilhos = max(1, -(-n // PONTOS_POR_LADRILHO))
+    medicoes = {}
+    for metodo in metodos:
+        inicio = time.perf_counter()
+        pares = sum(len(pares_i) for pares_i, _, _ in bv.pares_em_blocos(latitudes, longitudes, distancia, n_ladrilhos, metodo))
+        segundos = time.perf_counter() - inicio
+        medicoes[metodo] = {'pares': pares, 'segundos': segundos, 'pares_por_segundo': pares / segundos if segundos > 0 else None}
+
+    return {'ocorrencias': n, 'ladrilhos': n_ladrilhos, 'pico_memoria_mb': instrumentacao.pico_memoria_mb(), 'metodos': medicoes}
+
+# roda cada execução num processo novo, assim o pico de memória medido é só o daquela execução
+def _executar_isolado(funcao, *args):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(funcao, args)
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _ambiente():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'igraph': ig.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+# menor tempo de cada etapa entre as repetições de um tamanho (o menos afetado por ruído da máquina)
+def _melhores_tempos(execucoes):
+    return {etapa: min(execucao['etapas'][etapa]['segundos'] for execucao in execucoes) for etapa in ETAPAS}
+
+# compara os tempos de dois resultados, retornando um DataFrame com a razão (atual / referência) por tamanho e etapa
+def comparar(resultado, referencia):
+    referencias = {item['ocorrencias']: item for item in referencia['resultados']}
+    linhas = []
+    for item in resultado['resultados']:
+        if item['ocorrencias'] not in referencias:
+            continue
+        atual = _melhores_tempos(item['execucoes'])
+        anterior = _melhores_tempos(referencias[item['ocorrencias']]['execucoes'])
+        for etapa in ETAPAS:
+            razao = atual[etapa] / anterior[etapa] if anterior[etapa] > 0 else np.nan
+            linhas.append({'ocorrencias': item['ocorrencias'], 'etapa': etapa, 'referencia_s': anterior[etapa],
+                           'atual_s': atual[etapa], 'razao': razao, 'regressao': bool(razao > LIMITE_REGRESSAO)})
+    return pd.DataFrame(linhas)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Mede o tempo e a memória de cada etapa do pipeline com ocorrências sintéticas.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS, help='quantidades de ocorrências medidas')
+    parser.add_argument('--repeticoes', type=int, default=1, help='execuções por tamanho (a comparação usa o menor tempo)')
+    parser.add_argument('--distancia', type=float, default=250, help='distância máxima das arestas, em metros')
+    parser.add_argument('--alpha-tempo', type=float, default=0.15)
+    parser.add_argument('--resolucao', type=float, default=0.8)
+    parser.add_argument('--processos', type=int, default=1, help='processos usados na busca dos vizinhos')
+    parser.add_argument('--busca', default='grade', choices=bv.METODOS_BUSCA, help='método da busca dos vizinhos')
+    parser.add_argument('--vizinhos', action='store_true', help='mede só a busca dos vizinhos (pares por segundo de cada método)')
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--saida', help='json do resultado (padrão: benchmarks/benchmark_<commit>_<data>.json)')
+    parser.add_argument('--comparar', help='json de um resultado anterior, para comparar os tempos')
+    args = parser.parse_args()
+
+    commit = _commit_atual()
+    resultado = {
+        'commit': commit,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': _ambiente(),
+        'parametros': {'distancia': args.distancia, 'alpha_tempo': args.alpha_tempo, 'resolucao': args.resolucao,
+                       'processos': args.processos, 'semente': args.semente, 'busca': args.busca},
+        'resultados': [],
+    }
+
+    if args.vizinhos:
+        resultado['parametros'] = {'distancia': args.distancia, 'semente': args.semente, 'pontos_por_ladrilho': PONTOS_POR_LADRILHO}
+        for n in args.tamanhos:
+            medicao = _executar_isolado(medir_busca, n, args.distancia, args.semente)
+            resultado['resultados'].append(medicao)
+            for metodo, dados in medicao['metodos'].items():
+                print(f"{n} ocorrências, {metodo}: {dados['pares']} pares em {dados['segundos']:.2f}s "
+                      f"({dados['pares_por_segundo']:,.0f} pares/s)")
+
+        saida = args.saida or os.path.join(PASTA_RESULTADOS, f"vizinhos_{commit or 'sem-commit'}_{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+        with open(saida, 'w') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+        print(f'Resultado gravado em {saida}')
+        raise SystemExit
+
+    for n in args.tamanhos:
+        execucoes = []
+        for _ in range(args.repeticoes):
+            execucao = _executar_isolado(executar_pipeline, n, args.distancia, args.alpha_tempo, args.resolucao, args.processos, args.semente, args.busca)
+            execucoes.append(execucao)
+            tempos = ', '.join(f"{etapa} {execucao['etapas'][etapa]['segundos']:.2f}s" for etapa in ETAPAS)
+            print(f"{n} ocorrências, {execucao['arestas']} arestas, pico de {instrumentacao.formatar_mb(execucao['pico_memoria_mb'])}: {tempos}")
+        resultado['resultados'].append({'ocorrencias': n, 'execucoes': execucoes})
+
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, f"benchmark_{commit or 'sem-commit'}_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w') as arquivo:
+        json.dump(resultado, arquivo, indent=2)
+    print(f'Resultado gravado em {saida}')
+
+    if args.comparar:
+        with open(args.comparar) as arquivo:
+            comparacao = comparar(resultado, json.load(arquivo))
+        print(comparacao.to_string(index=False))
+        regressoes = comparacao[comparacao['regressao']]
+        if len(regressoes):
+            print(f'{len(regressoes)} etapas ficaram acima de {LIMITE_REGRESSAO:.0%} do tempo de referência')
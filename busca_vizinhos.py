@@ -0,0 +1,262 @@
+# Este arquivo encontra os pares de ocorrências que estão a menos de uma distância máxima (as arestas do grafo)
+# Há dois métodos de busca, com o mesmo resultado (pares únicos i < j e a distância haversine em radianos):
+# - 'balltree': uma BallTree com todos os pontos, consultada em lotes de pontos (uma chamada por lote, não por ponto)
+# - 'grade': os pontos são distribuídos numa grade uniforme (numa projeção local em que as células têm o lado do raio)
+#   e só os pares de pontos da mesma célula ou de células vizinhas são testados. Para um raio fixo em dados do tamanho
+#   de uma cidade é bem mais rápido que a BallTree
+# A busca pode ser feita em série ou em paralelo: os pontos são divididos em ladrilhos geográficos e cada processo cuida
+# de um ladrilho. Cada ladrilho recebe também os pontos vizinhos numa borda (halo) da largura do raio, para não perder
+# arestas entre ladrilhos
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from motor_arestas import RAIO_TERRA
+
+# quantidade de ladrilhos por processo, mais ladrilhos equilibram melhor a carga entre os processos
+LADRILHOS_POR_PROCESSO = 4
+
+METODOS_BUSCA = ('balltree', 'grade')
+
+# pontos consultados por chamada à BallTree (limita a memória dos resultados intermediários)
+CONSULTAS_POR_LOTE = 20000
+
+# quantidade máxima de pares candidatos testados de uma vez na grade (limita a memória)
+CANDIDATOS_POR_LOTE = 4000000
+
+# folga do lado das células da grade em relação ao raio, para não depender do arredondamento nas fronteiras
+FOLGA_GRADE = 1.01
+
+# metros por grau de latitude na esfera usada pela BallTree
+METROS_POR_GRAU = np.pi * RAIO_TERRA / 180
+
+def _sem_pares():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+# tipo dos índices dos pares: int32 enquanto couber (metade da memória de int64 nos pares)
+def _tipo_indices(n_pontos):
+    return np.int32 if n_pontos <= np.iinfo(np.int32).max else np.int64
+
+# junta os pares de várias partes e ordena por i e depois por j
+# as partes e os arrays intermediários são liberados assim que deixam de ser usados, o que limita o pico de memória
+def _juntar_ordenados(partes):
+    if not partes:
+        return _sem_pares()
+    listas = [list(lista) for lista in zip(*partes)]
+    partes.clear()
+    juntos = []
+    for lista in listas:
+        juntos.append(np.concatenate(lista))
+        lista.clear()
+    pares_i, pares_j, distancias = juntos
+    del juntos
+
+    # os pares são únicos, então ordenar pela chave i * n + j dá a mesma ordem que ordenar por i e depois por j
+    # (e uma única ordenação de inteiros é bem mais rápida que o lexsort)
+    n = int(pares_j.max()) + 1 if len(pares_j) else 0
+    chaves = pares_i.astype(np.int64) * n + pares_j
+    ordem = np.argsort(chaves)
+    del chaves
+    pares_i = pares_i[ordem]
+    pares_j = pares_j[ordem]
+    distancias = distancias[ordem]
+    return pares_i, pares_j, distancias
+
+# consulta os pontos 'consultas' na BallTree e devolve os pares (i, j) com i < j, ordenados por i e depois por j,
+# e a distância (em radianos) entre eles. 'indices' converte a posição dos pontos da árvore para os índices globais
+# os pontos são consultados em lotes, cada lote numa única chamada a query_radius
+def _pares_na_arvore(arvore, indices, coords_consultas, indices_consultas, raio_radianos):
+    indices = np.asarray(indices)
+    indices_consultas = np.asarray(indices_consultas, dtype=indices.dtype)
+    partes = []
+    for inicio in range(0, len(coords_consultas), CONSULTAS_POR_LOTE):
+        fim = inicio + CONSULTAS_POR_LOTE
+        vizinhos, distancias = arvore.query_radius(coords_consultas[inicio:fim], r=raio_radianos, return_distance=True)
+        quantidades = np.fromiter((len(v) for v in vizinhos), dtype=np.int64, count=len(vizinhos))
+        pares_i = np.repeat(indices_consultas[inicio:fim], quantidades)
+        pares_j = indices[np.concatenate(vizinhos).astype(np.int64)]
+        distancias = np.concatenate(distancias)
+
+        selecionados = pares_j > pares_i  # cada par aparece nas consultas das suas duas pontas, fica só uma vez
+        partes.append((pares_i[selecionados], pares_j[selecionados], distancias[selecionados]))
+    return _juntar_ordenados(partes)
+
+# distância haversine em radianos entre os pontos a e b (lat, lon em radianos), a mesma fórmula da métrica 'haversine'
+# da BallTree. cos_lat é o cosseno da latitude de todos os pontos, calculado uma única vez
+def _haversine_radianos(coords, cos_lat, a, b):
+    dlat = coords[b, 0] - coords[a, 0]
+    dlon = coords[b, 1] - coords[a, 1]
+    h = np.sin(dlat / 2) ** 2 + cos_lat[a] * cos_lat[b] * np.sin(dlon / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(h))
+
+# pares candidatos entre as células a e b (posições nos pontos ordenados por célula), mantendo os que estão no raio
+# com mesma_celula=True a e b são a mesma célula e cada par de pontos é testado uma única vez
+def _pares_celulas(inicios_a, quantidades_a, inicios_b, quantidades_b, mesma_celula, ordem, coords, cos_lat, indices, raio_radianos):
+    candidatos = quantidades_a * quantidades_b
+    primeiro = np.concatenate(([0], np.cumsum(candidatos)[:-1]))
+    par_celulas = np.repeat(np.arange(len(candidatos)), candidatos)
+    local = np.arange(candidatos.sum()) - primeiro[par_celulas]
+    posicao_a = inicios_a[par_celulas] + local // quantidades_b[par_celulas]
+    posicao_b = inicios_b[par_celulas] + local % quantidades_b[par_celulas]
+    if mesma_celula:
+        mantidos = posicao_a < posicao_b
+        posicao_a, posicao_b = posicao_a[mantidos], posicao_b[mantidos]
+
+    pontos_a, pontos_b = ordem[posicao_a], ordem[posicao_b]
+    distancias = _haversine_radianos(coords, cos_lat, pontos_a, pontos_b)
+    no_raio = distancias <= raio_radianos
+    i, j = indices[pontos_a[no_raio]], indices[pontos_b[no_raio]]
+    return np.minimum(i, j), np.maximum(i, j), distancias[no_raio]
+
+# busca por grade: na projeção local (x = longitude * cos(latitude extrema), y = latitude) as células têm lado >= raio,
+# então os pares no raio estão na mesma célula ou em células vizinhas. Cada par de células vizinhas é visitado uma vez
+# (a própria célula e as vizinhas à direita e acima). Devolve os pares como _pares_na_arvore, com os índices de 'indices'
+def _pares_grade(coords, indices, raio_radianos):
+    indices = np.asarray(indices)
+    if len(coords) < 2:
+        return _sem_pares()
+
+    lado = raio_radianos * FOLGA_GRADE
+    # a escala da longitude usa a latitude mais distante do equador, onde um grau de longitude é mais curto
+    lat_extrema = np.abs(coords[:, 0]).max() + lado
+
+    # a grade não dá a volta na longitude: perto dos polos ou do antimeridiano (±180°) a busca é feita pela BallTree
+    lado_lon = lado / np.cos(min(lat_extrema, np.radians(89.0)))
+    if lat_extrema >= np.radians(89.0) or coords[:, 1].min() - lado_lon <= -np.pi or coords[:, 1].max() + lado_lon >= np.pi:
+        return _pares_na_arvore(BallTree(coords, metric='haversine'), indices, coords, indices, raio_radianos)
+    celula_y = np.floor((coords[:, 0] - coords[:, 0].min()) / lado).astype(np.int64)
+    celula_x = np.floor((coords[:, 1] - coords[:, 1].min()) * np.cos(lat_extrema) / lado).astype(np.int64)
+
+    # uma linha vazia a mais em y, assim o deslocamento de -1 em y nunca cai na coluna x anterior
+    linhas = celula_y.max() + 2
+    chaves = celula_x * linhas + celula_y
+    ordem = np.argsort(chaves, kind='stable')
+    celulas, inicios, quantidades = np.unique(chaves[ordem], return_index=True, return_counts=True)
+
+    cos_lat = np.cos(coords[:, 0])
+    partes = []
+    for deslocamento in (0, 1, linhas - 1, linhas, linhas + 1):
+        if deslocamento == 0:
+            celulas_a = celulas_b = np.arange(len(celulas))
+        else:
+            posicoes = np.minimum(np.searchsorted(celulas, celulas + deslocamento), len(celulas) - 1)
+            celulas_a = np.flatnonzero(celulas[posicoes] == celulas + deslocamento)
+            celulas_b = posicoes[celulas_a]
+
+        # os pares de células são divididos em lotes de até CANDIDATOS_POR_LOTE pares de pontos
+        acumulado = np.cumsum(quantidades[celulas_a] * quantidades[celulas_b])
+        limites = np.searchsorted(acumulado, np.arange(CANDIDATOS_POR_LOTE, acumulado[-1] if len(acumulado) else 0, CANDIDATOS_POR_LOTE), side='right')
+        for lote_a, lote_b in zip(np.split(celulas_a, limites), np.split(celulas_b, limites)):
+            if len(lote_a):
+                partes.append(_pares_celulas(inicios[lote_a], quantidades[lote_a], inicios[lote_b], quantidades[lote_b],
+                                             deslocamento == 0, ordem, coords, cos_lat, indices, raio_radianos))
+    return _juntar_ordenados(partes)
+
+# trabalho de um processo: busca os vizinhos dos pontos do núcleo entre os pontos do ladrilho (núcleo + halo)
+def _pares_ladrilho(tarefa):
+    indices_nucleo, indices_ladrilho, coords_ladrilho, raio_radianos, metodo = tarefa
+    if metodo == 'grade':
+        # cada par fica com o ladrilho cujo núcleo contém o menor índice, como na busca pela BallTree
+        pares_i, pares_j, distancias = _pares_grade(coords_ladrilho, indices_ladrilho, raio_radianos)
+        no_nucleo = np.isin(pares_i, indices_nucleo)
+        return pares_i[no_nucleo], pares_j[no_nucleo], distancias[no_nucleo]
+
+    arvore = BallTree(coords_ladrilho, metric='haversine')
+    posicao_nucleo = np.searchsorted(indices_ladrilho, indices_nucleo)
+    return _pares_na_arvore(arvore, indices_ladrilho, coords_ladrilho[posicao_nucleo], indices_nucleo, raio_radianos)
+
+# divide os pontos em ladrilhos de tamanho parecido (faixas de latitude divididas em faixas de longitude, pelos quantis)
+# retorna, para cada ladrilho, os índices dos pontos do núcleo e os índices de todos os pontos do ladrilho (núcleo + halo)
+def particionar_ladrilhos(latitudes, longitudes, raio_metros, n_ladrilhos):
+    n_faixas = max(1, int(np.sqrt(n_ladrilhos)))
+    n_colunas = max(1, n_ladrilhos // n_faixas)
+
+    # a borda tem 1% de folga para não depender do arredondamento nas fronteiras
+    borda_lat = raio_metros / METROS_POR_GRAU * 1.01
+
+    limites_lat = np.quantile(latitudes, np.linspace(0, 1, n_faixas + 1)[1:-1])
+    faixa = np.searchsorted(limites_lat, latitudes, side='right')
+
+    ladrilhos = []
+    for f in range(n_faixas):
+        na_faixa = np.flatnonzero(faixa == f)
+        if len(na_faixa) == 0:
+            continue
+        lat_min, lat_max = latitudes[na_faixa].min(), latitudes[na_faixa].max()
+
+        # a largura em graus de longitude do raio cresce com a latitude, usa-se a latitude mais distante do equador da faixa
+        lat_extrema = min(89.0, max(abs(lat_min - borda_lat), abs(lat_max + borda_lat)))
+        borda_lon = borda_lat / np.cos(np.radians(lat_extrema))
+
+        limites_lon = np.quantile(longitudes[na_faixa], np.linspace(0, 1, n_colunas + 1)[1:-1])
+        coluna = np.searchsorted(limites_lon, longitudes[na_faixa], side='right')
+
+        for c in range(n_colunas):
+            nucleo = na_faixa[coluna == c]
+            if len(nucleo) == 0:
+                continue
+            lat_lo, lat_hi = latitudes[nucleo].min() - borda_lat, latitudes[nucleo].max() + borda_lat
+            lon_lo, lon_hi = longitudes[nucleo].min() - borda_lon, longitudes[nucleo].max() + borda_lon
+
+            no_ladrilho = (latitudes >= lat_lo) & (latitudes <= lat_hi) & (longitudes >= lon_lo) & (longitudes <= lon_hi)
+            ladrilhos.append((nucleo, np.flatnonzero(no_ladrilho)))
+
+    return ladrilhos
+
+# contexto dos processos: 'fork' evita que os processos filhos executem novamente o script principal
+def contexto_processos():
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+# busca os pares ladrilho a ladrilho (ver particionar_ladrilhos), devolvendo os (pares_i, pares_j, distancias) de cada
+# ladrilho sem juntar tudo, para quando os pares não cabem de uma vez na memória. Cada par aparece num único ladrilho
+# (o do núcleo que contém o menor índice), ordenado por i e j dentro do ladrilho
+def pares_em_blocos(latitudes, longitudes, raio_metros, n_ladrilhos, metodo='grade'):
+    if metodo not in METODOS_BUSCA:
+        raise ValueError(f'método de busca desconhecido: {metodo} (use um de {METODOS_BUSCA})')
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    coords_rad = np.radians(np.column_stack((latitudes, longitudes)))
+    raio_radianos = raio_metros / RAIO_TERRA
+    tipo = _tipo_indices(len(coords_rad))
+
+    for nucleo, todos in particionar_ladrilhos(latitudes, longitudes, raio_metros, n_ladrilhos):
+        yield _pares_ladrilho((nucleo.astype(tipo), todos.astype(tipo), coords_rad[todos], raio_radianos, metodo))
+
+# encontra todos os pares (i, j), i < j, de ocorrências a até raio_metros de distância
+# retorna os arrays pares_i, pares_j (ordenados por i e depois por j; int32 até 2^31 pontos) e a distância de cada par em radianos
+# metodo é 'balltree' ou 'grade' (ver o início do arquivo), os dois encontram os mesmos pares
+# com processos > 1 a busca é feita em paralelo por ladrilhos, com resultado idêntico ao da busca em série
+def pares_no_raio(latitudes, longitudes, raio_metros, processos=1, metodo='grade'):
+    if metodo not in METODOS_BUSCA:
+        raise ValueError(f'método de busca desconhecido: {metodo} (use um de {METODOS_BUSCA})')
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    coords_rad = np.radians(np.column_stack((latitudes, longitudes)))
+    raio_radianos = raio_metros / RAIO_TERRA
+    if len(coords_rad) < 2:
+        return _sem_pares()
+
+    tipo = _tipo_indices(len(coords_rad))
+    if processos <= 1:
+        indices = np.arange(len(coords_rad), dtype=tipo)
+        if metodo == 'grade':
+            return _pares_grade(coords_rad, indices, raio_radianos)
+        # BallTree é uma estrutura de dados que permite fazer busca eficiente com base na distância entre os nós.
+        # ela atende bem nosso uso pois temos uma distância máxima como critério de criação de arestas
+        arvore = BallTree(coords_rad, metric='haversine')
+        return _pares_na_arvore(arvore, indices, coords_rad, indices, raio_radianos)
+
+    ladrilhos = particionar_ladrilhos(latitudes, longitudes, raio_metros, processos * LADRILHOS_POR_PROCESSO)
+    tarefas = [(nucleo.astype(tipo), todos.astype(tipo), coords_rad[todos], raio_radianos, metodo) for nucleo, todos in ladrilhos]
+
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto_processos()) as executor:
+        resultados = list(executor.map(_pares_ladrilho, tarefas))
+
+    # cada par é encontrado uma única vez (pelo ladrilho cujo núcleo contém o menor índice),
+    # basta ordenar para ficar na mesma ordem da busca em série
+    return _juntar_ordenados(resultados)
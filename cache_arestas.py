@@ -0,0 +1,87 @@
+# Este arquivo guarda em disco as arestas do grafo com os componentes do peso separados (um componente por coluna)
+# Como só os componentes dependem dos dados, trocar os coeficientes do peso final não exige recriar as arestas:
+# o peso de todas as arestas sai de um único produto matriz-vetor (ver reponderar)
+
+import hashlib
+import json
+import os
+
+import igraph as ig
+import numpy as np
+
+from cache_atributos import PASTA_CACHE
+from motor_arestas import COEFICIENTES
+
+VERSAO_CACHE = 1
+
+# ordem das colunas da matriz de componentes
+COMPONENTES = list(COEFICIENTES)
+
+# identifica as arestas pelo conteúdo das colunas das ocorrências (amostra) e pelos parâmetros que alteram os componentes
+# esparsificacao são os parâmetros da esparsificação feita na criação das arestas (None quando todas as arestas são mantidas)
+def chave(colunas, distancia_maxima, alpha_tempo, modo_distancia, esparsificacao=None):
+    h = hashlib.sha256()
+    for nome in sorted(colunas):
+        h.update(nome.encode())
+        h.update(np.ascontiguousarray(colunas[nome]).tobytes())
+    h.update(json.dumps([VERSAO_CACHE, distancia_maxima, alpha_tempo, modo_distancia]).encode())
+    if esparsificacao is not None:
+        h.update(json.dumps(esparsificacao, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+def pasta_arestas(chave_arestas):
+    return os.path.join(PASTA_CACHE, 'arestas', chave_arestas)
+
+# grava as arestas: pares (int32) e a matriz de componentes (arestas x componentes, float64)
+# os componentes podem ser o dicionário devolvido por motor_arestas.calcular_pesos ou a própria matriz
+# vizinhos (opcional) é a quantidade de vizinhos no raio de cada ocorrência, quando nem todos os pares viraram arestas
+def salvar(pasta, n_vertices, pares_i, pares_j, componentes, vizinhos=None):
+    if isinstance(componentes, dict):
+        componentes = np.column_stack([componentes[nome] for nome in COMPONENTES])
+
+    os.makedirs(pasta, exist_ok=True)
+    if os.path.exists(os.path.join(pasta, 'manifesto.json')):
+        os.remove(os.path.join(pasta, 'manifesto.json'))
+
+    np.save(os.path.join(pasta, 'pares_i.npy'), np.asarray(pares_i, dtype=np.int32))
+    np.save(os.path.join(pasta, 'pares_j.npy'), np.asarray(pares_j, dtype=np.int32))
+    np.save(os.path.join(pasta, 'componentes.npy'), np.asarray(componentes, dtype=float))
+    if vizinhos is not None:
+        np.save(os.path.join(pasta, 'vizinhos.npy'), np.asarray(vizinhos, dtype=np.int32))
+    elif os.path.exists(os.path.join(pasta, 'vizinhos.npy')):
+        os.remove(os.path.join(pasta, 'vizinhos.npy'))
+
+    with open(os.path.join(pasta, 'manifesto.json'), 'w') as arquivo:
+        json.dump({'versao': VERSAO_CACHE, 'vertices': int(n_vertices), 'arestas': len(pares_i), 'componentes': COMPONENTES}, arquivo, indent=2)
+
+# abre as arestas gravadas com memory-map, retornando None se não existirem
+def carregar(pasta):
+    try:
+        with open(os.path.join(pasta, 'manifesto.json')) as arquivo:
+            manifesto = json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+    if manifesto.get('versao') != VERSAO_CACHE:
+        return None
+
+    arestas = {
+        'vertices': manifesto['vertices'],
+        'nomes': manifesto['componentes'],
+        'pares_i': np.load(os.path.join(pasta, 'pares_i.npy'), mmap_mode='r'),
+        'pares_j': np.load(os.path.join(pasta, 'pares_j.npy'), mmap_mode='r'),
+        'componentes': np.load(os.path.join(pasta, 'componentes.npy'), mmap_mode='r'),
+    }
+    if os.path.exists(os.path.join(pasta, 'vizinhos.npy')):
+        arestas['vizinhos'] = np.load(os.path.join(pasta, 'vizinhos.npy'), mmap_mode='r')
+    return arestas
+
+# calcula o peso final de todas as arestas para os coeficientes informados (um coeficiente por componente)
+def reponderar(arestas, coeficientes=COEFICIENTES):
+    vetor = np.array([coeficientes.get(nome, 0) for nome in arestas['nomes']], dtype=float)
+    return arestas['componentes'] @ vetor
+
+# monta o grafo (apenas a estrutura e os pesos) a partir das arestas gravadas, para reagrupar com outros coeficientes
+def montar_grafo(arestas, coeficientes=COEFICIENTES):
+    g = ig.Graph(n=arestas['vertices'], edges=np.column_stack((arestas['pares_i'], arestas['pares_j'])))
+    g.es['weight'] = reponderar(arestas, coeficientes).tolist()
+    return g
@@ -0,0 +1,246 @@
+# Este arquivo pré-processa o dataset filtrado uma única vez e guarda os atributos das ocorrências num cache em disco
+# Cada atributo vira um arquivo .npy tipado (minutos do dia, ids de categoria, mocodes codificados...) numa pasta do cache,
+# que é aberta com memory-map nas execuções seguintes, sem precisar ler o csv nem usar df.apply de novo.
+# O cache é identificado pelo hash do arquivo de origem e pela sua data de modificação
+
+import hashlib
+import json
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import funcoes_auxiliares as fa
+
+# versão do formato do cache, deve ser incrementada quando os atributos gerados mudarem
+VERSAO_CACHE = 2
+
+PASTA_CACHE = 'dados/cache'
+
+COLUNAS_CSV = ['LAT', 'LON', 'TIME OCC', 'Crm Cd', 'Crm Cd 2', 'Crm Cd 3', 'Crm Cd 4', 'Mocodes', 'Weapon Used Cd',
+               'Vict Age', 'Vict Sex', 'Vict Descent', 'AREA', 'AREA NAME', 'Rpt Dist No']
+
+# colunas no formato CSR (offsets + valores), tratadas de forma especial na seleção de linhas
+COLUNAS_CSR = {'mocodes': ('mocodes_offsets', 'mocodes_valores')}
+
+# colunas que não são por ocorrência (vocabulários dos códigos)
+VOCABULARIOS = ('mocodes_vocabulario', 'sexo_vocabulario', 'descendencia_vocabulario', 'area_vocabulario')
+
+def _hash_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+# menor tipo inteiro com sinal que guarda os códigos de um vocabulário (mais o -1 dos valores ausentes)
+def _tipo_codigos(tamanho_vocabulario):
+    return np.int8 if tamanho_vocabulario <= np.iinfo(np.int8).max else np.int16 if tamanho_vocabulario <= np.iinfo(np.int16).max else np.int32
+
+# converte uma coluna de texto em códigos inteiros (-1 para valores ausentes) e o vocabulário dos códigos
+def _codificar_texto(coluna):
+    codigos, vocabulario = pd.factorize(coluna)
+    return codigos.astype(_tipo_codigos(len(vocabulario))), np.asarray(vocabulario, dtype=str)
+
+# calcula os atributos das ocorrências a partir do dataframe lido do csv
+# cada coluna usa o menor tipo que guarda os seus valores (ids de categoria em uint8, minutos do dia em uint16...)
+# as coordenadas continuam em float64: em float32 o arredondamento (~0,5 m) mudaria arestas no limite do raio de busca
+def calcular_colunas(df):
+    colunas = {
+        'latitude': df['LAT'].to_numpy(dtype=float),
+        'longitude': df['LON'].to_numpy(dtype=float),
+        'cat_crime': fa.ids_cat_crime(df['Crm Cd']),
+        'cat_arma': fa.ids_cat_arma(df['Weapon Used Cd']),
+        'cod_area': df['AREA'].to_numpy(dtype=np.uint8),
+        'cod_subarea': df['Rpt Dist No'].to_numpy(dtype=np.int16),
+    }
+
+    # horario militar (hhmm) convertido em minutos do dia
+    horario = df['TIME OCC'].to_numpy(dtype=np.int64)
+    colunas['minutos'] = ((horario // 100) * 60 + horario % 100).astype(np.uint16)
+
+    # categorias secundárias como máscara de bits, o bit k indica a categoria de id k (códigos sem categoria são ignorados)
+    secundarias = np.zeros(len(df), dtype=np.uint16)
+    for coluna in ('Crm Cd 2', 'Crm Cd 3', 'Crm Cd 4'):
+        ids = fa.ids_cat_crime(df[coluna])
+        conhecidos = ids != fa.ID_CRIME_INDEFINIDO
+        secundarias[conhecidos] |= (1 << ids[conhecidos].astype(np.uint16)).astype(np.uint16)
+    colunas['crm_secundarios'] = secundarias
+
+    # mocodes no formato CSR, sem o mocode 1501 (assim como na leitura feita no main.py, 'nan' representa mocodes ausentes)
+    tokens = df['Mocodes'].map(str).str.split().explode()
+    tokens = tokens[tokens.notna() & (tokens != fa.MOCODE_IGNORADO)]
+    valores, vocabulario = pd.factorize(tokens)
+    contagem = np.bincount(tokens.index.to_numpy(), minlength=len(df))
+    colunas['mocodes_offsets'] = np.concatenate(([0], np.cumsum(contagem))).astype(np.int64)
+    colunas['mocodes_valores'] = valores.astype(np.uint16 if len(vocabulario) <= np.iinfo(np.uint16).max else np.int32)
+    colunas['mocodes_vocabulario'] = np.asarray(vocabulario, dtype=str)
+
+    # perfil da vitima: idade 0 (ou ausente) representa idade desconhecida, assim como em fa.gerar_perfil
+    # (idades fora da faixa do int8 também são tratadas como desconhecidas)
+    idades = df['Vict Age'].fillna(0).to_numpy(dtype=np.int64)
+    fora_da_faixa = (idades < np.iinfo(np.int8).min) | (idades > np.iinfo(np.int8).max)
+    colunas['idade_vitima'] = np.where(fora_da_faixa, 0, idades).astype(np.int8)
+    colunas['sexo_vitima'], colunas['sexo_vocabulario'] = _codificar_texto(df['Vict Sex'])
+    colunas['descendencia_vitima'], colunas['descendencia_vocabulario'] = _codificar_texto(df['Vict Descent'])
+    colunas['area'], colunas['area_vocabulario'] = _codificar_texto(df['AREA NAME'])
+
+    return colunas
+
+def _pasta_cache(caminho_csv):
+    return os.path.join(PASTA_CACHE, os.path.splitext(os.path.basename(caminho_csv))[0])
+
+def _ler_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, 'manifesto.json')) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+def _escrever_manifesto(pasta, manifesto):
+    with open(os.path.join(pasta, 'manifesto.json'), 'w') as arquivo:
+        json.dump(manifesto, arquivo, indent=2)
+
+# verifica se o cache da pasta corresponde ao csv. Se só a data de modificação mudou, o hash do conteúdo decide
+def _cache_valido(pasta, caminho_csv, estado):
+    manifesto = _ler_manifesto(pasta)
+    if manifesto is None or manifesto.get('versao') != VERSAO_CACHE:
+        return False
+    if manifesto['tamanho'] == estado.st_size and manifesto['mtime_ns'] == estado.st_mtime_ns:
+        return True
+    if manifesto['tamanho'] != estado.st_size or manifesto['sha256'] != _hash_arquivo(caminho_csv):
+        return False
+
+    manifesto['mtime_ns'] = estado.st_mtime_ns
+    _escrever_manifesto(pasta, manifesto)
+    return True
+
+# gera (se necessário) e abre o cache de atributos do csv, retornando um dicionário de arrays abertos com memory-map
+def carregar(caminho_csv):
+    pasta = _pasta_cache(caminho_csv)
+    estado = os.stat(caminho_csv)
+
+    if not _cache_valido(pasta, caminho_csv, estado):
+        df = pd.read_csv(caminho_csv, usecols=COLUNAS_CSV)
+        colunas = calcular_colunas(df)
+
+        # o manifesto antigo é removido antes, para que um cache gravado pela metade nunca seja considerado válido
+        os.makedirs(pasta, exist_ok=True)
+        if os.path.exists(os.path.join(pasta, 'manifesto.json')):
+            os.remove(os.path.join(pasta, 'manifesto.json'))
+        salvar_colunas(pasta, colunas)
+        _escrever_manifesto(pasta, {
+            'versao': VERSAO_CACHE,
+            'arquivo': os.path.abspath(caminho_csv),
+            'tamanho': estado.st_size,
+            'mtime_ns': estado.st_mtime_ns,
+            'sha256': _hash_arquivo(caminho_csv),
+            'ocorrencias': len(df),
+            'colunas': sorted(colunas),
+        })
+
+    return abrir_colunas(pasta, _ler_manifesto(pasta)['colunas'])
+
+# grava cada coluna num arquivo .npy da pasta
+def salvar_colunas(pasta, colunas):
+    os.makedirs(pasta, exist_ok=True)
+    for nome, valores in colunas.items():
+        np.save(os.path.join(pasta, f'{nome}.npy'), valores)
+
+# abre as colunas gravadas por salvar_colunas com memory-map
+def abrir_colunas(pasta, nomes):
+    return {nome: np.load(os.path.join(pasta, f'{nome}.npy'), mmap_mode='r') for nome in nomes}
+
+# quantidade de ocorrências guardadas nas colunas
+def tamanho(colunas):
+    return len(colunas['latitude'])
+
+# seleciona as ocorrências dos índices informados (na ordem dada), copiando-as para a memória
+def selecionar(colunas, indices):
+    indices = np.asarray(indices, dtype=np.int64)
+    csr = {nome for par in COLUNAS_CSR.values() for nome in par}
+    selecao = {nome: np.array(valores) for nome, valores in colunas.items() if nome in VOCABULARIOS}
+    selecao.update({nome: np.asarray(valores[indices]) for nome, valores in colunas.items() if nome not in VOCABULARIOS and nome not in csr})
+
+    for nome_offsets, nome_valores in COLUNAS_CSR.values():
+        offsets = colunas[nome_offsets]
+        inicios = np.asarray(offsets[indices])
+        tamanhos = np.asarray(offsets[indices + 1]) - inicios
+        novos_offsets = np.concatenate(([0], np.cumsum(tamanhos))).astype(np.int64)
+        posicoes = np.repeat(inicios - novos_offsets[:-1], tamanhos) + np.arange(novos_offsets[-1])
+        selecao[nome_offsets] = novos_offsets
+        selecao[nome_valores] = np.asarray(colunas[nome_valores][posicoes])
+
+    return selecao
+
+# colunas de códigos e o vocabulário a que cada uma se refere
+CODIGOS_VOCABULARIO = {
+    'mocodes_valores': 'mocodes_vocabulario',
+    'sexo_vitima': 'sexo_vocabulario',
+    'descendencia_vitima': 'descendencia_vocabulario',
+    'area': 'area_vocabulario',
+}
+
+# junta as ocorrências de colunas_b depois das de colunas_a
+# os códigos de colunas_b são convertidos para o vocabulário de colunas_a, que é estendido com os valores novos
+def concatenar(colunas_a, colunas_b):
+    juntas = {}
+    for nome_codigos, nome_vocabulario in CODIGOS_VOCABULARIO.items():
+        posicoes = {valor: k for k, valor in enumerate(colunas_a[nome_vocabulario].tolist())}
+        conversao = np.array([posicoes.setdefault(valor, len(posicoes)) for valor in colunas_b[nome_vocabulario].tolist()] + [-1], dtype=np.int64)
+
+        # o código -1 (valor ausente) continua -1, pois conversao[-1] == -1
+        # o tipo dos códigos só aumenta se o vocabulário estendido não couber mais nele
+        codigos_a = np.asarray(colunas_a[nome_codigos])
+        codigos_b = conversao[np.asarray(colunas_b[nome_codigos], dtype=np.int64)]
+        tipo = codigos_a.dtype if len(posicoes) <= np.iinfo(codigos_a.dtype).max else _tipo_codigos(len(posicoes))
+        juntas[nome_codigos] = np.concatenate((codigos_a.astype(tipo), codigos_b.astype(tipo)))
+        juntas[nome_vocabulario] = np.array(list(posicoes), dtype=str)
+
+    for nome_offsets, nome_valores in COLUNAS_CSR.values():
+        offsets_a = np.asarray(colunas_a[nome_offsets])
+        juntas[nome_offsets] = np.concatenate((offsets_a, np.asarray(colunas_b[nome_offsets])[1:] + offsets_a[-1]))
+
+    for nome in colunas_a:
+        if nome not in juntas:
+            juntas[nome] = np.concatenate((np.asarray(colunas_a[nome]), np.asarray(colunas_b[nome]).astype(colunas_a[nome].dtype)))
+
+    return juntas
+
+# listas de mocodes (strings) de cada ocorrência
+def listas_mocodes(colunas):
+    offsets, valores, vocabulario = colunas['mocodes_offsets'], colunas['mocodes_valores'], colunas['mocodes_vocabulario']
+    return [vocabulario[valores[offsets[k]:offsets[k + 1]]].tolist() for k in range(len(offsets) - 1)]
+
+# listas com os nomes das categorias secundárias de crime de cada ocorrência
+def listas_categorias_secundarias(colunas):
+    return [[categoria for id_categoria, categoria in enumerate(fa.CATEGORIAS_CRIME) if mascara >> id_categoria & 1]
+            for mascara in colunas['crm_secundarios'].tolist()]
+
+def _valor_vocabulario(vocabulario, codigo):
+    return None if codigo < 0 else str(vocabulario[codigo])
+
+# perfis de vitima (dicionários de fa.gerar_perfil) de cada ocorrência
+def perfis_vitima(colunas):
+    return [{
+        'idade': None if idade == 0 else idade,
+        'sexo': _valor_vocabulario(colunas['sexo_vocabulario'], sexo),
+        'descendencia': _valor_vocabulario(colunas['descendencia_vocabulario'], descendencia),
+    } for idade, sexo, descendencia in zip(colunas['idade_vitima'].tolist(), colunas['sexo_vitima'].tolist(), colunas['descendencia_vitima'].tolist())]
+
+# preenche os atributos dos vértices do grafo (um vértice por ocorrência, na ordem das colunas)
+def preencher_vertices(g, colunas):
+    g.vs['latitude'] = colunas['latitude']
+    g.vs['longitude'] = colunas['longitude']
+    g.vs['horario'] = [timedelta(minutes=minutos) for minutos in colunas['minutos'].tolist()] # horarios em timedelta (facilita cálculos)
+    g.vs['cat_crime'] = [fa.CATEGORIAS_CRIME[id_categoria] for id_categoria in colunas['cat_crime']]
+    g.vs['mocodes'] = listas_mocodes(colunas) # o mocode 1501 é desconsiderado nas comparações
+    g.vs['cat_arma'] = [fa.CATEGORIAS_ARMA[id_categoria] for id_categoria in colunas['cat_arma']]
+    g.vs['crm_cods'] = listas_categorias_secundarias(colunas)
+    g.vs['perfil_vitima'] = perfis_vitima(colunas)
+
+    # dados que serão usados nas análises de dados das comunidades
+    g.vs['cod_area'] = colunas['cod_area']
+    g.vs['area'] = colunas['area_vocabulario'][colunas['area']]
+    g.vs['cod_subarea'] = colunas['cod_subarea']
@@ -0,0 +1,59 @@
+# Este arquivo guarda conjuntos de códigos (mocodes, categorias secundárias de crime) como bitsets
+# Cada vértice vira uma linha de palavras uint64, onde o bit k indica a presença do k-ésimo código do vocabulário.
+# Assim a similaridade de jaccard de um lote inteiro de pares sai de um AND/OR entre linhas e uma contagem de bits
+
+import numpy as np
+
+BITS_POR_PALAVRA = 64
+
+# quantidade de pares processados por vez (limita a memória das matrizes intermediárias)
+TAMANHO_LOTE = 500000
+
+# quantidade de bits 1 em cada byte, usada quando a versão do numpy não tem np.bitwise_count
+_BITS_POR_BYTE = np.array([bin(b).count('1') for b in range(256)], dtype=np.uint8)
+
+# conta os bits 1 de cada linha de uma matriz de palavras uint64
+def contar_bits(palavras):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(palavras).sum(axis=-1, dtype=np.int64)
+    bytes_palavras = np.ascontiguousarray(palavras).view(np.uint8)
+    return _BITS_POR_BYTE[bytes_palavras].sum(axis=-1, dtype=np.int64)
+
+# monta o bitset de cada lista de códigos, retornando a matriz (n x palavras) e o vocabulário (código -> bit)
+# se um vocabulário for informado ele é reaproveitado e estendido com os códigos novos
+def codificar_conjuntos(listas, vocabulario=None):
+    if vocabulario is None:
+        vocabulario = {}
+
+    posicoes = [[vocabulario.setdefault(codigo, len(vocabulario)) for codigo in lista] for lista in listas]
+    return montar_bitsets(posicoes, len(vocabulario)), vocabulario
+
+# monta a matriz de bitsets a partir das posições (bits) ativas de cada linha
+def montar_bitsets(posicoes, n_bits):
+    tamanhos = np.array([len(p) for p in posicoes], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(tamanhos)))
+    valores = np.fromiter((p for lista in posicoes for p in lista), dtype=np.int64, count=offsets[-1])
+    return montar_bitsets_csr(offsets, valores, n_bits)
+
+# monta a matriz de bitsets a partir de listas no formato CSR: os bits da linha k são valores[offsets[k]:offsets[k + 1]]
+def montar_bitsets_csr(offsets, valores, n_bits):
+    offsets = np.asarray(offsets, dtype=np.int64)
+    colunas = np.asarray(valores, dtype=np.int64)
+    n_palavras = max(1, -(-n_bits // BITS_POR_PALAVRA))
+    bits = np.zeros((len(offsets) - 1, n_palavras), dtype=np.uint64)
+
+    linhas = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    np.bitwise_or.at(bits, (linhas, colunas // BITS_POR_PALAVRA), np.left_shift(np.uint64(1), (colunas % BITS_POR_PALAVRA).astype(np.uint64)))
+    return bits
+
+# similaridade de jaccard entre os conjuntos das linhas i e j (0 quando os dois conjuntos são vazios)
+def jaccard_pares(bits, i, j):
+    tamanhos = contar_bits(bits)
+    intersecao = np.empty(len(i), dtype=np.int64)
+
+    for inicio in range(0, len(i), TAMANHO_LOTE):
+        fim = inicio + TAMANHO_LOTE
+        intersecao[inicio:fim] = contar_bits(bits[i[inicio:fim]] & bits[j[inicio:fim]])
+
+    uniao = tamanhos[i] + tamanhos[j] - intersecao
+    return np.divide(intersecao, uniao, out=np.zeros(len(i)), where=uniao > 0)
@@ -0,0 +1,253 @@
+# Este arquivo responde, para uma coordenada (ou um lote delas), em qual comunidade ela está, o tipo da comunidade
+# (ponto focal, área prioritária, área de atenção ou comum) e as suas principais estatísticas.
+# O índice é montado a partir do resultado de uma execução do main.py (grafo binário + resultado das comunidades):
+# uma BallTree haversine com as ocorrências (a comunidade é a da ocorrência mais próxima, até RAIO_METROS) e outra com os
+# centros das comunidades selecionadas (a selecionada mais próxima). As árvores são gravadas com joblib e abertas com
+# memory-map, então abrir o índice é rápido. Há uma API Python (IndiceConsulta) e um endpoint HTTP local:
+#   GET  /consulta?lat=34.05&lon=-118.25
+#   POST /consulta com {"latitudes": [...], "longitudes": [...]}
+#
+# uso: python consulta_comunidades.py construir --grafo grafos_modelados/grafo_250m_15000_occ
+#      python consulta_comunidades.py consultar 34.05 -118.25
+#      python consulta_comunidades.py servir --porta 8765
+
+import argparse
+import json
+import os
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import joblib
+import numpy as np
+from sklearn.neighbors import BallTree
+
+import artefato_comunidades
+import grafo_binario as gb
+import motor_arestas as me
+
+VERSAO_FORMATO = 1
+
+PASTA_INDICE = 'dados/indice_consulta'
+
+# distância máxima (em metros) da ocorrência mais próxima para a coordenada ser considerada dentro da comunidade
+RAIO_METROS = 250
+
+# tipos das comunidades (o índice na tupla é o código gravado), com os mesmos nomes do atributo tipo_comunidade do main.py
+TIPOS = ('comum', 'ponto focal', 'area prioritaria', 'area atencao')
+# tipo devolvido quando não há ocorrência no raio
+SEM_COMUNIDADE = 'nenhuma'
+
+# estatísticas das comunidades devolvidas nas consultas
+COLUNAS_ESTATISTICAS = ('Tamanho', 'Densidade', 'Densidade Espacial', 'Fator escolha', 'Lat', 'Lon')
+
+def _radianos(latitudes, longitudes):
+    return np.radians(np.column_stack((np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float))))
+
+# monta o índice de consulta a partir do grafo binário e do resultado das comunidades de uma execução
+def construir_indice(pasta_indice, pasta_grafo, pasta_resultado=artefato_comunidades.PASTA_RESULTADO, raio_metros=RAIO_METROS):
+    tabelas = gb.carregar_tabelas(pasta_grafo)
+    colunas, grupos = artefato_comunidades.carregar_colunas(pasta_resultado)
+
+    comunidades = np.asarray(colunas['Comunidade'], dtype=np.int64)
+    tipos = np.zeros(len(comunidades), dtype=np.uint8)
+    for nome, tipo in zip(artefato_comunidades.GRUPOS, TIPOS[1:]):
+        tipos[grupos[nome]] = TIPOS.index(tipo)
+
+    # linha da tabela de cada comunidade (-1 para ids sem linha)
+    linha_comunidade = np.full(comunidades.max() + 1 if len(comunidades) else 0, -1, dtype=np.int32)
+    linha_comunidade[comunidades] = np.arange(len(comunidades))
+
+    # crime mais frequente de cada comunidade (as categorias ausentes estão como NaN)
+    porcentagens_crimes, categorias_crimes = colunas['Porcentagem Crimes']
+    preenchidas = np.nan_to_num(porcentagens_crimes, nan=-1)
+    crime_principal = preenchidas.argmax(axis=1) if len(preenchidas) else np.zeros(0, dtype=np.int64)
+
+    pasta_nova = pasta_indice + '.novo'
+    shutil.rmtree(pasta_nova, ignore_errors=True)
+    os.makedirs(pasta_nova)
+
+    def salvar(nome, valores):
+        np.save(os.path.join(pasta_nova, f'{nome}.npy'), valores)
+
+    coordenadas = _radianos(tabelas['colunas']['latitude'], tabelas['colunas']['longitude'])
+    joblib.dump(BallTree(coordenadas, metric='haversine'), os.path.join(pasta_nova, 'arvore_ocorrencias.joblib'))
+    salvar('comunidade_ocorrencia', np.asarray(tabelas['atributos']['comunidade'], dtype=np.int32))
+
+    selecionadas = np.flatnonzero(tipos > 0)
+    centros = _radianos(np.asarray(colunas['Lat'])[selecionadas], np.asarray(colunas['Lon'])[selecionadas])
+    if len(selecionadas):
+        joblib.dump(BallTree(centros, metric='haversine'), os.path.join(pasta_nova, 'arvore_centros.joblib'))
+    salvar('linha_centro', selecionadas.astype(np.int32))
+
+    salvar('comunidade', comunidades)
+    salvar('linha_comunidade', linha_comunidade)
+    salvar('tipo', tipos)
+    salvar('crime_principal', crime_principal.astype(np.int16))
+    salvar('porcentagem_crime_principal', np.take_along_axis(preenchidas, crime_principal[:, None], axis=1)[:, 0])
+    for k, coluna in enumerate(COLUNAS_ESTATISTICAS):
+        salvar(f'estatistica_{k}', np.asarray(colunas[coluna], dtype=float))
+
+    with open(os.path.join(pasta_nova, 'manifesto.json'), 'w') as arquivo:
+        json.dump({'versao': VERSAO_FORMATO, 'raio_metros': raio_metros, 'ocorrencias': len(coordenadas),
+                   'comunidades': len(comunidades), 'selecionadas': len(selecionadas),
+                   'categorias_crimes': list(categorias_crimes), 'estatisticas': list(COLUNAS_ESTATISTICAS)},
+                  arquivo, indent=2, ensure_ascii=False)
+
+    if os.path.exists(pasta_indice):
+        shutil.rmtree(pasta_indice + '.antigo', ignore_errors=True)
+        os.rename(pasta_indice, pasta_indice + '.antigo')
+    os.rename(pasta_nova, pasta_indice)
+    shutil.rmtree(pasta_indice + '.antigo', ignore_errors=True)
+
+# índice aberto com memory-map. consultar_lote devolve arrays (uma posição por coordenada), consultar um dicionário
+class IndiceConsulta:
+
+    def __init__(self, pasta=PASTA_INDICE):
+        with open(os.path.join(pasta, 'manifesto.json')) as arquivo:
+            manifesto = json.load(arquivo)
+        if manifesto.get('versao') != VERSAO_FORMATO:
+            raise ValueError(f'versão do índice de consulta não suportada: {manifesto.get("versao")}')
+
+        def carregar(nome):
+            return np.load(os.path.join(pasta, f'{nome}.npy'), mmap_mode='r')
+
+        self.raio_metros = manifesto['raio_metros']
+        self.categorias_crimes = manifesto['categorias_crimes']
+        self.arvore_ocorrencias = joblib.load(os.path.join(pasta, 'arvore_ocorrencias.joblib'), mmap_mode='r')
+        self.arvore_centros = joblib.load(os.path.join(pasta, 'arvore_centros.joblib'), mmap_mode='r') if manifesto['selecionadas'] else None
+        self.comunidade_ocorrencia = carregar('comunidade_ocorrencia')
+        self.linha_centro = carregar('linha_centro')
+        self.comunidade = carregar('comunidade')
+        self.linha_comunidade = carregar('linha_comunidade')
+        self.tipo = carregar('tipo')
+        self.crime_principal = carregar('crime_principal')
+        self.porcentagem_crime_principal = carregar('porcentagem_crime_principal')
+        self.estatisticas = {coluna: carregar(f'estatistica_{k}') for k, coluna in enumerate(manifesto['estatisticas'])}
+
+    # consulta vetorizada: comunidade (-1 fora do raio), código do tipo (-1 fora do raio), distância à ocorrência mais
+    # próxima, estatísticas da comunidade (NaN fora do raio) e a comunidade selecionada mais próxima (pelo centro)
+    def consultar_lote(self, latitudes, longitudes):
+        pontos = _radianos(latitudes, longitudes)
+        distancias, vizinhos = self.arvore_ocorrencias.query(pontos, k=1)
+        distancias = distancias[:, 0] * me.RAIO_TERRA
+        dentro = distancias <= self.raio_metros
+
+        linhas = np.where(dentro, self.linha_comunidade[self.comunidade_ocorrencia[vizinhos[:, 0]]], -1)
+        resultado = {
+            'comunidade': np.where(dentro, self.comunidade[linhas], -1),
+            'tipo': np.where(dentro, self.tipo[linhas].astype(np.int16), -1),
+            'distancia_metros': distancias,
+            'crime_principal': np.where(dentro, self.crime_principal[linhas], -1),
+            'porcentagem_crime_principal': np.where(dentro, self.porcentagem_crime_principal[linhas], np.nan),
+        }
+        for coluna, valores in self.estatisticas.items():
+            resultado[coluna] = np.where(dentro, valores[linhas], np.nan)
+
+        if self.arvore_centros is None:
+            resultado['selecionada_mais_proxima'] = np.full(len(pontos), -1)
+            resultado['distancia_selecionada_metros'] = np.full(len(pontos), np.nan)
+        else:
+            distancias_centros, centros = self.arvore_centros.query(pontos, k=1)
+            resultado['selecionada_mais_proxima'] = self.comunidade[self.linha_centro[centros[:, 0]]]
+            resultado['distancia_selecionada_metros'] = distancias_centros[:, 0] * me.RAIO_TERRA
+        return resultado
+
+    # resultado do lote como uma lista de dicionários (tipos e categorias por nome, None fora do raio)
+    def descrever(self, resultado):
+        respostas = []
+        for k in range(len(resultado['comunidade'])):
+            dentro = resultado['comunidade'][k] >= 0
+            resposta = {
+                'comunidade': int(resultado['comunidade'][k]) if dentro else None,
+                'tipo_comunidade': TIPOS[resultado['tipo'][k]] if dentro else SEM_COMUNIDADE,
+                'distancia_metros': float(resultado['distancia_metros'][k]),
+                'crime_principal': self.categorias_crimes[resultado['crime_principal'][k]] if dentro else None,
+                'porcentagem_crime_principal': float(resultado['porcentagem_crime_principal'][k]) if dentro else None,
+            }
+            for coluna in self.estatisticas:
+                resposta[coluna] = float(resultado[coluna][k]) if dentro else None
+            selecionada = int(resultado['selecionada_mais_proxima'][k])
+            resposta['selecionada_mais_proxima'] = selecionada if selecionada >= 0 else None
+            resposta['distancia_selecionada_metros'] = float(resultado['distancia_selecionada_metros'][k]) if selecionada >= 0 else None
+            respostas.append(resposta)
+        return respostas
+
+    def consultar(self, latitude, longitude):
+        return self.descrever(self.consultar_lote([latitude], [longitude]))[0]
+
+# servidor HTTP local com o índice aberto uma única vez
+def servir(indice, host='127.0.0.1', porta=8765):
+
+    class Requisicao(BaseHTTPRequestHandler):
+
+        def _responder(self, status, corpo):
+            dados = json.dumps(corpo, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/consulta':
+                return self._responder(404, {'erro': 'use /consulta'})
+            argumentos = parse_qs(url.query)
+            try:
+                latitude, longitude = float(argumentos['lat'][0]), float(argumentos['lon'][0])
+            except (KeyError, ValueError):
+                return self._responder(400, {'erro': 'informe lat e lon numéricos'})
+            self._responder(200, indice.consultar(latitude, longitude))
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/consulta':
+                return self._responder(404, {'erro': 'use /consulta'})
+            try:
+                corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                latitudes, longitudes = np.asarray(corpo['latitudes'], dtype=float), np.asarray(corpo['longitudes'], dtype=float)
+                if latitudes.ndim != 1 or latitudes.shape != longitudes.shape:
+                    raise ValueError('latitudes e longitudes de tamanhos diferentes')
+            except (KeyError, TypeError, ValueError) as erro:
+                return self._responder(400, {'erro': f'corpo inválido: {erro}'})
+            self._responder(200, indice.descrever(indice.consultar_lote(latitudes, longitudes)))
+
+        # sem uma linha de log por requisição
+        def log_message(self, formato, *argumentos):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Requisicao)
+    print(f'Consultas em http://{host}:{porta}/consulta')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consulta a comunidade (e o seu tipo) de coordenadas a partir do resultado de uma execução.')
+    parser.add_argument('--indice', default=PASTA_INDICE, help='pasta do índice de consulta')
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    construir = comandos.add_parser('construir', help='monta o índice a partir do grafo binário e do resultado das comunidades')
+    construir.add_argument('--grafo', required=True, help='pasta do grafo binário gravado pelo main.py')
+    construir.add_argument('--resultado', default=artefato_comunidades.PASTA_RESULTADO, help='pasta do resultado das comunidades')
+    construir.add_argument('--raio', type=float, default=RAIO_METROS, help='distância máxima (m) até a ocorrência mais próxima')
+
+    consultar = comandos.add_parser('consultar', help='consulta uma coordenada')
+    consultar.add_argument('latitude', type=float)
+    consultar.add_argument('longitude', type=float)
+
+    servidor = comandos.add_parser('servir', help='endpoint HTTP local')
+    servidor.add_argument('--host', default='127.0.0.1')
+    servidor.add_argument('--porta', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.comando == 'construir':
+        construir_indice(args.indice, args.grafo, args.resultado, args.raio)
+        print(f'Índice gravado em {args.indice}')
+    elif args.comando == 'consultar':
+        print(json.dumps(IndiceConsulta(args.indice).consultar(args.latitude, args.longitude), indent=2, ensure_ascii=False))
+    else:
+        servir(IndiceConsulta(args.indice), args.host, args.porta)
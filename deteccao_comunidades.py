@@ -0,0 +1,106 @@
+# Este arquivo detecta as comunidades com várias sementes em paralelo e combina as execuções numa divisão de consenso.
+# Os processos recebem os arrays das arestas (herdados no fork, sem cópia) e cada um monta o grafo uma única vez.
+# Para cada aresta calcula-se a co-associação: a fração das execuções em que as duas ocorrências ficaram na mesma comunidade.
+# O consenso é o agrupamento por consenso (Lancichinetti e Fortunato, 2012): o mesmo algoritmo roda de novo, com as mesmas
+# sementes, no grafo das arestas co-associadas acima do limiar, com a co-associação como peso, até as execuções
+# concordarem em todas as arestas. A estabilidade de cada comunidade do consenso é a concordância média das execuções
+# originais com o consenso nas arestas das suas ocorrências
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import busca_vizinhos as bv
+import pipeline
+
+# fração mínima (exclusiva) das execuções em que as duas pontas da aresta ficam juntas para a aresta entrar no grafo do consenso
+LIMIAR_CONSENSO = 0.5
+
+# quantidade máxima de rodadas do consenso (cada rodada roda o algoritmo com todas as sementes)
+MAX_RODADAS_CONSENSO = 10
+
+# arestas do grafo nos processos (herdadas no fork, ou recebidas uma única vez por processo) e o grafo já montado
+_arestas = {}
+
+def _iniciar_processo(n_vertices, pares_i, pares_j, pesos, algoritmo, resolucao, grafo):
+    _arestas.update(n_vertices=n_vertices, pares_i=pares_i, pares_j=pares_j, pesos=pesos, algoritmo=algoritmo, resolucao=resolucao, grafo=grafo)
+
+def _executar_semente(semente):
+    if _arestas['grafo'] is None:
+        _arestas['grafo'] = pipeline.montar_grafo(_arestas['n_vertices'], _arestas['pares_i'], _arestas['pares_j'], _arestas['pesos'])
+    comunidades, _ = pipeline.detectar_comunidades(_arestas['grafo'], _arestas['resolucao'], semente, _arestas['algoritmo'])
+    return np.array(comunidades.membership, dtype=np.int32)
+
+# detecta as comunidades com cada semente (em paralelo com processos > 1), retornando uma divisão (membership) por semente
+# o grafo, se já estiver montado (com os pesos em 'weight'), é reaproveitado
+def detectar_sementes(n_vertices, pares_i, pares_j, pesos, sementes, algoritmo='multilevel', resolucao=1, processos=1, g=None):
+    argumentos = (n_vertices, pares_i, pares_j, pesos, algoritmo, resolucao, g)
+    if processos <= 1 or len(sementes) == 1:
+        _iniciar_processo(*argumentos)
+        try:
+            return [_executar_semente(semente) for semente in sementes]
+        finally:
+            _arestas.clear()
+
+    with ProcessPoolExecutor(max_workers=min(processos, len(sementes)), mp_context=bv.contexto_processos(),
+                             initializer=_iniciar_processo, initargs=argumentos) as executor:
+        return list(executor.map(_executar_semente, sementes))
+
+# fração das execuções em que as duas pontas de cada aresta ficaram na mesma comunidade
+def coassociacao(pares_i, pares_j, memberships):
+    juntas = np.zeros(len(pares_i))
+    for membership in memberships:
+        juntas += membership[pares_i] == membership[pares_j]
+    return juntas / len(memberships)
+
+# divisão de consenso: a cada rodada as arestas com co-associação até o limiar são descartadas e o algoritmo roda com
+# as sementes no grafo das restantes, com a co-associação como peso. Termina quando todas as execuções concordam em
+# todas as arestas (co-associação 0 ou 1) e retorna a divisão da primeira semente, com as comunidades numeradas de 0 a K-1
+def consenso(n_vertices, pares_i, pares_j, coassociacoes, sementes, algoritmo='multilevel', resolucao=1, processos=1, limiar=LIMIAR_CONSENSO):
+    pares_i, pares_j = np.asarray(pares_i), np.asarray(pares_j)
+    for _ in range(MAX_RODADAS_CONSENSO):
+        selecionadas = coassociacoes > limiar
+        pares_i, pares_j, pesos = pares_i[selecionadas], pares_j[selecionadas], coassociacoes[selecionadas]
+        memberships = detectar_sementes(n_vertices, pares_i, pares_j, pesos, sementes, algoritmo, resolucao, processos)
+        coassociacoes = coassociacao(pares_i, pares_j, memberships)
+        if np.all((coassociacoes == 0) | (coassociacoes == 1)):
+            break
+    return np.unique(memberships[0], return_inverse=True)[1].astype(np.int64)
+
+# estabilidade de cada comunidade: concordância média das execuções com o consenso nas arestas das suas ocorrências
+# (a fração de execuções que juntam as pontas das arestas internas e que separam as pontas das arestas da fronteira)
+# comunidades sem arestas (ocorrências isoladas) têm estabilidade 1
+def estabilidade(membership, pares_i, pares_j, coassociacoes):
+    membership = np.asarray(membership, dtype=np.int64)
+    n_comunidades = membership.max() + 1 if len(membership) else 0
+    comunidade_i, comunidade_j = membership[pares_i], membership[pares_j]
+    internas = comunidade_i == comunidade_j
+    concordancia = np.where(internas, coassociacoes, 1 - coassociacoes)
+
+    # as arestas internas contam uma vez para a comunidade, as da fronteira contam para as duas comunidades
+    fronteira = ~internas
+    soma = np.bincount(comunidade_i, weights=concordancia, minlength=n_comunidades)
+    soma += np.bincount(comunidade_j[fronteira], weights=concordancia[fronteira], minlength=n_comunidades)
+    quantidade = np.bincount(comunidade_i, minlength=n_comunidades) + np.bincount(comunidade_j[fronteira], minlength=n_comunidades)
+    return np.divide(soma, quantidade, out=np.ones(n_comunidades), where=quantidade > 0)
+
+# detecta as comunidades com várias sementes e retorna a divisão de consenso, a estabilidade de cada comunidade,
+# a modularidade do consenso e as divisões de cada semente. Com uma única semente o consenso é a própria divisão
+def detectar_consenso(n_vertices, pares_i, pares_j, pesos, sementes, algoritmo='multilevel', resolucao=1, processos=1, g=None):
+    pares_i, pares_j = np.asarray(pares_i), np.asarray(pares_j)
+    if g is None:
+        g = pipeline.montar_grafo(n_vertices, pares_i, pares_j, pesos)
+    memberships = detectar_sementes(n_vertices, pares_i, pares_j, pesos, sementes, algoritmo, resolucao, processos, g)
+    coassociacoes = coassociacao(pares_i, pares_j, memberships)
+
+    if len(memberships) == 1:
+        membership = memberships[0].astype(np.int64)
+    else:
+        membership = consenso(n_vertices, pares_i, pares_j, coassociacoes, sementes, algoritmo, resolucao, processos)
+
+    return {
+        'membership': membership,
+        'estabilidade': estabilidade(membership, pares_i, pares_j, coassociacoes),
+        'modularidade': g.modularity(membership.tolist(), weights='weight', resolution=resolucao),
+        'execucoes': memberships,
+    }
@@ -0,0 +1,111 @@
+# Este arquivo reduz a quantidade de arestas do grafo antes da detecção de comunidades. Em regiões densas todos os pares
+# a até 250 m viram arestas, o que gera vértices com grau muito alto e um grafo que cresce bem mais rápido que os vértices.
+# É possível manter só as arestas com peso final mínimo e/ou só as k arestas mais fortes de cada ocorrência
+# (simetrizado: pela união, a aresta fica se estiver entre as k mais fortes de uma das pontas; pela interseção, das duas).
+# O CLI compara cada configuração com o grafo completo (redução de arestas e NMI entre as comunidades) para escolher os valores
+#
+# uso: python esparsificacao.py --amostra 15000 --pesos-minimos 0.3 0.4 0.5 --top-k 5 10 20
+
+import argparse
+import time
+
+import igraph as ig
+import numpy as np
+import pandas as pd
+
+import cache_arestas
+import cache_atributos as ca
+import pipeline
+
+SIMETRIZACOES = ('uniao', 'intersecao')
+
+# indica, para cada aresta, se ela está entre as k mais fortes de pares_i e se está entre as k mais fortes de pares_j
+# (empates são resolvidos pela ordem das arestas)
+def top_k_por_vertice(pares_i, pares_j, pesos, k):
+    n_arestas = len(pesos)
+    vertices = np.concatenate((pares_i, pares_j))
+    arestas = np.tile(np.arange(n_arestas), 2)
+
+    # ordena as pontas das arestas por vértice e, dentro de cada vértice, do maior peso para o menor
+    ordem = np.lexsort((arestas, -np.tile(pesos, 2), vertices))
+    vertices_ordenados = vertices[ordem]
+    posicao_no_vertice = np.arange(len(ordem)) - np.searchsorted(vertices_ordenados, vertices_ordenados, side='left')
+
+    no_top = np.empty(len(ordem), dtype=bool)
+    no_top[ordem] = posicao_no_vertice < k
+    return no_top[:n_arestas], no_top[n_arestas:]
+
+# posições das arestas mantidas: peso final >= peso_minimo e, entre essas, as top_k de cada ocorrência (None desativa o critério)
+def selecionar_arestas(pares_i, pares_j, pesos, peso_minimo=None, top_k=None, simetrizacao='uniao'):
+    if simetrizacao not in SIMETRIZACOES:
+        raise ValueError(f'simetrização inválida: {simetrizacao}, use uma de {SIMETRIZACOES}')
+
+    pesos = np.asarray(pesos, dtype=float)
+    selecionadas = np.arange(len(pesos))
+    if peso_minimo is not None:
+        selecionadas = np.flatnonzero(pesos >= peso_minimo)
+
+    if top_k is not None:
+        top_i, top_j = top_k_por_vertice(np.asarray(pares_i)[selecionadas], np.asarray(pares_j)[selecionadas], pesos[selecionadas], top_k)
+        selecionadas = selecionadas[(top_i | top_j) if simetrizacao == 'uniao' else (top_i & top_j)]
+
+    return selecionadas
+
+# compara as comunidades do grafo esparsificado com as do grafo completo (mesma semente do Louvain)
+# membership_denso pode ser informado para não repetir a detecção no grafo completo
+def comparar_com_denso(n_vertices, pares_i, pares_j, pesos, selecionadas, resolucao, semente=1, membership_denso=None):
+    if membership_denso is None:
+        comunidades_densas, _ = pipeline.detectar_comunidades(pipeline.montar_grafo(n_vertices, pares_i, pares_j, pesos), resolucao, semente)
+        membership_denso = comunidades_densas.membership
+
+    g = pipeline.montar_grafo(n_vertices, np.asarray(pares_i)[selecionadas], np.asarray(pares_j)[selecionadas], np.asarray(pesos)[selecionadas])
+    inicio = time.perf_counter()
+    comunidades, modularidade = pipeline.detectar_comunidades(g, resolucao, semente)
+
+    return {
+        'arestas': g.ecount(),
+        'reducao_arestas': 1 - g.ecount() / len(pesos) if len(pesos) else 0,
+        'grau_maximo': max(g.degree()) if n_vertices else 0,
+        'comunidades': len(comunidades),
+        'modularidade': modularidade,
+        'nmi': ig.compare_communities(membership_denso, comunidades.membership, method='nmi'),
+        'segundos_louvain': time.perf_counter() - inicio,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara a esparsificação das arestas com o grafo completo (redução de arestas e NMI).')
+    parser.add_argument('--csv', default='dados/dataset-filtrado.csv', help='dataset filtrado')
+    parser.add_argument('--amostra', type=int, help='quantidade de ocorrências da amostra (padrão: todas)')
+    parser.add_argument('--distancia', type=float, default=250)
+    parser.add_argument('--alpha-tempo', type=float, default=0.15)
+    parser.add_argument('--resolucao', type=float, default=0.8)
+    parser.add_argument('--pesos-minimos', type=float, nargs='*', default=[], help='pesos finais mínimos testados')
+    parser.add_argument('--top-k', type=int, nargs='*', default=[], help='valores de k testados')
+    parser.add_argument('--simetrizacao', default='uniao', choices=SIMETRIZACOES)
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--saida', default='dados/esparsificacao.csv', help='csv com a comparação')
+    args = parser.parse_args()
+
+    colunas = pipeline.carregar_ocorrencias(args.csv, args.amostra)
+    n_vertices = ca.tamanho(colunas)
+    arestas = pipeline.calcular_arestas(colunas, args.distancia, args.alpha_tempo)
+    pares_i, pares_j = np.asarray(arestas['pares_i']), np.asarray(arestas['pares_j'])
+    pesos = cache_arestas.reponderar(arestas)
+
+    g_denso = pipeline.montar_grafo(n_vertices, pares_i, pares_j, pesos)
+    comunidades_densas, _ = pipeline.detectar_comunidades(g_denso, args.resolucao, args.semente)
+
+    # o próprio Louvain varia com a semente: a NMI do grafo completo com outra semente serve de referência
+    linhas = [dict(criterio='completo (outra semente)', **comparar_com_denso(
+        n_vertices, pares_i, pares_j, pesos, np.arange(len(pesos)), args.resolucao, args.semente + 1, comunidades_densas.membership))]
+    configuracoes = [('peso_minimo', {'peso_minimo': p}) for p in args.pesos_minimos] + [('top_k', {'top_k': k}) for k in args.top_k]
+    for criterio, parametros in configuracoes:
+        selecionadas = selecionar_arestas(pares_i, pares_j, pesos, simetrizacao=args.simetrizacao, **parametros)
+        resultado = comparar_com_denso(n_vertices, pares_i, pares_j, pesos, selecionadas, args.resolucao, args.semente, comunidades_densas.membership)
+        linhas.append(dict(criterio=f'{criterio}={list(parametros.values())[0]}', **resultado))
+
+    comparacao = pd.DataFrame(linhas)
+    print(f'Grafo completo: {len(pesos)} arestas, grau máximo {max(g_denso.degree())}, {len(comunidades_densas)} comunidades')
+    print(comparacao.to_string(index=False))
+    comparacao.to_csv(args.saida, index=False)
+    print(f'Comparação gravada em {args.saida}')
@@ -0,0 +1,160 @@
+# Este arquivo calcula as estatísticas de todas as comunidades de uma vez, a partir do vetor de comunidades (membership),
+# das colunas das ocorrências (ver cache_atributos) e dos arrays de arestas, sem montar um subgrafo por comunidade.
+# As contagens por comunidade saem de np.bincount sobre o membership, e as medidas de cada comunidade (tamanho, densidade,
+# centro, porcentagens de crimes, armas e períodos do dia, áreas e subáreas) são geradas nos formatos usados na classificação
+# e no artefato das comunidades
+
+import numpy as np
+import pandas as pd
+
+import funcoes_auxiliares as fa
+
+# comunidades com até LIMITE_EXATO ocorrências têm a distância média entre pares calculada exatamente (em blocos);
+# acima disso a média é estimada com uma amostra de PARES_AMOSTRA pares
+LIMITE_EXATO = 5000
+PARES_AMOSTRA = 200000
+
+# quantidade máxima de distâncias calculadas por bloco no cálculo exato (limita a memória)
+DISTANCIAS_POR_BLOCO = 4000000
+
+# quantidade de arestas lidas por bloco na soma dos pesos internos das comunidades
+ARESTAS_POR_BLOCO = 4000000
+
+# valor z do intervalo de confiança de 95% usado no erro da estimativa
+Z_95 = 1.96
+
+PERIODOS = ['Manha', 'Tarde', 'Noite', 'Madrugada']
+
+# período do dia de cada horario (em minutos): manhã de 6h a 12h, tarde de 12h a 18h, noite de 18h a 24h e madrugada de 0h a 6h
+def periodos_do_dia(minutos):
+    hora = (np.asarray(minutos, dtype=np.int64) // 60) % 24
+    return np.select([(hora >= 6) & (hora < 12), (hora >= 12) & (hora < 18), hora >= 18], [0, 1, 2], default=3)
+
+# distância média (em graus, como o pdist de coordenadas lat/lon) entre todos os pares de pontos, calculada em blocos
+def _distancia_media_exata(pontos):
+    n = len(pontos)
+    linhas_bloco = max(1, DISTANCIAS_POR_BLOCO // n)
+    soma = 0.0
+    for inicio in range(0, n, linhas_bloco):
+        bloco = pontos[inicio:inicio + linhas_bloco]
+        diferencas = bloco[:, None, :] - pontos[None, :, :]
+        soma += np.sqrt((diferencas ** 2).sum(axis=2)).sum()
+    # cada par aparece duas vezes na soma e as distâncias de um ponto a ele mesmo são zero
+    return soma / (n * (n - 1))
+
+# estimativa da distância média com uma amostra de pares distintos, retornando a média e a metade do intervalo de 95%
+def _distancia_media_amostrada(pontos, rng):
+    n = len(pontos)
+    a = rng.integers(0, n, PARES_AMOSTRA)
+    b = rng.integers(0, n - 1, PARES_AMOSTRA)
+    b = b + (b >= a)  # garante a != b sem viés
+    distancias = np.sqrt(((pontos[a] - pontos[b]) ** 2).sum(axis=1))
+    return distancias.mean(), Z_95 * distancias.std(ddof=1) / np.sqrt(PARES_AMOSTRA)
+
+# distância média entre os pares de ocorrências de uma comunidade e o erro da estimativa (0 quando o cálculo é exato)
+def distancia_media(pontos, rng):
+    if len(pontos) < 2:
+        return 0, 0
+    if len(pontos) <= LIMITE_EXATO:
+        return _distancia_media_exata(pontos), 0
+    return _distancia_media_amostrada(pontos, rng)
+
+# porcentagens (arredondadas) das categorias presentes em cada comunidade, como dicionários {nome: porcentagem}
+# o arredondamento é o round do Python: o np.round (multiplica por 1000 e arredonda) difere dele em 0.001 em alguns valores
+def _porcentagens(contagens, tamanhos, nomes, manter_ausentes=False):
+    fracoes = (contagens / tamanhos[:, None]).tolist()
+    return [{nomes[k]: round(fracoes[c][k], 3) for k in range(len(nomes)) if manter_ausentes or contagens[c, k] > 0}
+            for c in range(len(contagens))]
+
+# conjuntos de valores distintos de cada comunidade
+def _conjuntos(membership, valores, n_comunidades):
+    pares = np.unique(np.column_stack((membership, valores)), axis=0)
+    conjuntos = [set() for _ in range(n_comunidades)]
+    for comunidade, valor in pares.tolist():
+        conjuntos[comunidade].add(valor)
+    return conjuntos
+
+# soma dos pesos das arestas internas de cada comunidade (ids locais), feita em blocos de arestas
+# (as arestas podem estar em memory-map, assim só um bloco por vez é copiado para a memória)
+def _soma_pesos_internos(membership, local, k, pares_i, pares_j, pesos):
+    soma_pesos = np.zeros(k)
+    for inicio in range(0, len(pares_i), ARESTAS_POR_BLOCO):
+        comunidade_i = membership[np.asarray(pares_i[inicio:inicio + ARESTAS_POR_BLOCO], dtype=np.int64)]
+        comunidade_j = membership[np.asarray(pares_j[inicio:inicio + ARESTAS_POR_BLOCO], dtype=np.int64)]
+        pesos_bloco = np.asarray(pesos[inicio:inicio + ARESTAS_POR_BLOCO], dtype=float)
+        internas = (comunidade_i == comunidade_j) & (local[comunidade_i] >= 0)
+        soma_pesos += np.bincount(local[comunidade_i[internas]], weights=pesos_bloco[internas], minlength=k)
+    return soma_pesos
+
+# calcula as estatísticas das comunidades. Com 'comunidades' informado, só essas comunidades são calculadas
+# retorna um DataFrame com uma linha por comunidade, com as medidas de cada comunidade (ver o início do arquivo)
+# mais a distância média entre as ocorrências e o erro da sua estimativa
+def calcular_estatisticas(membership, colunas, pares_i, pares_j, pesos, comunidades=None, semente=1):
+    membership = np.asarray(membership, dtype=np.int64)
+    n_total = membership.max() + 1 if len(membership) else 0
+
+    if comunidades is None:
+        comunidades = np.arange(n_total)
+    comunidades = np.asarray(comunidades, dtype=np.int64)
+
+    # as comunidades calculadas são renumeradas de 0 a K-1 (ids locais)
+    local = np.full(n_total, -1, dtype=np.int64)
+    local[comunidades] = np.arange(len(comunidades))
+    k = len(comunidades)
+
+    vertices = np.flatnonzero(local[membership] >= 0)
+    grupo = local[membership[vertices]]
+    tamanhos = np.bincount(grupo, minlength=k)
+
+    soma_pesos = _soma_pesos_internos(membership, local, k, pares_i, pares_j, pesos)
+    pares_possiveis = tamanhos * (tamanhos - 1)
+    densidades = np.divide(2 * soma_pesos, pares_possiveis, out=np.zeros(k), where=pares_possiveis > 0)
+
+    latitudes = np.asarray(colunas['latitude'], dtype=float)[vertices]
+    longitudes = np.asarray(colunas['longitude'], dtype=float)[vertices]
+    centro_lat = np.bincount(grupo, weights=latitudes, minlength=k) / tamanhos
+    centro_lon = np.bincount(grupo, weights=longitudes, minlength=k) / tamanhos
+
+    n_crimes, n_armas = len(fa.CATEGORIAS_CRIME), len(fa.CATEGORIAS_ARMA)
+    crimes = np.bincount(grupo * n_crimes + np.asarray(colunas['cat_crime'])[vertices], minlength=k * n_crimes).reshape(k, n_crimes)
+    armas = np.bincount(grupo * n_armas + np.asarray(colunas['cat_arma'])[vertices], minlength=k * n_armas).reshape(k, n_armas)
+    periodos = np.bincount(grupo * 4 + periodos_do_dia(np.asarray(colunas['minutos'])[vertices]), minlength=k * 4).reshape(k, 4)
+
+    area_vocabulario = np.asarray(colunas['area_vocabulario'])
+    areas = _conjuntos(grupo, np.asarray(colunas['area'])[vertices], k)
+    areas = [{str(area_vocabulario[codigo]) for codigo in conjunto} for conjunto in areas]
+    subareas = _conjuntos(grupo, np.asarray(colunas['cod_subarea'])[vertices], k)
+
+    # distância média entre os pares de ocorrências de cada comunidade (as ocorrências são agrupadas por comunidade)
+    rng = np.random.default_rng(semente)
+    ordem = np.argsort(grupo, kind='stable')
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)))
+    pontos = np.column_stack((latitudes, longitudes))[ordem]
+    distancias = [distancia_media(pontos[inicios[c]:inicios[c + 1]], rng) for c in range(k)]
+
+    porcentagens_crimes = _porcentagens(crimes, tamanhos, fa.CATEGORIAS_CRIME)
+    porcentagens_armas = _porcentagens(armas, tamanhos, fa.CATEGORIAS_ARMA)
+    porcentagens_horarios = _porcentagens(periodos, tamanhos, PERIODOS, manter_ausentes=True)
+
+    comunidades_dados = []
+    for c in range(k):
+        distancia_media_c, erro_distancia = distancias[c]
+        # 111 pois a distância é em graus de latitude que equivalem a 111 km aproximadamente
+        densidade_espacial = abs(1 / (distancia_media_c * 111)) if distancia_media_c != 0 else 0
+        comunidades_dados.append({
+            'Comunidade': int(comunidades[c]),
+            'Tamanho': int(tamanhos[c]),
+            'Densidade': densidades[c],
+            'Densidade Espacial': densidade_espacial,
+            'Lat': centro_lat[c],
+            'Lon': centro_lon[c],
+            'Porcentagem Crimes': porcentagens_crimes[c],
+            'Porcentagem Armas': porcentagens_armas[c],
+            'Porcentagem Horarios': porcentagens_horarios[c],
+            'Areas': areas[c],
+            'Subareas': subareas[c],
+            'Distancia Media': distancia_media_c,
+            'Erro Distancia Media': erro_distancia,
+        })
+
+    return pd.DataFrame(comunidades_dados)
@@ -0,0 +1,148 @@
+# Este arquivo gera o dataset filtrado (dataset-filtrado.csv) a partir do csv bruto da LAPD, no lugar do notebook
+# filtragem-dataset.ipynb. O csv bruto é lido em blocos de linhas, só com as colunas usadas e com os tipos definidos,
+# e cada bloco é filtrado e gravado na saída antes de ler o próximo, assim a memória não cresce com o tamanho do arquivo.
+# As regras são as mesmas do notebook: descarta as linhas sem crime, coordenadas, horario ou perfil da vitima e mantém
+# só os crimes de dados/crimes_mantidos.csv e os locais de dados/locais.csv (as listas de descrições do notebook). Os dois
+# filtros são feitos pelos códigos (Crm Cd e Premis Cd), aprendidos durante a leitura: a descrição só é consultada na
+# primeira vez que um código aparece, e nas linhas sem código.
+# Só os códigos dos filtros são convertidos em números, as demais colunas são gravadas com o texto do csv bruto
+#
+# uso: python filtragem_dataset.py dados/Crime_Data_from_2020_to_Present.csv --saida dados/dataset-filtrado.csv
+
+import argparse
+import csv
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+
+import cache_atributos as ca
+
+CAMINHO_CRIMES = 'dados/crimes_mantidos.csv'
+CAMINHO_LOCAIS = 'dados/locais.csv'
+CAMINHO_SAIDA = 'dados/dataset-filtrado.csv'
+
+# linhas lidas por bloco (limita a memória)
+LINHAS_POR_BLOCO = 200000
+
+# colunas sem as quais a ocorrência é descartada (as mesmas do dropna do notebook)
+COLUNAS_OBRIGATORIAS = ['Crm Cd', 'LAT', 'LON', 'TIME OCC', 'Vict Age', 'Vict Sex', 'Vict Descent']
+
+# textos tratados como ausentes nas colunas obrigatórias e nas dos filtros (os mesmos que o read_csv do notebook trata como ausentes)
+VALORES_AUSENTES = sorted(STR_NA_VALUES)
+
+# colunas gravadas no dataset filtrado: as lidas pelo pipeline (ver cache_atributos) e as que identificam a ocorrência
+# (as descrições dos crimes e das armas ficam nas tabelas de dados/, pelos códigos)
+COLUNAS_SAIDA = ['DR_NO', 'DATE OCC'] + ca.COLUNAS_CSV + ['Premis Cd']
+
+# colunas que só existem no csv bruto da LAPD (quando ausentes não são gravadas)
+COLUNAS_OPCIONAIS = ('DR_NO', 'DATE OCC')
+
+# tipos das colunas lidas: os códigos dos filtros em float32 (inteiros com ausentes, exatos em float32), as descrições
+# dos crimes e dos locais como categoria (poucos valores) e as demais colunas como texto, copiadas para a saída sem conversão
+TIPOS = dict({coluna: 'object' for coluna in COLUNAS_SAIDA},
+             **{'Crm Cd': 'float32', 'Crm Cd Desc': 'category', 'Premis Cd': 'float32', 'Premis Desc': 'category'})
+
+# descrições mantidas (coluna da tabela de dados/)
+def descricoes_mantidas(caminho, coluna):
+    return set(pd.read_csv(caminho)[coluna])
+
+# atualiza o dicionário {código: mantido} com os códigos do bloco que ainda não apareceram
+# (consulta a descrição da primeira ocorrência de cada código novo que tem descrição) e retorna as linhas do bloco
+# mantidas. Como o notebook filtra só pela descrição, as linhas sem descrição são descartadas e as sem código são
+# mantidas pela descrição
+def aprender_codigos(bloco, coluna_codigo, coluna_descricao, mantidos_por_codigo, descricoes):
+    codigos = bloco[coluna_codigo].to_numpy()
+    descritas = bloco[coluna_descricao].notna().to_numpy()
+    unicos, primeiras = np.unique(codigos[descritas], return_index=True)
+    for codigo, linha in zip(unicos.tolist(), np.flatnonzero(descritas)[primeiras].tolist()):
+        if np.isnan(codigo) or codigo in mantidos_por_codigo:
+            continue
+        mantidos_por_codigo[codigo] = bloco[coluna_descricao].iat[linha] in descricoes
+    mantidos = np.array([codigo for codigo, mantido in mantidos_por_codigo.items() if mantido], dtype=np.float32)
+    mantidas = descritas & np.isin(codigos, mantidos)
+
+    sem_codigo = np.isnan(codigos)
+    if sem_codigo.any():
+        mantidas[sem_codigo] = bloco[coluna_descricao][sem_codigo].isin(descricoes).to_numpy()
+    return mantidas
+
+# linhas do bloco que entram no dataset filtrado
+def filtrar_bloco(bloco, crimes_por_codigo, crimes, locais_por_codigo, locais):
+    completas = bloco[COLUNAS_OBRIGATORIAS].notna().all(axis=1).to_numpy()
+    return (completas & aprender_codigos(bloco, 'Crm Cd', 'Crm Cd Desc', crimes_por_codigo, crimes)
+            & aprender_codigos(bloco, 'Premis Cd', 'Premis Desc', locais_por_codigo, locais))
+
+# texto de cada coluna das linhas mantidas (os códigos dos filtros voltam a ser inteiros, e os ausentes ficam vazios,
+# como no to_csv do notebook)
+def _textos(bloco, mantidas, colunas):
+    textos = []
+    for coluna in colunas:
+        valores = bloco[coluna].to_numpy()[mantidas]
+        if valores.dtype.kind == 'f':
+            ausentes = np.isnan(valores)
+            valores = np.where(ausentes, 0, valores).astype(np.int64).astype(str)
+            valores[ausentes] = ''
+        textos.append(valores)
+    return textos
+
+# grava as linhas juntando os campos com vírgulas (bem mais rápido que o to_csv). Se algum campo tiver vírgula, aspas ou
+# quebra de linha (o que exige aspas no csv) a contagem dos separadores não bate, e o bloco é gravado pelo módulo csv
+def _gravar_linhas(saida, textos):
+    linhas = list(map(','.join, zip(*textos)))
+    if not linhas:
+        return
+    texto = '\n'.join(linhas)
+    if texto.count(',') == (len(textos) - 1) * len(linhas) and texto.count('\n') == len(linhas) - 1 and '"' not in texto and '\r' not in texto:
+        saida.write(texto + '\n')
+    else:
+        csv.writer(saida, lineterminator='\n').writerows(zip(*textos))
+
+# lê o csv bruto em blocos e grava as linhas filtradas na saída, bloco a bloco
+# a saída é gravada num arquivo novo que depois substitui o anterior; retorna as linhas lidas e as gravadas
+def filtrar(caminho_bruto, caminho_saida=CAMINHO_SAIDA, caminho_crimes=CAMINHO_CRIMES, caminho_locais=CAMINHO_LOCAIS,
+            linhas_por_bloco=LINHAS_POR_BLOCO):
+    cabecalho = pd.read_csv(caminho_bruto, nrows=0).columns
+    faltando = [coluna for coluna in TIPOS if coluna not in cabecalho and coluna not in COLUNAS_OPCIONAIS]
+    if faltando:
+        raise ValueError(f'colunas ausentes no csv bruto: {faltando}')
+    colunas = [coluna for coluna in TIPOS if coluna in cabecalho]
+    colunas_saida = [coluna for coluna in COLUNAS_SAIDA if coluna in cabecalho]
+
+    crimes = descricoes_mantidas(caminho_crimes, 'Crm Cd Desc')
+    locais = descricoes_mantidas(caminho_locais, 'Premis Desc')
+    crimes_por_codigo = {}
+    locais_por_codigo = {}
+
+    # só as colunas obrigatórias e as dos filtros têm valores ausentes, nas demais o texto vazio é mantido como está
+    ausentes = {coluna: VALORES_AUSENTES for coluna in COLUNAS_OBRIGATORIAS + ['Crm Cd Desc', 'Premis Cd', 'Premis Desc']}
+
+    caminho_novo = caminho_saida + '.novo'
+    lidas = gravadas = 0
+    with open(caminho_novo, 'w', newline='') as saida:
+        _gravar_linhas(saida, [[coluna] for coluna in colunas_saida])
+        blocos = pd.read_csv(caminho_bruto, usecols=colunas, dtype={coluna: TIPOS[coluna] for coluna in colunas},
+                             keep_default_na=False, na_values=ausentes, chunksize=linhas_por_bloco)
+        for bloco in blocos:
+            mantidas = filtrar_bloco(bloco, crimes_por_codigo, crimes, locais_por_codigo, locais)
+            _gravar_linhas(saida, _textos(bloco, mantidas, colunas_saida))
+            lidas += len(bloco)
+            gravadas += int(mantidas.sum())
+
+    os.replace(caminho_novo, caminho_saida)
+    return lidas, gravadas
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera o dataset filtrado a partir do csv bruto da LAPD, lendo em blocos.')
+    parser.add_argument('bruto', help='csv bruto da LAPD')
+    parser.add_argument('--saida', default=CAMINHO_SAIDA, help='csv filtrado gerado')
+    parser.add_argument('--crimes', default=CAMINHO_CRIMES, help='tabela dos crimes mantidos (Crm Cd Desc)')
+    parser.add_argument('--locais', default=CAMINHO_LOCAIS, help='tabela dos locais mantidos (Premis Desc)')
+    parser.add_argument('--linhas-por-bloco', type=int, default=LINHAS_POR_BLOCO)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    lidas, gravadas = filtrar(args.bruto, args.saida, args.crimes, args.locais, args.linhas_por_bloco)
+    print(f'{gravadas} de {lidas} ocorrências gravadas em {args.saida} ({time.perf_counter() - inicio:.1f}s)')
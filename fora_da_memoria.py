@@ -0,0 +1,264 @@
+# Este arquivo roda o pipeline com todas as ocorrências do dataset (sem a amostra de Q_OCC do main.py) com a memória
+# limitada por um orçamento. As ocorrências são reordenadas pelos ladrilhos geográficos (ver busca_vizinhos.particionar_ladrilhos)
+# e processadas ladrilho a ladrilho: os pares e os pesos finais de cada ladrilho são gravados em disco num fragmento
+# (origens e destinos em int32, pesos em float32) e liberados da memória. Como o núcleo de cada ladrilho vira uma faixa
+# contígua de índices, os fragmentos já saem ordenados pela origem, e o grafo em CSR (início das arestas de cada ocorrência,
+# destinos e pesos, em memory-map) é montado só copiando os fragmentos em sequência.
+# O orçamento define o tamanho dos ladrilhos e a quantidade de arestas levadas à detecção de comunidades: se as arestas não
+# couberem, ficam só as mais fortes (o peso mínimo é escolhido pelo histograma dos pesos, sem carregar as arestas)
+#
+# uso: python fora_da_memoria.py --csv dados/dataset-filtrado.csv --orcamento-mb 12000
+#      python fora_da_memoria.py --sinteticas 1000000 --orcamento-mb 4000
+
+import argparse
+import json
+import os
+import shutil
+
+import igraph as ig
+import numpy as np
+from sklearn.neighbors import BallTree
+
+import artefato_comunidades
+import busca_vizinhos as bv
+import cache_atributos as ca
+import gerador_ocorrencias
+import instrumentacao
+import motor_arestas as me
+import pipeline
+from motor_arestas import RAIO_TERRA
+
+VERSAO_FORMATO = 1
+
+PASTA_TRABALHO = 'dados/fora_da_memoria'
+
+# orçamento de memória padrão (16 GB de memória, com folga para o sistema)
+ORCAMENTO_MB = 12000
+
+# memória estimada por par na busca e no cálculo dos pesos de um ladrilho (pares, ordenação e componentes do peso)
+BYTES_POR_PAR_LADRILHO = 200
+# memória estimada por aresta e por vértice na detecção de comunidades (grafo do igraph, pesos e níveis do Louvain)
+BYTES_POR_ARESTA_DETECCAO = 160
+BYTES_POR_VERTICE_DETECCAO = 400
+
+# folga na quantidade de pares por ladrilho: as regiões mais densas têm mais vizinhos por ocorrência que a média
+FOLGA_LADRILHOS = 2
+
+# ocorrências da amostra usada para estimar a quantidade média de vizinhos
+AMOSTRA_VIZINHOS = 2000
+
+# arestas copiadas de uma vez dos fragmentos para o CSR e do CSR para o grafo do igraph
+ARESTAS_POR_BLOCO = 4000000
+
+# faixas do histograma dos pesos finais (entre 0 e 1), usado para escolher o peso mínimo quando as arestas não cabem
+FAIXAS_PESO = 10000
+
+# quantidade média de vizinhos por ocorrência a até raio_metros, estimada com uma amostra de ocorrências
+def estimar_vizinhos(latitudes, longitudes, raio_metros, semente=1):
+    coords = np.radians(np.column_stack((latitudes, longitudes)))
+    amostra = np.random.default_rng(semente).choice(len(coords), min(AMOSTRA_VIZINHOS, len(coords)), replace=False)
+    contagens = BallTree(coords, metric='haversine').query_radius(coords[amostra], r=raio_metros / RAIO_TERRA, count_only=True)
+    return float(np.mean(contagens - 1))
+
+# quantidade de ladrilhos para que os pares de um ladrilho caibam na memória disponível
+# (um quadrado perfeito, assim particionar_ladrilhos divide em exatamente essa quantidade)
+def escolher_ladrilhos(n_ocorrencias, vizinhos_medios, memoria_disponivel):
+    pares_estimados = n_ocorrencias * vizinhos_medios / 2 * FOLGA_LADRILHOS
+    pares_por_ladrilho = max(1, memoria_disponivel // BYTES_POR_PAR_LADRILHO)
+    lado = int(np.ceil(np.sqrt(max(1, pares_estimados / pares_por_ladrilho))))
+    return lado * lado
+
+# ordem das ocorrências que deixa os núcleos dos ladrilhos em faixas contíguas de índices (na ordem dos ladrilhos)
+def ordem_espacial(latitudes, longitudes, raio_metros, n_ladrilhos):
+    return np.concatenate([nucleo for nucleo, _ in bv.particionar_ladrilhos(latitudes, longitudes, raio_metros, n_ladrilhos)])
+
+# faixa do histograma de cada peso
+def _faixas(pesos):
+    return np.clip((np.asarray(pesos, dtype=float) * FAIXAS_PESO).astype(np.int64), 0, FAIXAS_PESO - 1)
+
+def _caminho_fragmento(pasta, k, nome):
+    return os.path.join(pasta, 'fragmentos', f'{k:05d}_{nome}.npy')
+
+# busca os pares e calcula os pesos finais ladrilho a ladrilho, gravando cada ladrilho num fragmento
+# as colunas devem estar na ordem de ordem_espacial (com a mesma quantidade de ladrilhos)
+# retorna a quantidade de fragmentos, de arestas e o histograma dos pesos finais
+def gravar_fragmentos(pasta, colunas, distancia, alpha_tempo, n_ladrilhos, coeficientes=me.COEFICIENTES, metodo_busca='grade'):
+    shutil.rmtree(os.path.join(pasta, 'fragmentos'), ignore_errors=True)
+    os.makedirs(os.path.join(pasta, 'fragmentos'))
+    atributos = me.atributos_das_colunas(colunas)
+
+    histograma = np.zeros(FAIXAS_PESO, dtype=np.int64)
+    arestas = 0
+    ultima_origem = -1
+    n_fragmentos = 0
+    for k, (pares_i, pares_j, distancias) in enumerate(bv.pares_em_blocos(colunas['latitude'], colunas['longitude'], distancia, n_ladrilhos, metodo_busca)):
+        if len(pares_i) and pares_i[0] < ultima_origem:
+            raise ValueError('os fragmentos não estão ordenados pela origem, as colunas precisam estar na ordem de ordem_espacial')
+        distancias_metros = me.calcular_distancias(pares_i, pares_j, atributos, 'balltree', distancias)
+        # o histograma usa os pesos já em float32, os mesmos que montar_csr lê dos fragmentos
+        pesos = me.calcular_pesos(pares_i, pares_j, atributos, alpha_tempo, distancia, coeficientes, distancias_metros)['peso_final'].astype(np.float32)
+
+        np.save(_caminho_fragmento(pasta, k, 'origens'), np.asarray(pares_i, dtype=np.int32))
+        np.save(_caminho_fragmento(pasta, k, 'destinos'), np.asarray(pares_j, dtype=np.int32))
+        np.save(_caminho_fragmento(pasta, k, 'pesos'), pesos)
+
+        histograma += np.bincount(_faixas(pesos), minlength=FAIXAS_PESO)
+        arestas += len(pares_i)
+        ultima_origem = pares_i[-1] if len(pares_i) else ultima_origem
+        n_fragmentos = k + 1
+
+    return n_fragmentos, arestas, histograma
+
+# faixa mínima dos pesos para que as arestas caibam na memória disponível para a detecção de comunidades (0 mantém todas)
+def faixa_minima(histograma, n_vertices, memoria_disponivel):
+    maximo_arestas = max(0, (memoria_disponivel - n_vertices * BYTES_POR_VERTICE_DETECCAO) // BYTES_POR_ARESTA_DETECCAO)
+    # arestas com peso na faixa f ou acima, para cada f
+    acima = np.cumsum(histograma[::-1])[::-1]
+    cabem = np.flatnonzero(acima <= maximo_arestas)
+    return int(cabem[0]) if len(cabem) else FAIXAS_PESO
+
+# monta o grafo em CSR a partir dos fragmentos, só com as arestas de peso na faixa_minima ou acima
+# os arrays são gravados em memory-map na pasta 'csr'; as origens de cada aresta também são gravadas (para as estatísticas)
+def montar_csr(pasta, n_vertices, n_fragmentos, histograma, faixa=0):
+    pasta_csr = os.path.join(pasta, 'csr')
+    shutil.rmtree(pasta_csr, ignore_errors=True)
+    os.makedirs(pasta_csr)
+
+    n_arestas = int(histograma[faixa:].sum())
+    origens = np.lib.format.open_memmap(os.path.join(pasta_csr, 'origens.npy'), mode='w+', dtype=np.int32, shape=(n_arestas,))
+    destinos = np.lib.format.open_memmap(os.path.join(pasta_csr, 'destinos.npy'), mode='w+', dtype=np.int32, shape=(n_arestas,))
+    pesos = np.lib.format.open_memmap(os.path.join(pasta_csr, 'pesos.npy'), mode='w+', dtype=np.float32, shape=(n_arestas,))
+    graus = np.zeros(n_vertices, dtype=np.int64)
+
+    posicao = 0
+    for k in range(n_fragmentos):
+        pesos_fragmento = np.load(_caminho_fragmento(pasta, k, 'pesos'))
+        mantidas = _faixas(pesos_fragmento) >= faixa
+        origens_fragmento = np.load(_caminho_fragmento(pasta, k, 'origens'))[mantidas]
+        fim = posicao + len(origens_fragmento)
+
+        origens[posicao:fim] = origens_fragmento
+        destinos[posicao:fim] = np.load(_caminho_fragmento(pasta, k, 'destinos'))[mantidas]
+        pesos[posicao:fim] = pesos_fragmento[mantidas]
+        graus += np.bincount(origens_fragmento, minlength=n_vertices)
+        posicao = fim
+
+    for array in (origens, destinos, pesos):
+        array.flush()
+    np.save(os.path.join(pasta_csr, 'inicios.npy'), np.concatenate(([0], np.cumsum(graus))).astype(np.int64))
+    with open(os.path.join(pasta_csr, 'manifesto.json'), 'w') as arquivo:
+        json.dump({'versao': VERSAO_FORMATO, 'vertices': int(n_vertices), 'arestas': n_arestas,
+                   'peso_minimo': faixa / FAIXAS_PESO}, arquivo, indent=2)
+    return carregar_csr(pasta)
+
+# abre o grafo em CSR com memory-map: inicios[v]:inicios[v + 1] são as posições das arestas da ocorrência v
+def carregar_csr(pasta):
+    pasta_csr = os.path.join(pasta, 'csr')
+    with open(os.path.join(pasta_csr, 'manifesto.json')) as arquivo:
+        manifesto = json.load(arquivo)
+    if manifesto.get('versao') != VERSAO_FORMATO:
+        raise ValueError(f'versão do formato do CSR não suportada: {manifesto.get("versao")}')
+
+    csr = {nome: np.load(os.path.join(pasta_csr, f'{nome}.npy'), mmap_mode='r') for nome in ('inicios', 'origens', 'destinos', 'pesos')}
+    csr.update(vertices=manifesto['vertices'], peso_minimo=manifesto['peso_minimo'])
+    return csr
+
+# grafo do igraph só com a estrutura, com as arestas copiadas do CSR em blocos (os pesos ficam fora do grafo)
+def grafo_do_csr(csr):
+    g = ig.Graph(n=csr['vertices'])
+    for inicio in range(0, len(csr['destinos']), ARESTAS_POR_BLOCO):
+        g.add_edges(np.column_stack((csr['origens'][inicio:inicio + ARESTAS_POR_BLOCO], csr['destinos'][inicio:inicio + ARESTAS_POR_BLOCO])))
+    return g
+
+# roda o pipeline completo com o orçamento de memória e grava os resultados
+# retorna o membership na ordem original das ocorrências e a tabela de comunidades
+def executar(colunas, orcamento_mb=ORCAMENTO_MB, distancia=250, alpha_tempo=0.15, resolucao=0.8, algoritmo='multilevel', semente=1,
+             metodo_busca='grade', pasta=PASTA_TRABALHO, pasta_resultado=artefato_comunidades.PASTA_RESULTADO, relatorio=None):
+    if relatorio is None:
+        relatorio = instrumentacao.Relatorio(ativo=False)
+    orcamento_bytes = orcamento_mb * 2 ** 20
+    n = ca.tamanho(colunas)
+    relatorio.contar('vertices', n)
+
+    with relatorio.etapa('ordenacao'):
+        vizinhos_medios = estimar_vizinhos(colunas['latitude'], colunas['longitude'], distancia, semente)
+        # as colunas e os atributos das arestas ficam na memória durante a busca, o restante do orçamento vai para os ladrilhos
+        residente = (instrumentacao.memoria_mb() or 0) * 2 ** 20
+        n_ladrilhos = escolher_ladrilhos(n, vizinhos_medios, max(orcamento_bytes - residente, orcamento_bytes // 4))
+        ordem = ordem_espacial(colunas['latitude'], colunas['longitude'], distancia, n_ladrilhos)
+        colunas = ca.selecionar(colunas, ordem)
+    relatorio.contar('vizinhos_medios_estimados', vizinhos_medios)
+    relatorio.contar('ladrilhos', n_ladrilhos)
+
+    with relatorio.etapa('fragmentos'):
+        n_fragmentos, n_arestas, histograma = gravar_fragmentos(pasta, colunas, distancia, alpha_tempo, n_ladrilhos, metodo_busca=metodo_busca)
+    relatorio.contar('arestas_candidatas', n_arestas)
+
+    with relatorio.etapa('csr'):
+        # a memória já ocupada pelo processo (interpretador, bibliotecas e colunas) sai do orçamento da detecção
+        residente = (instrumentacao.memoria_mb() or 0) * 2 ** 20
+        faixa = faixa_minima(histograma, n, orcamento_bytes - residente)
+        if faixa > 0:
+            print(f'As {n_arestas} arestas não cabem no orçamento, ficam só as de peso >= {faixa / FAIXAS_PESO:.4f}')
+        csr = montar_csr(pasta, n, n_fragmentos, histograma, faixa)
+    shutil.rmtree(os.path.join(pasta, 'fragmentos'), ignore_errors=True)
+    relatorio.contar('arestas', len(csr['destinos']))
+    relatorio.contar('peso_minimo', csr['peso_minimo'])
+
+    with relatorio.etapa('comunidades'):
+        g = grafo_do_csr(csr)
+        comunidades, modularidade = pipeline.detectar_comunidades(g, resolucao, semente, algoritmo, csr['pesos'])
+        membership = np.array(comunidades.membership, dtype=np.int64)
+        del g, comunidades
+    relatorio.contar('comunidades', int(membership.max()) + 1 if n else 0)
+    relatorio.contar('modularidade', modularidade)
+
+    with relatorio.etapa('estatisticas'):
+        df_comunidades, pontos_focais, areas_prioritarias, areas_atencao = pipeline.classificar(
+            membership, colunas, csr['origens'], csr['destinos'], csr['pesos'])
+
+    with relatorio.etapa('exportacao'):
+        # o membership volta para a ordem original das ocorrências
+        membership_original = np.empty(n, dtype=np.int64)
+        membership_original[ordem] = membership
+        np.save(os.path.join(pasta, 'membership.npy'), membership_original)
+        np.save(os.path.join(pasta, 'ordem.npy'), ordem)
+
+        df_comunidades.to_csv(os.path.join(pasta, 'comunidades.csv'), index=False)
+        areas_prioritarias.to_csv(os.path.join(pasta, 'prioritarias.csv'), index=False)
+        pontos_focais.to_csv(os.path.join(pasta, 'pontos_focais.csv'), index=False)
+        areas_atencao.to_csv(os.path.join(pasta, 'areas_atencao.csv'), index=False)
+        artefato_comunidades.salvar_comunidades(pasta_resultado, df_comunidades, pontos_focais, areas_prioritarias, areas_atencao)
+
+    return membership_original, df_comunidades
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Roda o pipeline com todas as ocorrências, com a memória limitada por um orçamento.')
+    parser.add_argument('--csv', default='dados/dataset-filtrado.csv', help='dataset filtrado')
+    parser.add_argument('--sinteticas', type=int, help='usa essa quantidade de ocorrências sintéticas em vez do csv')
+    parser.add_argument('--orcamento-mb', type=int, default=ORCAMENTO_MB, help='memória máxima planejada, em MB')
+    parser.add_argument('--distancia', type=float, default=250, help='distância máxima das arestas, em metros')
+    parser.add_argument('--alpha-tempo', type=float, default=0.15)
+    parser.add_argument('--resolucao', type=float, default=0.8)
+    parser.add_argument('--algoritmo', default='multilevel', choices=pipeline.ALGORITMOS)
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--busca', default='grade', choices=bv.METODOS_BUSCA, help='método da busca dos vizinhos')
+    parser.add_argument('--pasta', default=PASTA_TRABALHO, help='pasta dos fragmentos, do CSR e dos csvs das comunidades')
+    parser.add_argument('--resultado', default=artefato_comunidades.PASTA_RESULTADO, help='pasta do resultado das comunidades')
+    args = parser.parse_args()
+
+    if args.sinteticas:
+        colunas = ca.calcular_colunas(gerador_ocorrencias.gerar_ocorrencias(args.sinteticas, args.semente))
+    else:
+        colunas = ca.carregar(args.csv)
+
+    os.makedirs(args.pasta, exist_ok=True)
+    relatorio = instrumentacao.Relatorio()
+    membership, df_comunidades = executar(colunas, args.orcamento_mb, args.distancia, args.alpha_tempo, args.resolucao, args.algoritmo,
+                                          args.semente, args.busca, args.pasta, args.resultado, relatorio)
+
+    pico = instrumentacao.pico_memoria_mb()
+    print(f'{len(membership)} ocorrências, {len(df_comunidades)} comunidades, pico de {instrumentacao.formatar_mb(pico)} (orçamento de {args.orcamento_mb} MB)')
+    relatorio.salvar(os.path.join(args.pasta, 'relatorio_execucao.json'),
+                     {'orcamento_mb': args.orcamento_mb, 'distancia': args.distancia, 'alpha_tempo': args.alpha_tempo,
+                      'resolucao': args.resolucao, 'algoritmo': args.algoritmo, 'semente': args.semente})
@@ -1,7 +1,7 @@
 from datetime import timedelta
 import pandas as pd
-from scipy.spatial.distance import pdist
 import numpy as np
+from sklearn.preprocessing import MinMaxScaler
 
 categorias_crime = {
     "homicidio": [110, 113],
@@ -14,11 +14,42 @@ categorias_crime = {
     "golpes": [940, 662, 664, 666]
 }
 
+# lista fixa das categorias de crime, o índice de cada categoria na lista é o seu id
+CATEGORIAS_CRIME = list(categorias_crime) + ['Indefinido']
+ID_CATEGORIA_CRIME = {categoria: id_categoria for id_categoria, categoria in enumerate(CATEGORIAS_CRIME)}
+
+# monta um dicionário que leva cada código diretamente ao id da sua categoria (evita percorrer as listas a cada consulta)
+def _ids_por_codigo(categorias):
+    return {codigo: id_categoria for id_categoria, codigos in enumerate(categorias.values()) for codigo in codigos}
+
+# monta uma tabela indexada pelo código inteiro com o id da categoria, para converter colunas inteiras de uma vez
+def _tabela_por_codigo(ids_por_codigo, id_indefinido):
+    tabela = np.full(int(max(ids_por_codigo)) + 1, id_indefinido, dtype=np.uint8)
+    for codigo, id_categoria in ids_por_codigo.items():
+        tabela[int(codigo)] = id_categoria
+    return tabela
+
+# converte um array de códigos (podendo ter NaN ou códigos desconhecidos) nos ids das categorias
+def _ids_por_tabela(codigos, tabela, id_indefinido):
+    codigos = np.asarray(codigos, dtype=float)
+    validos = np.isfinite(codigos) & (codigos >= 0) & (codigos < len(tabela)) & (codigos == np.round(codigos))
+    ids = np.full(len(codigos), id_indefinido, dtype=np.uint8)
+    ids[validos] = tabela[codigos[validos].astype(np.int64)]
+    return ids
+
+_ID_CRIME_POR_CODIGO = _ids_por_codigo(categorias_crime)
+ID_CRIME_INDEFINIDO = ID_CATEGORIA_CRIME['Indefinido']
+_TABELA_CRIME = _tabela_por_codigo(_ID_CRIME_POR_CODIGO, ID_CRIME_INDEFINIDO)
+
+def id_cat_crime(codigo_crime):
+    return _ID_CRIME_POR_CODIGO.get(codigo_crime, ID_CRIME_INDEFINIDO)
+
+# versão vetorizada de id_cat_crime, para uma coluna inteira de códigos
+def ids_cat_crime(codigos):
+    return _ids_por_tabela(codigos, _TABELA_CRIME, ID_CRIME_INDEFINIDO)
+
 def obter_cat_crime(codigo_crime):
-    for categoria, codigos in categorias_crime.items():
-        if codigo_crime in codigos:
-            return categoria
-    return "Indefinido"
+    return CATEGORIAS_CRIME[id_cat_crime(codigo_crime)]
 
 def comparar_categorias(cat1, cat2):
     peso = 0
@@ -69,40 +100,61 @@ def gerar_perfil(idade, sexo, descendencia):
     }
     return perfil
 
+# peso de cada campo na comparação dos perfis de vítima
+PESOS_PERFIL = {'idade': 0.40, 'sexo': 0.30, 'descendencia': 0.30}
+
+# compara um único campo de dois perfis de vitima
+def comparar_campo_perfil(campo, valor1, valor2):
+    if valor1 == None or valor2 == None:
+        return 0.5
+    if campo == 'idade':
+        return 1 - (abs(valor1 - valor2) / 100)
+    if valor1.strip() == valor2.strip():
+        return 1
+    return 0
+
 # retorna peso de comparacao entre os perfis de vitima
 def comparar_vitimas(vitima1, vitima2):
-    peso_idade = 0
-    peso_sexo = 0
-    peso_descendencia = 0
-
-    if vitima1['idade'] == None or vitima2['idade'] == None:
-        peso_idade = 0.5
-    else:
-        peso_idade = 1 - (abs(vitima1['idade'] - vitima2['idade']) / 100)
-
-    if vitima1['sexo'] == None or vitima2['sexo'] == None:
-        peso_sexo = 0.5
-    elif vitima1['sexo'].strip() == vitima2['sexo'].strip():
-        peso_sexo = 1
-    
-    if vitima1['descendencia'] == None or vitima2['descendencia'] == None:
-        peso_descendencia = 0.5
-    elif vitima1['descendencia'].strip() == vitima2['descendencia'].strip():
-        peso_descendencia = 1
+    peso_idade = comparar_campo_perfil('idade', vitima1['idade'], vitima2['idade'])
+    peso_sexo = comparar_campo_perfil('sexo', vitima1['sexo'], vitima2['sexo'])
+    peso_descendencia = comparar_campo_perfil('descendencia', vitima1['descendencia'], vitima2['descendencia'])
 
-    peso_perfil = peso_idade * 0.40 + peso_sexo * 0.30 + peso_descendencia * 0.30
+    peso_perfil = peso_idade * PESOS_PERFIL['idade'] + peso_sexo * PESOS_PERFIL['sexo'] + peso_descendencia * PESOS_PERFIL['descendencia']
 
     return peso_perfil
 
-def comparar_mocodes(mocodes1, mocodes2):
+# os perfis de vitima têm poucos valores distintos por campo (cerca de 100 idades, poucos sexos e descendências)
+# cada valor recebe um id (o id 0 é o valor ausente) e as comparações entre todos os pares de ids ficam memorizadas em tabelas,
+# assim a comparação de dois perfis vira uma consulta em cada tabela
+_valores_perfil = {campo: {None: 0} for campo in PESOS_PERFIL}
+_tabelas_perfil = {}
+
+def id_valor_perfil(campo, valor):
+    if isinstance(valor, str):
+        valor = valor.strip()
+    valores = _valores_perfil[campo]
+    return valores.setdefault(valor, len(valores))
+
+# retorna os ids (idade, sexo, descendencia) de um perfil gerado por gerar_perfil
+def ids_perfil(perfil):
+    return tuple(id_valor_perfil(campo, perfil[campo]) for campo in PESOS_PERFIL)
+
+# tabela com a comparação entre todos os pares de valores já registrados do campo, recalculada apenas quando surgem valores novos
+def tabela_campo_perfil(campo):
+    valores = list(_valores_perfil[campo])
+    tabela = _tabelas_perfil.get(campo)
+    if tabela is None or len(tabela) != len(valores):
+        tabela = np.array([[comparar_campo_perfil(campo, v1, v2) for v2 in valores] for v1 in valores], dtype=float)
+        _tabelas_perfil[campo] = tabela
+    return tabela
+
+# mocode desconsiderado na comparação entre ocorrências
+MOCODE_IGNORADO = '1501'
 
-    if '1501' in mocodes1:
-        mocodes1.remove('1501')
-    if '1501' in mocodes2:
-        mocodes2.remove('1501')
+def comparar_mocodes(mocodes1, mocodes2):
 
-    set1 = set(mocodes1)
-    set2 = set(mocodes2)
+    set1 = set(mocodes1) - {MOCODE_IGNORADO}
+    set2 = set(mocodes2) - {MOCODE_IGNORADO}
 
     mocodes_em_comum = set1.intersection(set2)
 
@@ -126,11 +178,23 @@ armas_categorias = {
     "outros": [307.0, 500.0, 508.0, 511.0, 516.0]
 }
 
+# lista fixa das categorias de arma, o índice de cada categoria na lista é o seu id
+CATEGORIAS_ARMA = list(armas_categorias) + ['Indefinido']
+ID_CATEGORIA_ARMA = {categoria: id_categoria for id_categoria, categoria in enumerate(CATEGORIAS_ARMA)}
+
+_ID_ARMA_POR_CODIGO = _ids_por_codigo(armas_categorias)
+ID_ARMA_INDEFINIDA = ID_CATEGORIA_ARMA['Indefinido']
+_TABELA_ARMA = _tabela_por_codigo(_ID_ARMA_POR_CODIGO, ID_ARMA_INDEFINIDA)
+
+def id_cat_arma(codigo_arma):
+    return _ID_ARMA_POR_CODIGO.get(codigo_arma, ID_ARMA_INDEFINIDA)
+
+# versão vetorizada de id_cat_arma, para uma coluna inteira de códigos
+def ids_cat_arma(codigos):
+    return _ids_por_tabela(codigos, _TABELA_ARMA, ID_ARMA_INDEFINIDA)
+
 def obter_cat_arma(codigo_arma):
-    for categoria, codigos in armas_categorias.items():
-        if codigo_arma in codigos:
-            return categoria
-    return 'Indefinido'
+    return CATEGORIAS_ARMA[id_cat_arma(codigo_arma)]
 
 def comparar_tipos_arma(tipo1, tipo2):
     peso = 0
@@ -151,6 +215,10 @@ def comparar_tipos_arma(tipo1, tipo2):
 
     return peso
 
+# matrizes de similaridade entre as categorias (indexadas pelos ids), calculadas uma única vez a partir das funções de comparação
+SIMILARIDADE_CRIME = np.array([[comparar_categorias(c1, c2) for c2 in CATEGORIAS_CRIME] for c1 in CATEGORIAS_CRIME], dtype=float)
+SIMILARIDADE_ARMA = np.array([[comparar_tipos_arma(t1, t2) for t2 in CATEGORIAS_ARMA] for t1 in CATEGORIAS_ARMA], dtype=float)
+
 def comparar_crimes_secundarios(crimes1, crimes2):
     set1 = set(crimes1)
     set2 = set(crimes2)
@@ -172,87 +240,42 @@ def obter_categorias_secundarias(codigos):
     
     categorias = []
     for codigo in codigos:
-        for categoria, lista_codigos in categorias_crime.items():
-            if codigo in lista_codigos:
-                categorias.append(categoria)
-                break
+        if codigo in _ID_CRIME_POR_CODIGO:
+            categorias.append(CATEGORIAS_CRIME[_ID_CRIME_POR_CODIGO[codigo]])
 
     return list(set(categorias))
 
-def extrair_informacoes_comunidade(n, subgrafo_comunidade):
-    
-    n_vertices = len(subgrafo_comunidade.vs)
-    coordenadas = [(v['latitude'], v['longitude']) for v in subgrafo_comunidade.vs]
-
-    soma_pesos = sum(subgrafo_comunidade.es['weight'])
-
-    densidade = 0
-    if n_vertices > 1:
-        densidade = 2 * soma_pesos / (n_vertices * (n_vertices - 1))
-
-    pontos = np.array(coordenadas)
-    distancia_media = np.mean(pdist(pontos)) if len(pontos) > 1 else 0
-    densidade_espacial = abs(1 / (distancia_media * 111)) if distancia_media != 0 else 0# 111 pois o pdist devolve em graus de latitude que equivalem a 111 aproximadamente
-
-    crimes_comunidade = {}
-    armas_comunidade = {}
-    horarios_comunidade = {'Manha': 0, 'Tarde': 0, 'Noite': 0, 'Madrugada': 0}
-    areas = set()
-    subareas = set()
-
-    for v in subgrafo_comunidade.vs:
-        categoria = v['cat_crime']
-        arma = v['cat_arma']
-
-        areas.add(v['area'])
-        subareas.add(int(v['cod_subarea']))
-        
-        # Atualiza a contagem de categorias de crime
-        if categoria in crimes_comunidade:
-            crimes_comunidade[categoria] += 1
-        else:
-            crimes_comunidade[categoria] = 1
-
-        # Atualiza a contagem de tipo de arma
-        if arma in armas_comunidade:
-            armas_comunidade[arma] += 1
-        else:
-            armas_comunidade[arma] = 1
-
-        
-        hora = int(v['horario'].total_seconds() // 3600) % 24  # Extrai a hora de timedelta
-        if 6 <= hora < 12:  
-            horarios_comunidade['Manha'] += 1
-        elif 12 <= hora < 18:  
-            horarios_comunidade['Tarde'] += 1
-        elif 18 <= hora < 24:  
-            horarios_comunidade['Noite'] += 1
-        else: 
-            horarios_comunidade['Madrugada'] += 1
-
-    # Calcula a média das coordenadas
-    centro_lat = sum(subgrafo_comunidade.vs['latitude']) / n_vertices
-    centro_lon = sum(subgrafo_comunidade.vs['longitude']) / n_vertices
-
-    # Calcula a porcentagem de cada categoria
-    total_crimes = n_vertices
-    porcentagens_crimes = {categoria: round((count / total_crimes), 3) for categoria, count in crimes_comunidade.items()}
-    porcentagens_armas = {arma: round((count /total_crimes), 3) for arma, count in armas_comunidade.items()}
-    porcentagens_horarios = {periodo: round((count / total_crimes), 3) for periodo, count in horarios_comunidade.items()}
-
-    # Exibe os resultados com porcentagens
-    comunidade_dados = {
-            'Comunidade': n,
-            'Tamanho': n_vertices,
-            'Densidade': densidade,
-            'Densidade Espacial': densidade_espacial,
-            'Lat': centro_lat,
-            'Lon': centro_lon,
-            'Porcentagem Crimes': porcentagens_crimes,
-            'Porcentagem Armas': porcentagens_armas,
-            'Porcentagem Horarios': porcentagens_horarios,
-            'Areas': areas,
-            'Subareas': subareas,
-        }
-
-    return comunidade_dados
\ No newline at end of file
+# pesos das medidas normalizadas das comunidades no fator de escolha
+PESOS_FATOR_ESCOLHA = {'Tamanho': 0, 'Densidade': 0.5, 'Densidade Espacial': 0.5}
+
+# pesos do fator de escolha incluindo a estabilidade das comunidades entre sementes (ver deteccao_comunidades)
+# os demais pesos são reduzidos na mesma proporção, assim a soma dos pesos não muda
+def pesos_fator_escolha(peso_estabilidade=0):
+    if not peso_estabilidade:
+        return dict(PESOS_FATOR_ESCOLHA)
+    pesos = {col: peso * (1 - peso_estabilidade) for col, peso in PESOS_FATOR_ESCOLHA.items()}
+    pesos['Estabilidade'] = peso_estabilidade
+    return pesos
+
+# calcula o fator de escolha das comunidades e seleciona os pontos focais, as áreas prioritárias e as áreas de atenção
+# os limites de tamanho são proporcionais à quantidade de ocorrências do grafo
+def classificar_comunidades(df_comunidades, n_ocorrencias, pesos=None):
+    if pesos is None:
+        pesos = PESOS_FATOR_ESCOLHA
+
+    # normalização das medidas de seleção das comunidades
+    colunas = list(pesos)
+    scaler = MinMaxScaler()
+    df_comunidades[[f'{col}_normalizado' for col in colunas]] = scaler.fit_transform(df_comunidades[colunas])
+
+    df_comunidades['Fator escolha'] = sum(pesos[col] * df_comunidades[f'{col}_normalizado'] for col in colunas)
+
+    pontos_focais = df_comunidades[(df_comunidades['Fator escolha'] >= 0.1) & (df_comunidades['Tamanho'] >= n_ocorrencias * 0.002) & (df_comunidades['Tamanho'] < n_ocorrencias * 0.009)]
+
+    areas_prioritarias = df_comunidades[(df_comunidades['Fator escolha'] >= 0.0105) & (df_comunidades['Tamanho'] >= n_ocorrencias * 0.009)]
+    areas_prioritarias = areas_prioritarias.sort_values('Fator escolha', ascending=False)
+
+    areas_atencao = df_comunidades[(df_comunidades['Fator escolha'] >= 0.005) & (df_comunidades['Fator escolha'] < 0.0105) & (df_comunidades['Tamanho'] >= n_ocorrencias * 0.01)]
+    areas_atencao = areas_atencao.sort_values('Fator escolha', ascending=False)
+
+    return pontos_focais, areas_prioritarias, areas_atencao
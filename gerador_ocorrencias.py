@@ -0,0 +1,137 @@
+# Este arquivo gera ocorrências sintéticas com as mesmas colunas do dataset filtrado (dataset-filtrado.csv),
+# para rodar o pipeline e os benchmarks sem o csv da LAPD.
+# As ocorrências ficam agrupadas espacialmente como nos dados reais: cada área da LAPD tem um centro aproximado,
+# uma parte das ocorrências cai em pontos quentes (concentrações de algumas centenas de metros) e o restante se espalha pela área.
+# Os códigos de crime e de arma são sorteados dos arquivos dados/crimes.csv e dados/armas.csv
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# áreas da LAPD: (código, nome, latitude e longitude aproximadas do centro, peso relativo na quantidade de ocorrências)
+AREAS_LAPD = [
+    (1, 'Central', 34.045, -118.250, 1.4),
+    (2, 'Rampart', 34.065, -118.275, 1.0),
+    (3, 'Southwest', 34.015, -118.310, 1.2),
+    (4, 'Hollenbeck', 34.050, -118.200, 0.8),
+    (5, 'Harbor', 33.760, -118.280, 0.8),
+    (6, 'Hollywood', 34.100, -118.330, 1.1),
+    (7, 'Wilshire', 34.060, -118.350, 1.0),
+    (8, 'West LA', 34.050, -118.450, 1.0),
+    (9, 'Van Nuys', 34.180, -118.450, 0.9),
+    (10, 'West Valley', 34.190, -118.540, 0.8),
+    (11, 'Northeast', 34.120, -118.220, 0.9),
+    (12, '77th Street', 33.970, -118.300, 1.3),
+    (13, 'Newton', 34.010, -118.260, 1.0),
+    (14, 'Pacific', 33.980, -118.420, 1.1),
+    (15, 'N Hollywood', 34.170, -118.380, 1.0),
+    (16, 'Foothill', 34.250, -118.400, 0.6),
+    (17, 'Devonshire', 34.260, -118.530, 0.8),
+    (18, 'Southeast', 33.940, -118.260, 1.0),
+    (19, 'Mission', 34.270, -118.450, 0.8),
+    (20, 'Olympic', 34.050, -118.300, 1.0),
+    (21, 'Topanga', 34.200, -118.600, 0.8),
+]
+
+# desvio padrão (em graus) da dispersão das ocorrências em torno do centro da área e em torno de um ponto quente
+DISPERSAO_AREA = 0.02
+DISPERSAO_PONTO_QUENTE = 0.002
+
+# fração das ocorrências que caem em pontos quentes e quantidade de ocorrências por ponto quente (em média)
+FRACAO_PONTOS_QUENTES = 0.6
+OCORRENCIAS_POR_PONTO_QUENTE = 400
+
+# quantidade de mocodes distintos sorteados e fração de ocorrências sem mocodes, arma ou idade da vitima
+N_MOCODES = 500
+FRACAO_SEM_MOCODES = 0.15
+FRACAO_SEM_ARMA = 0.65
+FRACAO_IDADE_ZERO = 0.25
+
+SEXOS = ['M', 'F', 'X']
+PROBABILIDADE_SEXOS = [0.48, 0.42, 0.10]
+DESCENDENCIAS = ['H', 'W', 'B', 'O', 'A', 'X', 'K', 'F']
+PROBABILIDADE_DESCENDENCIAS = [0.40, 0.20, 0.15, 0.10, 0.05, 0.05, 0.03, 0.02]
+
+# probabilidades com decaimento de zipf (poucos valores muito frequentes, muitos raros)
+def _probabilidades_zipf(n, expoente=1.1):
+    pesos = 1 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+def _sortear_codigos(rng, codigos, n, fracao_ausentes):
+    codigos = np.asarray(codigos, dtype=float)
+    sorteados = codigos[rng.choice(len(codigos), n, p=_probabilidades_zipf(len(codigos)))]
+    sorteados[rng.random(n) < fracao_ausentes] = np.nan
+    return sorteados
+
+# sorteia as coordenadas e a área de cada ocorrência
+def _coordenadas(rng, n):
+    pesos_areas = np.array([area[4] for area in AREAS_LAPD])
+    centros = np.array([(area[2], area[3]) for area in AREAS_LAPD])
+    areas = rng.choice(len(AREAS_LAPD), n, p=pesos_areas / pesos_areas.sum())
+
+    # os pontos quentes de cada área são sorteados em torno do centro da área
+    n_pontos_quentes = max(1, n // (OCORRENCIAS_POR_PONTO_QUENTE * len(AREAS_LAPD)))
+    pontos_quentes = centros[:, None, :] + rng.normal(0, DISPERSAO_AREA, (len(AREAS_LAPD), n_pontos_quentes, 2))
+
+    em_ponto_quente = rng.random(n) < FRACAO_PONTOS_QUENTES
+    origem = np.where(em_ponto_quente[:, None], pontos_quentes[areas, rng.integers(0, n_pontos_quentes, n)], centros[areas])
+    dispersao = np.where(em_ponto_quente, DISPERSAO_PONTO_QUENTE, DISPERSAO_AREA)[:, None]
+    coordenadas = origem + rng.normal(0, 1, (n, 2)) * dispersao
+    return coordenadas[:, 0], coordenadas[:, 1], areas
+
+# horario militar (hhmm), com mais ocorrências à tarde e à noite e um pico exatamente ao meio dia, como nos dados reais
+def _horarios(rng, n):
+    minutos = (rng.normal(15 * 60, 5 * 60, n) % (24 * 60)).astype(np.int64)
+    minutos[rng.random(n) < 0.05] = 12 * 60
+    return (minutos // 60) * 100 + minutos % 60
+
+def _mocodes(rng, n):
+    codigos = np.array([f'{codigo:04d}' for codigo in rng.choice(np.arange(100, 2200), N_MOCODES, replace=False)])
+    probabilidades = _probabilidades_zipf(N_MOCODES)
+    quantidades = rng.integers(1, 6, n)
+    sorteados = codigos[rng.choice(N_MOCODES, quantidades.sum(), p=probabilidades)]
+    inicios = np.concatenate(([0], np.cumsum(quantidades)))
+    mocodes = np.array([' '.join(sorteados[inicios[k]:inicios[k + 1]]) for k in range(n)], dtype=object)
+    mocodes[rng.random(n) < FRACAO_SEM_MOCODES] = np.nan
+    return mocodes
+
+# gera n ocorrências sintéticas com as colunas do dataset filtrado
+def gerar_ocorrencias(n, semente=1, caminho_crimes='dados/crimes.csv', caminho_armas='dados/armas.csv'):
+    rng = np.random.default_rng(semente)
+    codigos_crime = pd.read_csv(caminho_crimes)['Crm Cd'].to_numpy()
+    codigos_arma = pd.read_csv(caminho_armas)['Weapon Used Cd'].to_numpy()
+
+    latitudes, longitudes, areas = _coordenadas(rng, n)
+    codigos_areas = np.array([area[0] for area in AREAS_LAPD])[areas]
+
+    idades = np.clip(rng.normal(38, 16, n), 1, 99).astype(np.int64)
+    idades[rng.random(n) < FRACAO_IDADE_ZERO] = 0
+
+    return pd.DataFrame({
+        'LAT': latitudes.round(4),
+        'LON': longitudes.round(4),
+        'TIME OCC': _horarios(rng, n),
+        'AREA': codigos_areas,
+        'AREA NAME': np.array([area[1] for area in AREAS_LAPD])[areas],
+        'Rpt Dist No': codigos_areas * 100 + rng.integers(0, 100, n),
+        'Crm Cd': _sortear_codigos(rng, codigos_crime, n, 0).astype(np.int64),
+        'Crm Cd 2': _sortear_codigos(rng, codigos_crime, n, 0.9),
+        'Crm Cd 3': _sortear_codigos(rng, codigos_crime, n, 0.995),
+        'Crm Cd 4': _sortear_codigos(rng, codigos_crime, n, 0.9999),
+        'Mocodes': _mocodes(rng, n),
+        'Weapon Used Cd': _sortear_codigos(rng, codigos_arma, n, FRACAO_SEM_ARMA),
+        'Vict Age': idades,
+        'Vict Sex': rng.choice(SEXOS, n, p=PROBABILIDADE_SEXOS),
+        'Vict Descent': rng.choice(DESCENDENCIAS, n, p=PROBABILIDADE_DESCENDENCIAS),
+    })
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera ocorrências sintéticas com as colunas do dataset filtrado.')
+    parser.add_argument('n', type=int, help='quantidade de ocorrências')
+    parser.add_argument('saida', help='caminho do csv gerado')
+    parser.add_argument('--semente', type=int, default=1)
+    args = parser.parse_args()
+
+    gerar_ocorrencias(args.n, args.semente).to_csv(args.saida, index=False)
+    print(f'{args.n} ocorrências gravadas em {args.saida}')
@@ -0,0 +1,113 @@
+# Este arquivo grava e lê o grafo num formato binário: uma pasta com as colunas tipadas dos vértices (as mesmas do
+# cache_atributos), os pares das arestas (int32), os pesos (float64) e atributos extras dos vértices (ex: comunidade),
+# cada um num arquivo .npy que pode ser aberto com memory-map. O grafo é remontado direto dos arrays, sem o parse do XML.
+# O GraphML fica apenas para ferramentas de visualização (ver exportar_graphml)
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import cache_atributos as ca
+import pipeline
+
+VERSAO_FORMATO = 1
+
+# atributo extra como array numérico ou, se for texto, como (códigos, vocabulário)
+def _codificar_atributo(valores):
+    if isinstance(valores, tuple):
+        return valores
+    valores = np.asarray(valores)
+    if valores.dtype.kind in 'OUS':
+        return tuple(pd.factorize(pd.Series(valores, dtype=object)))
+    return valores
+
+# grava o grafo na pasta. 'atributos' são valores extras por vértice: arrays numéricos, listas de textos ou
+# (códigos, vocabulário) como devolvidos por carregar_tabelas
+# (os textos são gravados como códigos int32, com -1 para valores ausentes, e o vocabulário dos códigos)
+def salvar_grafo(pasta, colunas, pares_i, pares_j, pesos, atributos=None):
+    os.makedirs(pasta, exist_ok=True)
+    if os.path.exists(os.path.join(pasta, 'manifesto.json')):
+        os.remove(os.path.join(pasta, 'manifesto.json'))
+
+    ca.salvar_colunas(os.path.join(pasta, 'vertices'), colunas)
+    np.save(os.path.join(pasta, 'pares_i.npy'), np.asarray(pares_i, dtype=np.int32))
+    np.save(os.path.join(pasta, 'pares_j.npy'), np.asarray(pares_j, dtype=np.int32))
+    np.save(os.path.join(pasta, 'pesos.npy'), np.asarray(pesos, dtype=float))
+
+    tipos_atributos = {}
+    for nome, valores in (atributos or {}).items():
+        atributo = _codificar_atributo(valores)
+        if isinstance(atributo, tuple):
+            codigos, vocabulario = atributo
+            np.save(os.path.join(pasta, f'atributo_{nome}.npy'), np.asarray(codigos, dtype=np.int32))
+            np.save(os.path.join(pasta, f'atributo_{nome}_vocabulario.npy'), np.asarray(vocabulario, dtype=str))
+            tipos_atributos[nome] = 'texto'
+        else:
+            np.save(os.path.join(pasta, f'atributo_{nome}.npy'), atributo)
+            tipos_atributos[nome] = 'numerico'
+
+    with open(os.path.join(pasta, 'manifesto.json'), 'w') as arquivo:
+        json.dump({'versao': VERSAO_FORMATO, 'vertices': ca.tamanho(colunas), 'arestas': len(pares_i),
+                   'colunas': sorted(colunas), 'atributos': tipos_atributos}, arquivo, indent=2)
+
+# lê as tabelas do grafo (com memory-map, por padrão): colunas dos vértices, pares, pesos e atributos extras
+# os atributos de texto são devolvidos como (códigos, vocabulário)
+def carregar_tabelas(pasta, mmap=True):
+    with open(os.path.join(pasta, 'manifesto.json')) as arquivo:
+        manifesto = json.load(arquivo)
+    if manifesto.get('versao') != VERSAO_FORMATO:
+        raise ValueError(f'versão do formato do grafo não suportada: {manifesto.get("versao")}')
+
+    def carregar(nome):
+        return np.load(os.path.join(pasta, f'{nome}.npy'), mmap_mode='r' if mmap else None)
+
+    atributos = {}
+    for nome, tipo in manifesto['atributos'].items():
+        if tipo == 'texto':
+            atributos[nome] = (carregar(f'atributo_{nome}'), carregar(f'atributo_{nome}_vocabulario'))
+        else:
+            atributos[nome] = carregar(f'atributo_{nome}')
+
+    colunas = ca.abrir_colunas(os.path.join(pasta, 'vertices'), manifesto['colunas'])
+    if not mmap:
+        colunas = {nome: np.array(valores) for nome, valores in colunas.items()}
+
+    return {
+        'vertices': manifesto['vertices'],
+        'colunas': colunas,
+        'pares_i': carregar('pares_i'),
+        'pares_j': carregar('pares_j'),
+        'pesos': carregar('pesos'),
+        'atributos': atributos,
+    }
+
+# valores de um atributo extra (os de texto são decodificados, com None para valores ausentes)
+def valores_atributo(atributo):
+    if isinstance(atributo, tuple):
+        codigos, vocabulario = atributo
+        return [None if codigo < 0 else str(vocabulario[codigo]) for codigo in codigos.tolist()]
+    return np.asarray(atributo).tolist()
+
+# monta o igraph.Graph a partir das tabelas, com os pesos em 'weight'
+# com preencher=True os vértices recebem os atributos das ocorrências (ca.preencher_vertices) e os atributos extras
+def montar_grafo(tabelas, preencher=False):
+    g = pipeline.montar_grafo(tabelas['vertices'], tabelas['pares_i'], tabelas['pares_j'], tabelas['pesos'])
+    if preencher:
+        ca.preencher_vertices(g, tabelas['colunas'])
+        for nome, atributo in tabelas['atributos'].items():
+            g.vs[nome] = valores_atributo(atributo)
+    return g
+
+def carregar_grafo(pasta, preencher=False, mmap=True):
+    return montar_grafo(carregar_tabelas(pasta, mmap), preencher)
+
+# grava o grafo em GraphML (apenas para ferramentas de visualização), convertendo horario e mocodes para texto
+# os atributos do grafo informado são alterados
+def exportar_graphml(g, caminho):
+    if 'horario' in g.vs.attributes():
+        g.vs['horario'] = [str(horario) for horario in g.vs['horario']]
+    if 'mocodes' in g.vs.attributes():
+        g.vs['mocodes'] = [",".join(mocodes) if mocodes else "" for mocodes in g.vs['mocodes']]
+    g.write_graphml(caminho)
@@ -0,0 +1,178 @@
+# Este arquivo mede as etapas do pipeline (tempo de relógio e de CPU, memória residente e pico de memória),
+# guarda contadores (vértices, pares, arestas, comunidades...) e histogramas, e grava tudo num relatório json.
+# As etapas mais pesadas podem ser perfiladas com cProfile e/ou tracemalloc, ativados apenas quando pedidos.
+# Com o relatório desativado as etapas não medem nada (o custo é o de um contexto vazio)
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import numpy as np
+
+# o resource só existe nos sistemas unix; no windows o pico vem do psutil, quando instalado
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# quantidade de funções (cProfile) e de linhas de alocação (tracemalloc) guardadas no relatório por etapa
+FUNCOES_PERFIL = 20
+LINHAS_ALOCACAO = 10
+
+# memória residente atual do processo, em MB
+def memoria_mb():
+    try:
+        with open('/proc/self/statm') as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return None
+
+# maior memória residente do processo até agora, em MB, ou None quando não há como medir
+# (o ru_maxrss é em bytes no macOS e em KB nos demais unix)
+def pico_memoria_mb():
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2 ** 20 if sys.platform == 'darwin' else pico / 1024
+    pico = getattr(psutil.Process().memory_info(), 'peak_wset', None) if psutil is not None else None
+    return pico / 2 ** 20 if pico is not None else None
+
+# texto de uma medida de memória para exibição (None quando não foi possível medir)
+def formatar_mb(valor):
+    return f'{valor:.0f} MB' if valor is not None else 'indisponível'
+
+# tempo de CPU do processo e dos processos filhos já encerrados (a busca de vizinhos pode usar vários processos)
+def _tempo_cpu():
+    tempos = os.times()
+    return tempos.user + tempos.system + tempos.children_user + tempos.children_system
+
+# funções com maior tempo acumulado de um perfil do cProfile
+def _funcoes_mais_lentas(perfil):
+    estatisticas = pstats.Stats(perfil).stats
+    funcoes = sorted(estatisticas.items(), key=lambda item: item[1][3], reverse=True)[:FUNCOES_PERFIL]
+    return [{'funcao': f'{arquivo}:{linha}({nome})', 'chamadas': chamadas, 'segundos_proprios': proprio, 'segundos_acumulados': acumulado}
+            for (arquivo, linha, nome), (_, chamadas, proprio, acumulado, _) in funcoes]
+
+# linhas que mais alocaram memória (python e numpy) durante a etapa
+def _maiores_alocacoes(snapshot):
+    return [{'linha': str(estatistica.traceback[0]), 'mb': estatistica.size / 2 ** 20, 'blocos': estatistica.count}
+            for estatistica in snapshot.statistics('lineno')[:LINHAS_ALOCACAO]]
+
+class Relatorio:
+    # ativo: mede as etapas e guarda os contadores (desativado, todos os métodos não fazem nada)
+    # perfilar: roda o cProfile nas etapas marcadas com perfilar=True, gravando os .prof em pasta_perfis
+    # rastrear_memoria: roda o tracemalloc nas etapas marcadas com perfilar=True
+    def __init__(self, ativo=True, perfilar=False, rastrear_memoria=False, pasta_perfis='dados/perfis'):
+        self.ativo = ativo
+        self.perfilar = ativo and perfilar
+        self.rastrear_memoria = ativo and rastrear_memoria
+        self.pasta_perfis = pasta_perfis
+        self.inicio = datetime.now()
+        self.etapas = []
+        self.contadores = {}
+        self.histogramas = {}
+        self._pilha = []
+        self._perfil_ativo = False
+
+    # mede o bloco de código como uma etapa. Etapas dentro de outras são registradas como 'externa/interna'
+    def etapa(self, nome, perfilar=False):
+        if not self.ativo:
+            return nullcontext()
+        return self._medir_etapa(nome, perfilar)
+
+    @contextmanager
+    def _medir_etapa(self, nome, perfilar):
+        self._pilha.append(nome)
+        nome_completo = '/'.join(self._pilha)
+        registro = {'nome': nome_completo}
+
+        # apenas um perfil por vez (o cProfile não aceita perfis aninhados)
+        perfil = None
+        if perfilar and self.perfilar and not self._perfil_ativo:
+            perfil = cProfile.Profile()
+            self._perfil_ativo = True
+        rastrear = perfilar and self.rastrear_memoria and not tracemalloc.is_tracing()
+        if rastrear:
+            tracemalloc.start()
+
+        inicio, inicio_cpu = time.perf_counter(), _tempo_cpu()
+        if perfil is not None:
+            perfil.enable()
+        try:
+            yield
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            registro['segundos'] = time.perf_counter() - inicio
+            registro['cpu_segundos'] = _tempo_cpu() - inicio_cpu
+            registro['memoria_mb'] = memoria_mb()
+            registro['pico_memoria_mb'] = pico_memoria_mb()
+
+            if rastrear:
+                registro['pico_alocado_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                registro['alocacoes'] = _maiores_alocacoes(tracemalloc.take_snapshot())
+                tracemalloc.stop()
+            if perfil is not None:
+                self._perfil_ativo = False
+                os.makedirs(self.pasta_perfis, exist_ok=True)
+                caminho_perfil = os.path.join(self.pasta_perfis, nome_completo.replace('/', '_') + '.prof')
+                perfil.dump_stats(caminho_perfil)
+                registro['perfil'] = caminho_perfil
+                registro['funcoes'] = _funcoes_mais_lentas(perfil)
+
+            self._pilha.pop()
+            self.etapas.append(registro)
+
+    # define (ou soma, com somar=True) o valor de um contador
+    def contar(self, nome, valor, somar=False):
+        if not self.ativo:
+            return
+        self.contadores[nome] = self.contadores.get(nome, 0) + valor if somar else valor
+
+    # guarda o histograma de valores inteiros (ex: vizinhos por vértice) em faixas de potências de 2: 0, 1, 2-3, 4-7...
+    def histograma(self, nome, valores):
+        if not self.ativo:
+            return
+        valores = np.asarray(valores, dtype=np.int64)
+        faixas = np.zeros(len(valores), dtype=np.int64)
+        positivos = valores > 0
+        faixas[positivos] = np.floor(np.log2(valores[positivos])).astype(np.int64) + 1
+        contagens = np.bincount(faixas)
+
+        rotulos = ['0'] + [f'{2 ** (k - 1)}-{2 ** k - 1}' if k > 1 else '1' for k in range(1, len(contagens))]
+        self.histogramas[nome] = {
+            'faixas': {rotulo: int(contagem) for rotulo, contagem in zip(rotulos, contagens)},
+            'media': float(valores.mean()) if len(valores) else 0,
+            'mediana': float(np.median(valores)) if len(valores) else 0,
+            'p99': float(np.percentile(valores, 99)) if len(valores) else 0,
+            'maximo': int(valores.max()) if len(valores) else 0,
+        }
+
+    # etapas por nome (a última medição de cada nome)
+    def etapas_por_nome(self):
+        return {registro['nome']: registro for registro in self.etapas}
+
+    # grava o relatório em json (nada é gravado com o relatório desativado)
+    def salvar(self, caminho, parametros=None):
+        if not self.ativo:
+            return
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        with open(caminho, 'w') as arquivo:
+            json.dump({
+                'inicio': self.inicio.isoformat(timespec='seconds'),
+                'segundos_total': (datetime.now() - self.inicio).total_seconds(),
+                'pico_memoria_mb': pico_memoria_mb(),
+                'parametros': parametros or {},
+                'etapas': self.etapas,
+                'contadores': self.contadores,
+                'histogramas': self.histogramas,
+            }, arquivo, indent=2, default=lambda valor: valor.item())  # valores numpy viram tipos python
@@ -1,205 +1,194 @@
 import funcoes_auxiliares as fa
+import motor_arestas as me
+import cache_atributos as ca
+import artefato_comunidades
+import cache_arestas
+import consulta_comunidades
+import deteccao_comunidades as dc
+import atualizacao_incremental as ai
+import grafo_binario as gb
+import instrumentacao
+import pipeline
 from analise_dados import descrever_comunidades
-import igraph as ig
 import pandas as pd
 import numpy as np
-from math import exp
-from sklearn.neighbors import BallTree
-from geopy.distance import geodesic
-from sklearn.preprocessing import MinMaxScaler
 
 # valor de ajuste para calculo não linear da distancia temporal
 ALPHA_TEMPO = 0.15
 # Distancia máxima para conexão de ocorrencias (vertices)
 DISTANCIA_OCORRENCIAS = 250
 
-# quantidade de ocorrencias para teste
+# coeficientes de cada componente (distancia, horario, crime, mocodes, vitima, arma, crimes secundarios) no peso final das arestas
+COEFICIENTES = dict(me.COEFICIENTES)
+
+# forma de calcular a distância das arestas: 'balltree' (reaproveita as distâncias da busca), 'haversine' ou 'geodesic' (referência, mais lento)
+MODO_DISTANCIA = 'balltree'
+# quando verdadeiro, compara os modos de distância numa amostra de arestas e exibe o maior desvio nos pesos
+VERIFICAR_MODOS_DISTANCIA = False
+
+# esparsificação das arestas (None desativa): mantém só as arestas com peso final >= PESO_MINIMO e/ou as TOP_K arestas
+# mais fortes de cada ocorrência, ver esparsificacao.py para comparar as opções com o grafo completo. A esparsificação é
+# feita na criação das arestas, ladrilho a ladrilho, e as arestas em cache passam a depender de COEFICIENTES
+PESO_MINIMO = None
+TOP_K = None
+SIMETRIZACAO_TOP_K = 'uniao'
+
+# resolução usada na detecção de comunidades (valores menores geram comunidades maiores)
+RESOLUCAO = 0.8
+
+# algoritmo da detecção de comunidades ('multilevel' ou 'leiden'), rodado com SEMENTES sementes (a partir de SEMENTE)
+# em PROCESSOS_COMUNIDADES processos. Com mais de uma semente as comunidades são o consenso entre as execuções
+ALGORITMO_COMUNIDADES = 'multilevel'
+SEMENTES = 1
+SEMENTE = 1
+PROCESSOS_COMUNIDADES = 1
+# peso da estabilidade das comunidades entre as sementes no fator de escolha (0 mantém o fator original)
+PESO_ESTABILIDADE = 0
+
+# pasta onde o estado da execução é gravado, para inserir ocorrências novas depois (ver atualizacao_incremental.py)
+PASTA_ESTADO = ai.PASTA_ESTADO
+
+# quantidade de processos usados na busca dos vizinhos (1 faz a busca em série)
+PROCESSOS = 1
+# método da busca dos vizinhos: 'grade' (grade uniforme, mais rápida para o raio fixo) ou 'balltree'
+METODO_BUSCA = 'grade'
+
+# quantidade de ocorrencias para teste (para rodar com todas as ocorrências e a memória limitada, ver fora_da_memoria.py)
 Q_OCC = 15000
 
-print('Lendo csv')
-# carrega os dados do dataset já filtrado
-df = pd.read_csv('dados/dataset-filtrado.csv')
-
-np.random.seed(1)
-df = df.sample(n=Q_OCC).reset_index(drop=True) # grafo menor para testes, remover na aplicação real
-
-latitudes = np.array(df['LAT'])
-longitudes = np.array(df['LON'])
-
-#junta os dados em tuplas
-coord_ocorrencias = np.column_stack((latitudes, longitudes))
+# pasta do grafo no formato binário (ver grafo_binario.py) e exportação opcional em GraphML, só para ferramentas de visualização
+CAMINHO_GRAFO = f'grafos_modelados/grafo_{DISTANCIA_OCORRENCIAS}m_{Q_OCC}_occ'
+EXPORTAR_GRAPHML = False
 
-# converte latitudes e longitudes para radianos para usar na BallTree
-coords_rad = np.radians(coord_ocorrencias)
+# relatório da execução (tempo, memória e contadores de cada etapa), gravado junto com os csvs
+INSTRUMENTAR = True
+CAMINHO_RELATORIO = 'dados/relatorio_execucao.json'
+# perfis do cProfile e/ou do tracemalloc nas etapas mais pesadas (deixam a execução mais lenta)
+PERFILAR = False
+RASTREAR_MEMORIA = False
+# histograma da quantidade de vizinhos por ocorrência
+HISTOGRAMA_VIZINHOS = True
 
-# BallTree é uma estrutura de dados que permite fazer busca eficiente com base na distância entre os nós.
-# ela atende bem nosso uso pois temos uma distância máxima como critério de criação de arestas
-ball_tree = BallTree(coords_rad, metric='haversine')
+relatorio = instrumentacao.Relatorio(INSTRUMENTAR, PERFILAR, RASTREAR_MEMORIA)
 
-# define o raio de distância máxima para criar arestas num vértice (em radianos)
-raio_radianos = DISTANCIA_OCORRENCIAS / 6371000
-
-print('Criando grafo')
-# inicializa o grafo com o número total de vértices (criar o grafo diretamente das arestas pode causar erros, principalmente desconsiderar vértices sem arestas.)
-g = ig.Graph(n=len(coord_ocorrencias))
-
-#dados das ocorrencias que serão levados em conta na formação das arestas
-g.vs['latitude'] = latitudes
-g.vs['longitude'] = longitudes
-g.vs['horario'] = [fa.militar_para_timedelta(x) for x in df['TIME OCC']] # transformar horarios em timedelta (facilita cálculos)
-g.vs['cat_crime'] = [fa.obter_cat_crime(codigo) for codigo in df['Crm Cd']]
-g.vs['mocodes'] = [str(x).split() for x in df['Mocodes']]
-g.vs['cat_arma'] = [fa.obter_cat_arma(codigo) for codigo in df['Weapon Used Cd']]
-g.vs['crm_cods'] = df.apply(fa.obter_categorias_secundarias, axis=1)
-g.vs['perfil_vitima'] = df.apply(lambda row: fa.gerar_perfil(row['Vict Age'], row['Vict Sex'], row['Vict Descent']), axis=1).tolist()
+print('Lendo csv')
+with relatorio.etapa('leitura'):
+    # carrega os atributos do dataset já filtrado a partir do cache (gerado na primeira execução, ou quando o csv muda)
+    # com Q_OCC usa uma amostra menor para testes, remover na aplicação real (a amostra é a mesma de df.sample(n=Q_OCC) após np.random.seed(1))
+    colunas = pipeline.carregar_ocorrencias('dados/dataset-filtrado.csv', Q_OCC)
 
-# dados que serão usados nas análises de dados das comunidades
-g.vs['cod_area'] = np.array(df['AREA'])
-g.vs['area'] = np.array(df['AREA NAME'])
-g.vs['cod_subarea'] = np.array(df['Rpt Dist No'])
+# os dados das ocorrências ficam nas colunas tipadas do cache (ver cache_atributos), usadas na formação das arestas e nas
+# estatísticas das comunidades. Os atributos dos vértices do igraph só são preenchidos na exportação em GraphML
+relatorio.contar('vertices', ca.tamanho(colunas))
 
 print('Criando arestas')
-# para todas as ocorrências, encontrar os vizinhos na distância do raio escolhisdos
-
-arestas = []
-pesos = []
-for i, coord in enumerate(coords_rad):
-    #if i % 200 == 0:
-    #    print(i)
-
-    vi = g.vs[i]
-
-    indices = ball_tree.query_radius([coord], r=raio_radianos)[0]
-    for j in indices:
-        if i < j:  # evita duplicação de arestas
-            peso_final = 0
-            peso_distancia = 0 # ok
-            peso_horario = 0 # ok
-            peso_crime = 0 # ok
-            peso_mocodes = 0 # ok
-            peso_vitima = 0 # ok
-            peso_arma = 0 # ok
-            peso_crm_cds = 0 # ok
-
-            vj = g.vs[j]
-
-            dist_metros = geodesic((vi['latitude'], vi['longitude']), (vj['latitude'], vj['longitude'])).meters
-            peso_distancia = 1 - (dist_metros / DISTANCIA_OCORRENCIAS)
-
-            diferenca_horario = fa.diferenca_horario(vi['horario'], vj['horario'])
-
-            # calcula o peso do horário com uma função exponencial, que é não linear
-            # o calculo não linear faz com que horarios mais próximos gerem proporcionalmente mais peso
-            peso_horario = exp(-ALPHA_TEMPO * (diferenca_horario.total_seconds() / 3600))
- 
-            peso_vitima = fa.comparar_vitimas(vi['perfil_vitima'], vj['perfil_vitima'])
-
-            peso_crime = fa.comparar_categorias(vi['cat_crime'], vj['cat_crime'])
-
-            peso_mocodes = fa.comparar_mocodes(vi['mocodes'], vj['mocodes'])
-            
-            peso_arma = fa.comparar_tipos_arma(vi['cat_arma'], vj['cat_arma'])
-
-            peso_crm_cds = fa.comparar_crimes_secundarios(vi['crm_cods'], vj['crm_cods'])
-
-            peso_final = peso_distancia * 0.25 + peso_horario * 0.1 + peso_crime * 0.25 + peso_mocodes * 0.1 + peso_vitima * 0.1 + peso_arma * 0.15 + peso_crm_cds * 0.05
-
-            # adiciona as arestas e pesos, além dos outros atributos
-            arestas.append((i,j))
-            pesos.append(peso_final)
-print(i)
-
-g.add_edges(arestas)
-g.es['weight'] = pesos
+# para todas as ocorrências, encontrar os vizinhos na distância do raio escolhido
+# os pares (i, j) são devolvidos em arrays e os pesos são calculados de uma vez pelo motor de arestas
+# as arestas ficam guardadas em cache com os componentes do peso separados, assim mudar COEFICIENTES não exige recriá-las
+# (sem esparsificação)
+with relatorio.etapa('arestas'):
+    arestas = pipeline.calcular_arestas(colunas, DISTANCIA_OCORRENCIAS, ALPHA_TEMPO, MODO_DISTANCIA, PROCESSOS, relatorio, VERIFICAR_MODOS_DISTANCIA, METODO_BUSCA,
+                                        COEFICIENTES, PESO_MINIMO, TOP_K, SIMETRIZACAO_TOP_K)
+
+# vizinhos encontrados no raio de cada ocorrência (antes da esparsificação, contados na criação das arestas quando ela é usada)
+if 'vizinhos' in arestas:
+    vizinhos = np.asarray(arestas['vizinhos'])
+else:
+    vizinhos = np.bincount(arestas['pares_i'], minlength=ca.tamanho(colunas)) + np.bincount(arestas['pares_j'], minlength=ca.tamanho(colunas))
+relatorio.contar('arestas_candidatas', int(vizinhos.sum()) // 2)
+if HISTOGRAMA_VIZINHOS and relatorio.ativo:
+    relatorio.histograma('vizinhos_por_ocorrencia', vizinhos)
+
+with relatorio.etapa('grafo'):
+    pares_i, pares_j = arestas['pares_i'], arestas['pares_j']
+    pesos = cache_arestas.reponderar(arestas, COEFICIENTES)
+
+    print('Criando grafo')
+    # o grafo é criado com o número total de vértices, assim as ocorrências sem arestas também viram vértices
+    g = pipeline.montar_grafo(ca.tamanho(colunas), pares_i, pares_j, pesos)
+relatorio.contar('arestas', g.ecount())
 
 print('Detectando comunidades')
-# aplica o algoritmo de Louvain para identificar as comunidades
-comunidades_detectadas = g.community_multilevel(weights=g.es['weight'], resolution=0.8)
+with relatorio.etapa('comunidades', perfilar=True):
+    # aplica o algoritmo de Louvain (ou Leiden) para identificar as comunidades, com cada semente em paralelo
+    deteccao = dc.detectar_consenso(g.vcount(), pares_i, pares_j, pesos, list(range(SEMENTE, SEMENTE + SEMENTES)),
+                                    ALGORITMO_COMUNIDADES, RESOLUCAO, PROCESSOS_COMUNIDADES, g)
+membership = deteccao['membership']
+relatorio.contar('comunidades', len(deteccao['estabilidade']))
+relatorio.contar('modularidade', deteccao['modularidade'])
+relatorio.contar('estabilidade_media', float(deteccao['estabilidade'].mean()))
 
-g.vs['comunidade'] = comunidades_detectadas.membership
 
 print('Salvando as comunidades')
 
-# exibir as comunidades
-comunidades_dados = []
-for i, comunidade in enumerate(comunidades_detectadas):
-    subgrafo = g.induced_subgraph(comunidade)
-    comunidade_dados = fa.extrair_informacoes_comunidade(i, subgrafo)
-    comunidades_dados.append(comunidade_dados)
-
-df_comunidades = pd.DataFrame(comunidades_dados)
-
-# normalização das medidas de seleção das comunidades
-colunas = ['Tamanho', 'Densidade', 'Densidade Espacial']
-scaler = MinMaxScaler()
-df_comunidades[[f'{col}_normalizado' for col in colunas]] = scaler.fit_transform(df_comunidades[colunas])
-
-pesos = {'Tamanho': 0, 'Densidade': 0.5, 'Densidade Espacial': 0.5}
-df_comunidades['Fator escolha'] = (
-        pesos['Tamanho'] * df_comunidades['Tamanho_normalizado'] +
-        pesos['Densidade'] * df_comunidades['Densidade_normalizado'] +
-        pesos['Densidade Espacial'] * df_comunidades['Densidade Espacial_normalizado']
-    )
-
-pontos_focais = df_comunidades[(df_comunidades['Fator escolha'] >= 0.1) & (df_comunidades['Tamanho'] >= Q_OCC * 0.002) & (df_comunidades['Tamanho'] < Q_OCC * 0.009)]
-areas_prioritarias = pontos_focais.sort_values('Fator escolha', ascending=False)
-
-areas_prioritarias = df_comunidades[(df_comunidades['Fator escolha'] >= 0.0105) & (df_comunidades['Tamanho'] >= Q_OCC * 0.009)]
-areas_prioritarias = areas_prioritarias.sort_values('Fator escolha', ascending=False)
-
-areas_atencao = df_comunidades[(df_comunidades['Fator escolha'] >= 0.005) & (df_comunidades['Fator escolha'] < 0.0105) & (df_comunidades['Tamanho'] >= Q_OCC * 0.01)]
-areas_atencao = areas_atencao.sort_values('Fator escolha', ascending=False)
+with relatorio.etapa('estatisticas', perfilar=True):
+    # estatísticas de todas as comunidades, calculadas de uma vez a partir do membership e das arestas
+    df_comunidades, pontos_focais, areas_prioritarias, areas_atencao = pipeline.classificar(
+        membership, colunas, pares_i, pares_j, pesos, deteccao['estabilidade'], fa.pesos_fator_escolha(PESO_ESTABILIDADE))
+relatorio.contar('pontos_focais', len(pontos_focais))
+relatorio.contar('areas_prioritarias', len(areas_prioritarias))
+relatorio.contar('areas_atencao', len(areas_atencao))
 
 z = pontos_focais.head(5)
 x = areas_prioritarias.head(5)
 
 print('Comunidades filtradas')
 
-df_comunidades.to_csv('dados/comunidades.csv', index=False)
-areas_prioritarias.to_csv('dados/prioritarias.csv', index=False)
-pontos_focais.to_csv('dados/pontos_focais.csv', index=False)
-areas_atencao.to_csv('dados/areas_atencao.csv', index=False)
+parametros = {'distancia': DISTANCIA_OCORRENCIAS, 'alpha_tempo': ALPHA_TEMPO, 'modo_distancia': MODO_DISTANCIA, 'resolucao': RESOLUCAO, 'coeficientes': COEFICIENTES,
+              'peso_minimo': PESO_MINIMO, 'top_k': TOP_K, 'simetrizacao_top_k': SIMETRIZACAO_TOP_K,
+              'algoritmo_comunidades': ALGORITMO_COMUNIDADES, 'sementes': SEMENTES}
+
+with relatorio.etapa('exportacao'):
+    df_comunidades.to_csv('dados/comunidades.csv', index=False)
+    areas_prioritarias.to_csv('dados/prioritarias.csv', index=False)
+    pontos_focais.to_csv('dados/pontos_focais.csv', index=False)
+    areas_atencao.to_csv('dados/areas_atencao.csv', index=False)
+    artefato_comunidades.salvar_comunidades(artefato_comunidades.PASTA_RESULTADO, df_comunidades, pontos_focais, areas_prioritarias, areas_atencao)
+
+    # grava o estado da execução para as atualizações incrementais
+    ai.salvar_estado(PASTA_ESTADO, colunas, arestas, membership, df_comunidades, parametros)
 
 descrever_comunidades(areas_prioritarias, areas_atencao, pontos_focais)
 
 print("Dados exportados para: 'comunidades.csv'")
 
-comunidades_selecionadas = pd.concat([pontos_focais, areas_prioritarias, areas_atencao])
-
-for i, comunidade in comunidades_selecionadas.iterrows():
-    g.add_vertex(f'com_{comunidade["Comunidade"]}')
+# Atribui o tipo de comunidade aos vértices (o tipo de cada comunidade vai para as suas ocorrências pelo membership)
+tipo_por_comunidade = np.full(membership.max() + 1, 'comum', dtype=object)
+tipo_por_comunidade[areas_atencao['Comunidade'].to_numpy()] = 'area atencao'
+tipo_por_comunidade[areas_prioritarias['Comunidade'].to_numpy()] = 'area prioritaria'
+tipo_por_comunidade[pontos_focais['Comunidade'].to_numpy()] = 'ponto focal'
+tipo_comunidade = tipo_por_comunidade[membership].tolist()
 
-    novo_vertice_idx = g.vs.find(name=f'com_{comunidade["Comunidade"]}').index
+with relatorio.etapa('grafo_binario'):
+    gb.salvar_grafo(CAMINHO_GRAFO, colunas, pares_i, pares_j, pesos,
+                    {'comunidade': membership, 'tipo_comunidade': tipo_comunidade})
+print(f"Grafo exportado para: {CAMINHO_GRAFO}")
 
-    g.vs[novo_vertice_idx]['latitude'] = comunidade['Lat']
-    g.vs[novo_vertice_idx]['longitude'] = comunidade['Lon']
-    g.vs[novo_vertice_idx]['titulo'] = comunidade['Comunidade']
+with relatorio.etapa('indice_consulta'):
+    # índice para consultar a comunidade de coordenadas (ver consulta_comunidades.py)
+    consulta_comunidades.construir_indice(consulta_comunidades.PASTA_INDICE, CAMINHO_GRAFO, raio_metros=DISTANCIA_OCORRENCIAS)
 
-comunidades_pontos_focais = set(pontos_focais['Comunidade'])
-comunidades_areas_prioritarias = set(areas_prioritarias['Comunidade'])
-comunidades_areas_atencao = set(areas_atencao['Comunidade'])
+if EXPORTAR_GRAPHML:
+    # os atributos das ocorrências e das comunidades só viram atributos dos vértices aqui
+    ca.preencher_vertices(g, colunas)
+    g.vs['comunidade'] = membership.tolist()
+    g.vs['tipo_comunidade'] = tipo_comunidade
 
-# Atribui o tipo de comunidade aos vértices
-tipo_comunidade = []
+    # um vértice extra por comunidade selecionada, na posição média das suas ocorrências
+    comunidades_selecionadas = pd.concat([pontos_focais, areas_prioritarias, areas_atencao])
 
-for v in g.vs:
-    comunidade = v['comunidade']
+    for i, comunidade in comunidades_selecionadas.iterrows():
+        g.add_vertex(f'com_{comunidade["Comunidade"]}')
 
-    if comunidade in comunidades_pontos_focais:
-        tipo_comunidade.append('ponto focal')
-    elif comunidade in comunidades_areas_prioritarias:
-        tipo_comunidade.append('area prioritaria')
-    elif comunidade in comunidades_areas_atencao:
-        tipo_comunidade.append('area atencao')
-    else:
-        tipo_comunidade.append('comum')
+        novo_vertice_idx = g.vs.find(name=f'com_{comunidade["Comunidade"]}').index
 
-# Adiciona o atributo ao grafo
-g.vs['tipo_comunidade'] = tipo_comunidade
+        g.vs[novo_vertice_idx]['latitude'] = comunidade['Lat']
+        g.vs[novo_vertice_idx]['longitude'] = comunidade['Lon']
+        g.vs[novo_vertice_idx]['titulo'] = comunidade['Comunidade']
+        g.vs[novo_vertice_idx]['tipo_comunidade'] = 'comum'
 
-# converter dados de volta para strings
-g.vs['horario'] = [str(horario) for horario in g.vs['horario']]
-g.vs['mocodes'] = [",".join(mocodes) if mocodes else "" for mocodes in g.vs['mocodes']]
+    with relatorio.etapa('graphml', perfilar=True):
+        gb.exportar_graphml(g, f"grafos_modelados/grafo_{DISTANCIA_OCORRENCIAS}m_{Q_OCC}_occ_sample_sem_tam.graphml")
+    print(f"Grafo exportado para: grafos_modelados/grafo_{DISTANCIA_OCORRENCIAS}m_{Q_OCC}_occ_sample.graphml")
 
-g.write_graphml(f"grafos_modelados/grafo_{DISTANCIA_OCORRENCIAS}m_{Q_OCC}_occ_sample_sem_tam.graphml")
-print(f"Grafo exportado para: grafos_modelados/grafo_{DISTANCIA_OCORRENCIAS}m_{Q_OCC}_occ_sample.graphml")
\ No newline at end of file
+relatorio.salvar(CAMINHO_RELATORIO, dict(parametros, ocorrencias=Q_OCC, processos=PROCESSOS))
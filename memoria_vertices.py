@@ -0,0 +1,140 @@
+# Este arquivo compara a memória dos dados das ocorrências nos dois formatos usados pelo projeto: as colunas tipadas do
+# cache de atributos (um array numpy por atributo, ver cache_atributos) e os atributos dos vértices do igraph
+# (listas de objetos Python: timedelta, listas de strings, um dicionário por perfil de vitima...).
+# Também mede o tempo de leitura de um atributo para uma lista de pares, como na formação das arestas
+#
+# uso: python memoria_vertices.py --ocorrencias 200000
+#      python memoria_vertices.py --csv dados/dataset-filtrado.csv
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import igraph as ig
+import numpy as np
+
+import cache_atributos as ca
+import gerador_ocorrencias
+import motor_arestas as me
+
+# quantidade de pares lidos na medição do tempo de acesso
+PARES_ACESSO = 100000
+
+# tamanho de uma lista de objetos, somando cada objeto (e o que ele contém) uma única vez
+def _tamanho_profundo(valores):
+    vistos = set()
+    total = 0
+    pendentes = [valores]
+    while pendentes:
+        objeto = pendentes.pop()
+        if id(objeto) in vistos:
+            continue
+        vistos.add(id(objeto))
+        if isinstance(objeto, np.ndarray):
+            total += objeto.nbytes
+            continue
+        total += sys.getsizeof(objeto)
+        if isinstance(objeto, dict):
+            pendentes.extend(objeto.keys())
+            pendentes.extend(objeto.values())
+        elif isinstance(objeto, (list, tuple, set)):
+            pendentes.extend(objeto)
+    return total
+
+def _por_vertice(total, n):
+    return total / n if n else 0
+
+# memória (em bytes) de cada coluna tipada; os vocabulários são contados à parte, pois não crescem com as ocorrências
+def memoria_colunas(colunas):
+    return {nome: int(np.asarray(valores).nbytes) for nome, valores in colunas.items()}
+
+# memória dos atributos dos vértices do igraph: o total alocado (tracemalloc) e o tamanho de cada atributo
+def memoria_igraph(colunas):
+    g = ig.Graph(n=ca.tamanho(colunas))
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    ca.preencher_vertices(g, colunas)
+    total = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+    return g, total, {nome: _tamanho_profundo(g.vs[nome]) for nome in g.vs.attributes()}
+
+# tempo (em segundos) para ler os minutos do dia das duas pontas de cada par nos dois formatos
+def tempo_acesso(colunas, g, semente=1):
+    n = ca.tamanho(colunas)
+    rng = np.random.default_rng(semente)
+    i, j = rng.integers(0, n, PARES_ACESSO), rng.integers(0, n, PARES_ACESSO)
+
+    inicio = time.perf_counter()
+    minutos = np.asarray(colunas['minutos'], dtype=np.int16)
+    np.abs(minutos[i] - minutos[j])
+    tempo_colunas = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    [abs(g.vs[a]['horario'] - g.vs[b]['horario']) for a, b in zip(i.tolist(), j.tolist())]
+    tempo_igraph = time.perf_counter() - inicio
+    return tempo_colunas, tempo_igraph
+
+def relatorio(colunas):
+    n = ca.tamanho(colunas)
+    por_coluna = memoria_colunas(colunas)
+    vocabularios = sum(por_coluna.pop(nome) for nome in ca.VOCABULARIOS if nome in por_coluna)
+    atributos = {nome: int(valores.nbytes) for nome, valores in me.atributos_das_colunas(colunas).items()}
+    g, total_igraph, por_atributo = memoria_igraph(colunas)
+    tempo_colunas, tempo_igraph = tempo_acesso(colunas, g)
+
+    return {
+        'ocorrencias': n,
+        'colunas': {
+            'bytes_por_vertice': _por_vertice(sum(por_coluna.values()), n),
+            'total_mb': (sum(por_coluna.values()) + vocabularios) / 2 ** 20,
+            'vocabularios_bytes': vocabularios,
+            'por_coluna_bytes_por_vertice': {nome: _por_vertice(valor, n) for nome, valor in por_coluna.items()},
+        },
+        'atributos_arestas': {
+            'bytes_por_vertice': _por_vertice(sum(atributos.values()), n),
+            'por_atributo_bytes_por_vertice': {nome: _por_vertice(valor, n) for nome, valor in atributos.items()},
+        },
+        'igraph': {
+            'bytes_por_vertice': _por_vertice(total_igraph, n),
+            'total_mb': total_igraph / 2 ** 20,
+            'por_atributo_bytes_por_vertice': {nome: _por_vertice(valor, n) for nome, valor in por_atributo.items()},
+        },
+        'acesso_pares': {
+            'pares': PARES_ACESSO,
+            'segundos_colunas': tempo_colunas,
+            'segundos_igraph': tempo_igraph,
+        },
+    }
+
+def _imprimir(resultado):
+    print(f"{resultado['ocorrencias']} ocorrências")
+    for formato in ('colunas', 'atributos_arestas', 'igraph'):
+        dados = resultado[formato]
+        print(f"\n{formato}: {dados['bytes_por_vertice']:.1f} bytes por vértice")
+        detalhes = dados.get('por_coluna_bytes_por_vertice', dados.get('por_atributo_bytes_por_vertice'))
+        for nome, valor in sorted(detalhes.items(), key=lambda item: item[1], reverse=True):
+            print(f'  {nome:<24} {valor:8.1f}')
+    acesso = resultado['acesso_pares']
+    print(f"\nleitura dos horarios de {acesso['pares']} pares: colunas {acesso['segundos_colunas'] * 1000:.2f} ms, "
+          f"igraph {acesso['segundos_igraph'] * 1000:.2f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara a memória das colunas tipadas com a dos atributos dos vértices do igraph.')
+    parser.add_argument('--csv', help='dataset filtrado (padrão: ocorrências sintéticas)')
+    parser.add_argument('--ocorrencias', type=int, default=200000, help='quantidade de ocorrências sintéticas')
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--saida', help='json com o relatório')
+    args = parser.parse_args()
+
+    if args.csv:
+        colunas = ca.carregar(args.csv)
+    else:
+        colunas = ca.calcular_colunas(gerador_ocorrencias.gerar_ocorrencias(args.ocorrencias, args.semente))
+
+    resultado = relatorio(colunas)
+    _imprimir(resultado)
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump(resultado, arquivo, indent=2)
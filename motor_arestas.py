@@ -0,0 +1,180 @@
+# Este arquivo concentra o cálculo dos pesos das arestas do grafo
+# Em vez de comparar os vértices par a par, os pares (i, j) são recebidos como arrays
+# e todos os componentes do peso são calculados de uma vez com operações do numpy
+
+import numpy as np
+from geopy.distance import geodesic
+
+import conjuntos_binarios as cb
+import funcoes_auxiliares as fa
+
+# coeficientes de cada componente na composição do peso final da aresta
+# a ordem do dicionário é a mesma da soma feita no cálculo do peso final
+COEFICIENTES = {
+    'distancia': 0.25,
+    'horario': 0.1,
+    'crime': 0.25,
+    'mocodes': 0.1,
+    'vitima': 0.1,
+    'arma': 0.15,
+    'crimes_secundarios': 0.05,
+}
+
+# raio da terra em metros, o mesmo usado na conversão do raio de busca da BallTree
+RAIO_TERRA = 6371000
+
+# modos disponíveis para o cálculo da distância entre as ocorrências (ver calcular_distancias)
+MODOS_DISTANCIA = ('balltree', 'haversine', 'geodesic')
+
+# extrai dos atributos dos vértices do grafo as colunas numéricas usadas no cálculo dos pesos
+def extrair_atributos(g):
+    # ids (idade, sexo, descendencia) de cada perfil de vitima, usados nas tabelas memorizadas de fa
+    ids_vitimas = np.array([fa.ids_perfil(perfil) for perfil in g.vs['perfil_vitima']], dtype=np.int64).reshape(-1, 3)
+
+    return {
+        'latitude': np.asarray(g.vs['latitude'], dtype=float),
+        'longitude': np.asarray(g.vs['longitude'], dtype=float),
+        'minutos': np.array([int(h.total_seconds() // 60) for h in g.vs['horario']], dtype=np.int64),
+        'cat_crime': np.array([fa.ID_CATEGORIA_CRIME[c] for c in g.vs['cat_crime']], dtype=np.int64),
+        'cat_arma': np.array([fa.ID_CATEGORIA_ARMA[c] for c in g.vs['cat_arma']], dtype=np.int64),
+        'idade_vitima': ids_vitimas[:, 0],
+        'sexo_vitima': ids_vitimas[:, 1],
+        'descendencia_vitima': ids_vitimas[:, 2],
+        # conjuntos guardados como bitsets (o mocode 1501 já é removido na leitura dos dados)
+        'mocodes': cb.codificar_conjuntos(g.vs['mocodes'])[0],
+        'crm_cods': cb.codificar_conjuntos(g.vs['crm_cods'], dict(fa.ID_CATEGORIA_CRIME))[0],
+    }
+
+# converte os códigos de um campo do perfil de vitima (índices no vocabulário, -1 para ausente) nos ids das tabelas de fa
+def _ids_campo_perfil(campo, codigos, vocabulario):
+    tabela = np.array([fa.id_valor_perfil(campo, valor) for valor in [None] + list(vocabulario)], dtype=np.int16)
+    return tabela[np.asarray(codigos, dtype=np.int64) + 1]
+
+# monta as mesmas colunas de extrair_atributos a partir das colunas do cache de atributos (ver cache_atributos)
+# os ids e os minutos ficam em tipos pequenos, as contas com eles são feitas em tipos maiores
+def atributos_das_colunas(colunas):
+    idades, codigos_idade = np.unique(colunas['idade_vitima'], return_inverse=True)
+    ids_idade = np.array([fa.id_valor_perfil('idade', None if idade == 0 else int(idade)) for idade in idades], dtype=np.int16)
+
+    mocodes = cb.montar_bitsets_csr(colunas['mocodes_offsets'], colunas['mocodes_valores'], len(colunas['mocodes_vocabulario']))
+
+    return {
+        'latitude': np.asarray(colunas['latitude'], dtype=float),
+        'longitude': np.asarray(colunas['longitude'], dtype=float),
+        'minutos': np.asarray(colunas['minutos'], dtype=np.int16),
+        'cat_crime': np.asarray(colunas['cat_crime'], dtype=np.uint8),
+        'cat_arma': np.asarray(colunas['cat_arma'], dtype=np.uint8),
+        'idade_vitima': ids_idade[codigos_idade.reshape(-1)],
+        'sexo_vitima': _ids_campo_perfil('sexo', colunas['sexo_vitima'], colunas['sexo_vocabulario']),
+        'descendencia_vitima': _ids_campo_perfil('descendencia', colunas['descendencia_vitima'], colunas['descendencia_vocabulario']),
+        'mocodes': mocodes,
+        # a máscara de categorias secundárias já é um bitset de uma palavra (bit k = categoria de id k)
+        'crm_cods': np.asarray(colunas['crm_secundarios'], dtype=np.uint64).reshape(-1, 1),
+    }
+
+# equivalente vetorizado de fa.comparar_vitimas: cada campo do perfil é uma consulta na tabela memorizada do campo
+def _comparar_vitimas(atributos, i, j):
+    pesos = {}
+    for campo in fa.PESOS_PERFIL:
+        ids = atributos[f'{campo}_vitima']
+        pesos[campo] = fa.tabela_campo_perfil(campo)[ids[i], ids[j]]
+
+    return pesos['idade'] * fa.PESOS_PERFIL['idade'] + pesos['sexo'] * fa.PESOS_PERFIL['sexo'] + pesos['descendencia'] * fa.PESOS_PERFIL['descendencia']
+
+# distância em metros entre os pares, calculada com geodesic (cálculo elipsoidal, mantido como referência)
+def _distancias_geodesic(atributos, i, j):
+    lat, lon = atributos['latitude'], atributos['longitude']
+    return np.array([geodesic((lat[a], lon[a]), (lat[b], lon[b])).meters for a, b in zip(i, j)], dtype=float)
+
+# distância em metros entre os pares pela fórmula de haversine (esfera de raio RAIO_TERRA, a mesma métrica da BallTree)
+def _distancias_haversine(atributos, i, j):
+    lat = np.radians(atributos['latitude'])
+    lon = np.radians(atributos['longitude'])
+
+    dlat = lat[j] - lat[i]
+    dlon = lon[j] - lon[i]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[i]) * np.cos(lat[j]) * np.sin(dlon / 2) ** 2
+    return 2 * RAIO_TERRA * np.arcsin(np.sqrt(a))
+
+# calcula a distância em metros entre os pares com o modo escolhido:
+# 'balltree' reaproveita as distâncias (em radianos) devolvidas por query_radius, 'haversine' calcula sobre os arrays de pares
+# e 'geodesic' usa o cálculo elipsoidal do geopy par a par. No raio usado (centenas de metros) os modos diferem em centímetros
+def calcular_distancias(i, j, atributos, modo='balltree', distancias_balltree=None):
+    if modo == 'balltree':
+        if distancias_balltree is None:
+            raise ValueError("o modo 'balltree' precisa das distâncias devolvidas pela BallTree")
+        return np.asarray(distancias_balltree, dtype=float) * RAIO_TERRA
+    if modo == 'haversine':
+        return _distancias_haversine(atributos, i, j)
+    if modo == 'geodesic':
+        return _distancias_geodesic(atributos, i, j)
+    raise ValueError(f"modo de distância desconhecido: {modo} (use um de {MODOS_DISTANCIA})")
+
+# compara os modos de distância numa amostra de pares, usando geodesic como referência
+# retorna, para cada modo, a maior diferença de distância (em metros) e a maior diferença no peso de distância e no peso final
+def comparar_modos_distancia(i, j, atributos, distancia_maxima, distancias_balltree=None, coeficientes=COEFICIENTES, tamanho_amostra=10000, semente=1):
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+
+    amostra = np.arange(len(i))
+    if len(i) > tamanho_amostra:
+        amostra = np.sort(np.random.default_rng(semente).choice(len(i), tamanho_amostra, replace=False))
+
+    referencia = _distancias_geodesic(atributos, i[amostra], j[amostra])
+
+    relatorio = {}
+    for modo in MODOS_DISTANCIA:
+        if modo == 'geodesic' or (modo == 'balltree' and distancias_balltree is None):
+            continue
+        distancias_modo = np.asarray(distancias_balltree)[amostra] if modo == 'balltree' else None
+        distancias = calcular_distancias(i[amostra], j[amostra], atributos, modo, distancias_modo)
+
+        desvio = np.abs(distancias - referencia).max(initial=0)
+        relatorio[modo] = {
+            'pares': len(amostra),
+            'desvio_distancia_metros': desvio,
+            'desvio_peso_distancia': desvio / distancia_maxima,
+            'desvio_peso_final': desvio / distancia_maxima * coeficientes['distancia'],
+        }
+
+    return relatorio
+
+# diferença de horario (em minutos) dos pares, considerando a passagem pela meia noite, assim como fa.diferenca_horario
+def diferenca_minutos(atributos, i, j):
+    # a conta é feita em int64, pois os minutos podem estar guardados num tipo pequeno
+    diferenca_direta = np.abs(atributos['minutos'][i].astype(np.int64) - atributos['minutos'][j])
+    return np.minimum(diferenca_direta, 24 * 60 - diferenca_direta)
+
+# componentes que dependem dos parâmetros do grafo (distância máxima e alpha_tempo); os demais só dependem das ocorrências
+def componente_distancia(distancias, distancia_maxima):
+    return 1 - (distancias / distancia_maxima)
+
+def componente_horario(diferenca, alpha_tempo):
+    return np.exp(-alpha_tempo * ((diferenca * 60) / 3600))
+
+# calcula todos os componentes do peso das arestas (i[k], j[k]) e o peso final
+# retorna um dicionário com um array por componente (mesmas chaves de COEFICIENTES) e 'peso_final'
+# as distâncias em metros podem ser informadas já calculadas (ver calcular_distancias), senão são calculadas com haversine
+def calcular_pesos(i, j, atributos, alpha_tempo, distancia_maxima, coeficientes=COEFICIENTES, distancias=None):
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+
+    if distancias is None:
+        distancias = _distancias_haversine(atributos, i, j)
+
+    componentes = {
+        'distancia': componente_distancia(distancias, distancia_maxima),
+        'horario': componente_horario(diferenca_minutos(atributos, i, j), alpha_tempo),
+        'crime': fa.SIMILARIDADE_CRIME[atributos['cat_crime'][i], atributos['cat_crime'][j]],
+        'mocodes': cb.jaccard_pares(atributos['mocodes'], i, j),
+        'vitima': _comparar_vitimas(atributos, i, j),
+        'arma': fa.SIMILARIDADE_ARMA[atributos['cat_arma'][i], atributos['cat_arma'][j]],
+        'crimes_secundarios': cb.jaccard_pares(atributos['crm_cods'], i, j),
+    }
+
+    peso_final = np.zeros(len(i))
+    for nome, coeficiente in coeficientes.items():
+        peso_final = peso_final + componentes[nome] * coeficiente
+    componentes['peso_final'] = peso_final
+
+    return componentes
@@ -0,0 +1,148 @@
+# Este arquivo reúne as etapas do pipeline em funções, para serem usadas pelo main.py, pela varredura de parâmetros
+# (varredura.py) ou por outros scripts: leitura das ocorrências, criação das arestas (com cache), detecção das comunidades
+# e classificação das comunidades
+
+import random
+
+import igraph as ig
+import numpy as np
+import pandas as pd
+
+import busca_vizinhos as bv
+import cache_arestas
+import cache_atributos as ca
+import esparsificacao
+import estatisticas_comunidades as ec
+import funcoes_auxiliares as fa
+import instrumentacao
+import motor_arestas as me
+
+# carrega os atributos das ocorrências (pelo cache, ver cache_atributos.carregar)
+# com q_occ informado, usa uma amostra de q_occ ocorrências (a mesma de df.sample(n=q_occ) após np.random.seed(semente))
+def carregar_ocorrencias(caminho_csv, q_occ=None, semente=1):
+    colunas = ca.carregar(caminho_csv)
+    if q_occ is None:
+        return colunas
+
+    np.random.seed(semente)
+    amostra = pd.Series(np.arange(ca.tamanho(colunas))).sample(n=q_occ).to_numpy()
+    return ca.selecionar(colunas, amostra)
+
+# ocorrências por ladrilho na criação das arestas esparsificadas (só os pares de um ladrilho ficam na memória de uma vez)
+PONTOS_POR_LADRILHO = 50000
+
+def _exibir_desvios(pares_i, pares_j, atributos, distancia, distancias_pares):
+    for modo, desvios in me.comparar_modos_distancia(pares_i, pares_j, atributos, distancia, distancias_pares).items():
+        print(f"Modo {modo}: desvio máximo de {desvios['desvio_distancia_metros']:.4f} m, {desvios['desvio_peso_final']:.2e} no peso final ({desvios['pares']} arestas)")
+
+# cria as arestas já esparsificadas (ver esparsificacao.selecionar_arestas), ladrilho a ladrilho (busca_vizinhos.pares_em_blocos):
+# de cada ladrilho só ficam as arestas com peso final >= peso_minimo que estão entre as top_k de uma das pontas dentro do
+# ladrilho. Uma aresta entre as k mais fortes de uma ocorrência também está entre as k mais fortes dela em qualquer ladrilho,
+# então a seleção feita no final, com as arestas que sobraram, é a mesma que com todos os pares do raio
+# retorna os pares, a matriz de componentes das arestas mantidas e a quantidade de vizinhos no raio de cada ocorrência
+def _arestas_esparsas(colunas, distancia, alpha_tempo, modo_distancia, coeficientes, peso_minimo, top_k, simetrizacao, verificar_modos, metodo_busca):
+    n = ca.tamanho(colunas)
+    atributos = me.atributos_das_colunas(colunas)
+    vizinhos = np.zeros(n, dtype=np.int64)
+    partes = []
+    n_ladrilhos = max(1, -(-n // PONTOS_POR_LADRILHO))
+    for pares_i, pares_j, distancias_pares in bv.pares_em_blocos(colunas['latitude'], colunas['longitude'], distancia, n_ladrilhos, metodo_busca):
+        vizinhos += np.bincount(pares_i, minlength=n) + np.bincount(pares_j, minlength=n)
+        distancias_metros = me.calcular_distancias(pares_i, pares_j, atributos, modo_distancia, distancias_pares)
+        if verificar_modos and not partes:
+            _exibir_desvios(pares_i, pares_j, atributos, distancia, distancias_pares)
+        componentes = me.calcular_pesos(pares_i, pares_j, atributos, alpha_tempo, distancia, distancias=distancias_metros)
+        componentes = np.column_stack([componentes[nome] for nome in cache_arestas.COMPONENTES])
+        pesos = cache_arestas.reponderar({'nomes': cache_arestas.COMPONENTES, 'componentes': componentes}, coeficientes)
+
+        mantidas = esparsificacao.selecionar_arestas(pares_i, pares_j, pesos, peso_minimo, top_k, 'uniao')
+        partes.append((pares_i[mantidas], pares_j[mantidas], componentes[mantidas]))
+        del componentes, pesos
+
+    if not partes:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty((0, len(cache_arestas.COMPONENTES))), vizinhos
+    pares_i, pares_j, componentes = (np.concatenate(lista) for lista in zip(*partes))
+    ordem = np.lexsort((pares_j, pares_i))
+    pares_i, pares_j, componentes = pares_i[ordem], pares_j[ordem], componentes[ordem]
+    if top_k is not None:
+        pesos = cache_arestas.reponderar({'nomes': cache_arestas.COMPONENTES, 'componentes': componentes}, coeficientes)
+        mantidas = esparsificacao.selecionar_arestas(pares_i, pares_j, pesos, None, top_k, simetrizacao)
+        pares_i, pares_j, componentes = pares_i[mantidas], pares_j[mantidas], componentes[mantidas]
+    return pares_i, pares_j, componentes, vizinhos
+
+# cria as arestas das ocorrências a até 'distancia' metros, com os componentes do peso separados (ver cache_arestas)
+# as arestas são reaproveitadas do cache quando as ocorrências e os parâmetros são os mesmos
+# metodo_busca é o método da busca dos vizinhos (ver busca_vizinhos.METODOS_BUSCA), os dois dão as mesmas arestas
+# com peso_minimo e/ou top_k a esparsificação é feita na criação das arestas, ladrilho a ladrilho (ver _arestas_esparsas),
+# com o peso final dos coeficientes informados; as arestas devolvidas também têm a quantidade de vizinhos no raio ('vizinhos')
+def calcular_arestas(colunas, distancia, alpha_tempo, modo_distancia='balltree', processos=1, relatorio=None, verificar_modos=False, metodo_busca='grade',
+                     coeficientes=me.COEFICIENTES, peso_minimo=None, top_k=None, simetrizacao='uniao'):
+    if relatorio is None:
+        relatorio = instrumentacao.Relatorio(ativo=False)
+
+    parametros_esparsificacao = None
+    if peso_minimo is not None or top_k is not None:
+        parametros_esparsificacao = {'coeficientes': dict(coeficientes), 'peso_minimo': peso_minimo, 'top_k': top_k, 'simetrizacao': simetrizacao}
+
+    pasta_arestas = cache_arestas.pasta_arestas(cache_arestas.chave(colunas, distancia, alpha_tempo, modo_distancia, parametros_esparsificacao))
+    arestas = cache_arestas.carregar(pasta_arestas)
+    relatorio.contar('cache_arestas', arestas is not None)
+    if arestas is not None:
+        return arestas
+
+    if parametros_esparsificacao is not None:
+        with relatorio.etapa('vizinhos_e_pesos', perfilar=True):
+            pares_i, pares_j, componentes, vizinhos = _arestas_esparsas(colunas, distancia, alpha_tempo, modo_distancia, coeficientes,
+                                                                         peso_minimo, top_k, simetrizacao, verificar_modos, metodo_busca)
+        relatorio.contar('pares_candidatos', int(vizinhos.sum()) // 2)
+        with relatorio.etapa('cache'):
+            cache_arestas.salvar(pasta_arestas, ca.tamanho(colunas), pares_i, pares_j, componentes, vizinhos)
+            return cache_arestas.carregar(pasta_arestas)
+
+    with relatorio.etapa('vizinhos', perfilar=True):
+        pares_i, pares_j, distancias_pares = bv.pares_no_raio(colunas['latitude'], colunas['longitude'], distancia, processos, metodo_busca)
+    relatorio.contar('pares_candidatos', len(pares_i))
+
+    with relatorio.etapa('pesos', perfilar=True):
+        atributos = me.atributos_das_colunas(colunas)
+        distancias_metros = me.calcular_distancias(pares_i, pares_j, atributos, modo_distancia, distancias_pares)
+        componentes = me.calcular_pesos(pares_i, pares_j, atributos, alpha_tempo, distancia, distancias=distancias_metros)
+
+    if verificar_modos:
+        _exibir_desvios(pares_i, pares_j, atributos, distancia, distancias_pares)
+
+    with relatorio.etapa('cache'):
+        cache_arestas.salvar(pasta_arestas, ca.tamanho(colunas), pares_i, pares_j, componentes)
+        return cache_arestas.carregar(pasta_arestas)
+
+# grafo só com a estrutura e os pesos das arestas
+def montar_grafo(n_vertices, pares_i, pares_j, pesos):
+    g = ig.Graph(n=n_vertices, edges=np.column_stack((pares_i, pares_j)))
+    g.es['weight'] = np.asarray(pesos, dtype=float).tolist()
+    return g
+
+# algoritmos de detecção de comunidades: 'multilevel' (Louvain) ou 'leiden' (otimizando a modularidade)
+ALGORITMOS = ('multilevel', 'leiden')
+
+# aplica o algoritmo escolhido e retorna as comunidades e a modularidade (calculada com a mesma resolução)
+# o igraph usa o gerador do módulo random, com uma semente informada o resultado é reproduzível
+# pesos é o nome do atributo das arestas com os pesos, ou os próprios pesos (um array, sem guardá-los no grafo)
+def detectar_comunidades(g, resolucao, semente=None, algoritmo='multilevel', pesos='weight'):
+    if algoritmo not in ALGORITMOS:
+        raise ValueError(f'algoritmo inválido: {algoritmo}, use um de {ALGORITMOS}')
+    if semente is not None:
+        random.seed(semente)
+
+    if algoritmo == 'leiden':
+        comunidades = g.community_leiden(objective_function='modularity', weights=pesos, resolution=resolucao)
+    else:
+        comunidades = g.community_multilevel(weights=pesos, resolution=resolucao)
+    return comunidades, g.modularity(comunidades.membership, weights=pesos, resolution=resolucao)
+
+# estatísticas de todas as comunidades e a sua classificação (pontos focais, áreas prioritárias e áreas de atenção)
+# a estabilidade de cada comunidade (ver deteccao_comunidades), se informada, vira a coluna 'Estabilidade'
+def classificar(membership, colunas, pares_i, pares_j, pesos, estabilidade=None, pesos_fator=None):
+    df_comunidades = ec.calcular_estatisticas(membership, colunas, pares_i, pares_j, pesos)
+    if estabilidade is not None:
+        df_comunidades['Estabilidade'] = np.asarray(estabilidade)[df_comunidades['Comunidade']]
+    return (df_comunidades,) + fa.classificar_comunidades(df_comunidades, ca.tamanho(colunas), pesos_fator)
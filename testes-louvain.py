@@ -1,7 +1,13 @@
-import igraph as ig
+import grafo_binario as gb
 
-# Carregar o grafo a partir de um arquivo .graphml
-grafo = ig.Graph.Read_GraphMLz('grafos_modelados/grafo_50k.graphml.gz')
+# pasta do grafo gravado pelo main.py no formato binário (ver grafo_binario.py)
+CAMINHO_GRAFO = 'grafos_modelados/grafo_250m_15000_occ'
+# também grava o resultado em GraphML (apenas para ferramentas de visualização)
+EXPORTAR_GRAPHML = False
+
+# Carregar o grafo a partir do formato binário (arestas e pesos montados direto dos arrays)
+tabelas = gb.carregar_tabelas(CAMINHO_GRAFO)
+grafo = gb.montar_grafo(tabelas)
 
 # Aplicar o algoritmo de Louvain para detecção de comunidades
 comunidades = grafo.community_multilevel()
@@ -15,8 +21,11 @@ for i, comunidade in enumerate(comunidades):
 
 print(f'{j} pontos detectados')
 
-# Opcional: Salvar as comunidades como atributo dos vértices para visualização
-grafo.vs["comunidade"] = comunidades.membership
+# Salvar as comunidades como atributo dos vértices, junto com o grafo, num novo grafo binário
+atributos = dict(tabelas['atributos'], comunidade=comunidades.membership)
+gb.salvar_grafo(CAMINHO_GRAFO + '_com_comunidades', tabelas['colunas'], tabelas['pares_i'], tabelas['pares_j'], tabelas['pesos'], atributos)
 
-# Salvar o grafo atualizado com as comunidades de volta em um novo arquivo .graphml
-grafo.write_graphml("grafos_modelados/grafo_com_comunidades.graphml")
+# Opcional: salvar o grafo atualizado em GraphML para visualização
+if EXPORTAR_GRAPHML:
+    grafo = gb.carregar_grafo(CAMINHO_GRAFO + '_com_comunidades', preencher=True)
+    gb.exportar_graphml(grafo, "grafos_modelados/grafo_com_comunidades.graphml")
@@ -0,0 +1,150 @@
+# Este arquivo roda o pipeline para uma grade de parâmetros (distância máxima, alpha_tempo, coeficientes e resolução)
+# e gera uma tabela com a modularidade, a quantidade de comunidades e de comunidades selecionadas de cada configuração.
+# A busca de vizinhos e os componentes do peso que só dependem das ocorrências são calculados uma única vez, na maior
+# distância; as distâncias menores são obtidas filtrando os pares, e só os componentes de distância e de horario são refeitos.
+# Cada configuração (Louvain + estatísticas) roda num processo separado
+#
+# uso: python varredura.py --distancias 150 250 --alphas 0.1 0.15 --resolucoes 0.6 0.8 1.0 --processos 4
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import busca_vizinhos as bv
+import cache_arestas
+import cache_atributos as ca
+import motor_arestas as me
+import pipeline
+
+RESOLUCOES = [0.4, 0.6, 0.8, 1.0, 1.2]
+
+_COLUNA_DISTANCIA = cache_arestas.COMPONENTES.index('distancia')
+_COLUNA_HORARIO = cache_arestas.COMPONENTES.index('horario')
+
+# dados da varredura nos processos (herdados no fork, ou recebidos uma única vez por processo)
+# e o último grafo montado pelo processo, reaproveitado quando só a resolução muda
+_base = {}
+_grafo_atual = {}
+
+# busca os pares até a maior distância e calcula os componentes do peso de todos eles
+def preparar(colunas, distancia_maxima, modo_distancia='balltree', processos=1, metodo_busca='grade'):
+    pares_i, pares_j, distancias_radianos = bv.pares_no_raio(colunas['latitude'], colunas['longitude'], distancia_maxima, processos, metodo_busca)
+    atributos = me.atributos_das_colunas(colunas)
+    distancias_metros = me.calcular_distancias(pares_i, pares_j, atributos, modo_distancia, distancias_radianos)
+
+    # a distância e o horario são refeitos para cada configuração (ver configurar_arestas), os demais componentes valem para todas
+    componentes = me.calcular_pesos(pares_i, pares_j, atributos, 0, distancia_maxima, distancias=distancias_metros)
+
+    return {
+        'colunas': colunas,
+        'pares_i': pares_i,
+        'pares_j': pares_j,
+        'distancias_radianos': distancias_radianos,
+        'distancias_metros': distancias_metros,
+        'diferenca_minutos': me.diferenca_minutos(atributos, pares_i, pares_j),
+        'componentes': np.column_stack([componentes[nome] for nome in cache_arestas.COMPONENTES]),
+    }
+
+# arestas de uma configuração: as posições (em base) dos pares a até 'distancia' metros e os pesos finais
+def configurar_arestas(base, distancia, alpha_tempo, coeficientes):
+    # a BallTree seleciona os pares pela distância em radianos, o mesmo filtro dá as arestas de uma busca com o raio menor
+    selecionadas = np.flatnonzero(base['distancias_radianos'] <= distancia / me.RAIO_TERRA)
+
+    componentes = base['componentes'][selecionadas]
+    componentes[:, _COLUNA_DISTANCIA] = me.componente_distancia(base['distancias_metros'][selecionadas], distancia)
+    componentes[:, _COLUNA_HORARIO] = me.componente_horario(base['diferenca_minutos'][selecionadas], alpha_tempo)
+
+    pesos = cache_arestas.reponderar({'nomes': cache_arestas.COMPONENTES, 'componentes': componentes}, coeficientes)
+    return selecionadas, pesos
+
+def _iniciar_processo(base):
+    _base.update(base)
+
+# roda uma configuração (distancia, alpha_tempo, nome dos coeficientes, resolução) e resume o resultado
+def _executar_configuracao(configuracao):
+    distancia, alpha_tempo, nome_coeficientes, resolucao = configuracao
+    inicio = time.perf_counter()
+
+    chave = (distancia, alpha_tempo, nome_coeficientes)
+    if _grafo_atual.get('chave') != chave:
+        selecionadas, pesos = configurar_arestas(_base, distancia, alpha_tempo, _base['coeficientes'][nome_coeficientes])
+        pares_i, pares_j = _base['pares_i'][selecionadas], _base['pares_j'][selecionadas]
+        g = pipeline.montar_grafo(ca.tamanho(_base['colunas']), pares_i, pares_j, pesos)
+        _grafo_atual.update(chave=chave, grafo=g, pares_i=pares_i, pares_j=pares_j, pesos=pesos)
+
+    g = _grafo_atual['grafo']
+    comunidades, modularidade = pipeline.detectar_comunidades(g, resolucao, _base['semente'])
+    _, pontos_focais, areas_prioritarias, areas_atencao = pipeline.classificar(
+        comunidades.membership, _base['colunas'], _grafo_atual['pares_i'], _grafo_atual['pares_j'], _grafo_atual['pesos'])
+
+    return {
+        'distancia': distancia,
+        'alpha_tempo': alpha_tempo,
+        'coeficientes': nome_coeficientes,
+        'resolucao': resolucao,
+        'arestas': g.ecount(),
+        'modularidade': modularidade,
+        'comunidades': len(comunidades),
+        'pontos_focais': len(pontos_focais),
+        'areas_prioritarias': len(areas_prioritarias),
+        'areas_atencao': len(areas_atencao),
+        'segundos': time.perf_counter() - inicio,
+    }
+
+# roda todas as combinações dos parâmetros e retorna a tabela com o resumo de cada configuração
+# conjuntos_coeficientes é um dicionário {nome: coeficientes}
+def varrer(colunas, distancias, alphas, resolucoes, conjuntos_coeficientes=None, modo_distancia='balltree', processos=1, semente=1, metodo_busca='grade'):
+    if conjuntos_coeficientes is None:
+        conjuntos_coeficientes = {'padrao': me.COEFICIENTES}
+
+    base = preparar(colunas, max(distancias), modo_distancia, processos, metodo_busca)
+    base['coeficientes'] = conjuntos_coeficientes
+    base['semente'] = semente
+
+    # as configurações de uma mesma distância, alpha e coeficientes ficam em sequência, para reaproveitar o grafo
+    # com os processos, cada tarefa leva as len(resolucoes) configurações de um grupo, assim um processo recebe o grupo inteiro
+    configuracoes = list(itertools.product(distancias, alphas, conjuntos_coeficientes, resolucoes))
+    if processos <= 1:
+        _iniciar_processo(base)
+        resultados = [_executar_configuracao(configuracao) for configuracao in configuracoes]
+    else:
+        with ProcessPoolExecutor(max_workers=processos, mp_context=bv.contexto_processos(),
+                                 initializer=_iniciar_processo, initargs=(base,)) as executor:
+            resultados = list(executor.map(_executar_configuracao, configuracoes, chunksize=len(resolucoes)))
+
+    return pd.DataFrame(resultados)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Roda o pipeline para uma grade de parâmetros e resume as comunidades de cada configuração.')
+    parser.add_argument('--csv', default='dados/dataset-filtrado.csv', help='dataset filtrado')
+    parser.add_argument('--amostra', type=int, help='quantidade de ocorrências da amostra (padrão: todas)')
+    parser.add_argument('--distancias', type=float, nargs='+', default=[250], help='distâncias máximas das arestas, em metros')
+    parser.add_argument('--alphas', type=float, nargs='+', default=[0.15], help='valores de alpha_tempo')
+    parser.add_argument('--resolucoes', type=float, nargs='+', default=RESOLUCOES, help='resoluções do Louvain')
+    parser.add_argument('--coeficientes', help='json com os conjuntos de coeficientes a testar, no formato {"nome": {"distancia": 0.25, ...}}')
+    parser.add_argument('--modo-distancia', default='balltree', choices=me.MODOS_DISTANCIA)
+    parser.add_argument('--busca', default='grade', choices=bv.METODOS_BUSCA, help='método da busca dos vizinhos')
+    parser.add_argument('--processos', type=int, default=os.cpu_count(), help='processos usados na busca dos vizinhos e nas configurações')
+    parser.add_argument('--semente', type=int, default=1, help='semente do Louvain (a mesma para todas as configurações)')
+    parser.add_argument('--saida', default='dados/varredura.csv', help='csv com o resumo das configurações')
+    args = parser.parse_args()
+
+    conjuntos_coeficientes = None
+    if args.coeficientes:
+        with open(args.coeficientes) as arquivo:
+            conjuntos_coeficientes = json.load(arquivo)
+
+    inicio = time.perf_counter()
+    colunas = pipeline.carregar_ocorrencias(args.csv, args.amostra)
+    resumo = varrer(colunas, args.distancias, args.alphas, args.resolucoes, conjuntos_coeficientes, args.modo_distancia, args.processos, args.semente, args.busca)
+
+    print(resumo.to_string(index=False))
+    print(f'{len(resumo)} configurações em {time.perf_counter() - inicio:.1f} s')
+    resumo.to_csv(args.saida, index=False)
+    print(f'Resumo gravado em {args.saida}')